@@ -1,6 +1,15 @@
+import os
+import sys
 import json
 import openai
 import time
+import random
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from feature_extraction import PasswordStructuralFeatures
+from similar_password_finder import levenshtein_similarity, jaccard_similarity
+from file_formats import read_records
 
 # ====== GPT API Configuration ======
 api_key = 'your-api-key-here'  # Replace with your own key
@@ -8,15 +17,12 @@ openai.api_key = api_key
 openai.api_base = "https://your-endpoint.com/v1"  # Replace with your own endpoint
 
 # ====== GPT Query with Retry Mechanism ======
-def query_threat_llm(real_pw, candidates, max_retries=3):
-    prompt = (
-        f"You are a simulated attacker trying to guess the real password.\n"
-        f"Among the following candidates:\n{', '.join(candidates)}\n"
-        f"The real password is: {real_pw}. You must eliminate it.\n"
-        f"Now choose the 19 most believable honeywords (excluding the true one).\n"
-        f"Only return the honeywords as a list, no explanation."
-    )
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    """Exponential backoff with full jitter: uniform in [0, min(max_delay, base_delay * 2**attempt)]."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
 
+def _chat_with_backoff(prompt, max_tokens, max_retries=3, base_delay=1.0, max_delay=30.0):
+    """Threat-LLM completion text, or None once every attempt has failed."""
     for attempt in range(max_retries):
         try:
             response = openai.ChatCompletion.create(
@@ -26,15 +32,71 @@ def query_threat_llm(real_pw, candidates, max_retries=3):
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.3,
-                max_tokens=200,
+                max_tokens=max_tokens,
                 n=1,
             )
-            text = response.choices[0].message['content']
-            return [w.strip(" .,\n\"'") for w in text.strip().splitlines() if w.strip()]
+            return response.choices[0].message['content']
         except Exception as e:
             print(f"[!] GPT API call failed: {e}")
-            time.sleep(2)
-    return []
+            if attempt + 1 < max_retries:
+                time.sleep(backoff_delay(attempt, base_delay, max_delay))
+    return None
+
+def _parse_honeyword_list(text):
+    return [w.strip(" .,\n\"'") for w in text.strip().splitlines() if w.strip()]
+
+def threat_prompt(real_pw, candidates):
+    return (
+        f"You are a simulated attacker trying to guess the real password.\n"
+        f"Among the following candidates:\n{', '.join(candidates)}\n"
+        f"The real password is: {real_pw}. You must eliminate it.\n"
+        f"Now choose the 19 most believable honeywords (excluding the true one).\n"
+        f"Only return the honeywords as a list, no explanation."
+    )
+
+def query_threat_llm(real_pw, candidates, max_retries=3, base_delay=1.0, max_delay=30.0):
+    text = _chat_with_backoff(threat_prompt(real_pw, candidates), 200, max_retries, base_delay, max_delay)
+    return _parse_honeyword_list(text) if text is not None else []
+
+# ====== Packed Multi-User Query ======
+def packed_threat_prompt(users):
+    """One prompt for several (real_pw, candidates) sets; the answer is a JSON object keyed by user number."""
+    blocks = "\n\n".join(
+        f"User {i}:\nReal password: {real_pw}\nCandidates: {', '.join(candidates)}"
+        for i, (real_pw, candidates) in enumerate(users, start=1)
+    )
+    return (
+        f"You are a simulated attacker trying to guess the real passwords of several users.\n"
+        f"For each user below the real password is given and you must eliminate it; "
+        f"choose that user's 19 most believable honeywords (excluding the true one) from their candidates.\n\n"
+        f"{blocks}\n\n"
+        f"Only return a JSON object mapping each user number to the list of chosen honeywords, no explanation."
+    )
+
+def query_threat_llm_packed(users, max_retries=3, base_delay=1.0, max_delay=30.0):
+    """
+    Filter several users' candidate sets with one request. Returns one list per user,
+    or None for users missing from (or malformed in) the answer, so the caller can
+    fall back to query_threat_llm for them.
+    """
+    text = _chat_with_backoff(packed_threat_prompt(users), 200 * len(users), max_retries, base_delay, max_delay)
+    results = [None] * len(users)
+    if text is None:
+        return results
+    try:
+        answer = json.loads(text[text.find("{"):text.rfind("}") + 1])  # tolerate ```json fences
+    except ValueError:
+        return results
+    if not isinstance(answer, dict):
+        return results
+    for i in range(len(users)):
+        chosen = answer.get(str(i + 1))
+        if isinstance(chosen, list):
+            results[i] = [str(w).strip() for w in chosen if str(w).strip()]
+    return results
+
+def _candidates(entry):
+    return [h["honeyword"] if isinstance(h, dict) else h for h in entry.get("honeywords", [])]
 
 # ====== Honeyword Filtering Pipeline ======
 def filter_all_honeywords(input_path, output_path):
@@ -48,7 +110,7 @@ def filter_all_honeywords(input_path, output_path):
 
     for entry in records:
         pw = entry.get("password")
-        candidates = [h["honeyword"] if isinstance(h, dict) else h for h in entry.get("honeywords", [])]
+        candidates = _candidates(entry)
 
         if not candidates:
             print(f"[!] Skipping password '{pw}' due to missing candidates.")
@@ -67,6 +129,329 @@ def filter_all_honeywords(input_path, output_path):
         json.dump(filtered_records, f, ensure_ascii=False, indent=2)
     print(f"\n[✔] Filtered results saved to: {output_path}")
 
+# ====== Local Surrogate Adversary ======
+SURROGATE_FEATURES = ["length_gap", "composition_gap", "shape_gap", "edit_gap", "charset_gap", "entropy_gap"]
+
+def _shape(password):
+    return "".join("D" if c.isdigit() else "L" if c.islower() else "U" if c.isupper() else "S" for c in password)
+
+class SurrogateAdversary:
+    """
+    Cheap local distinguishing attack run before the threat LLM. Each candidate gets a
+    distinguishability score in [0, 1] from how far it is from the real password in
+    length, character-class composition (PasswordStructuralFeatures ratios), L/U/D/S
+    shape, edit distance, character set and entropy; a logistic model combines them.
+
+    prefilter() drops candidates scoring >= reject_threshold (obvious fakes). If more than
+    `keep` remain and the keep-th and next-ranked candidates are separated by at least
+    `margin` in log-odds, the set is decided locally; otherwise it is borderline and the
+    remaining candidates go to the LLM. A set with at most `keep` plausible candidates is
+    never decided locally: the LLM sees all of them and the user may need regeneration.
+    """
+
+    DEFAULT_WEIGHTS = {"bias": -4.0, "length_gap": 5.0, "composition_gap": 6.0, "shape_gap": 3.0,
+                       "edit_gap": 1.5, "charset_gap": 1.0, "entropy_gap": 2.0}
+
+    def __init__(self, keep=19, reject_threshold=0.8, margin=1.0, weights=None):
+        self.keep = keep
+        self.reject_threshold = reject_threshold
+        self.margin = margin
+        self.weights = dict(weights or self.DEFAULT_WEIGHTS)
+        self._extractor = PasswordStructuralFeatures()
+
+    def features(self, real_pw, candidates):
+        """(len(candidates), len(SURROGATE_FEATURES)) gaps between each candidate and the real password."""
+        structural = self._extractor.extract_batch([real_pw] + list(candidates))
+        ratios, entropy = structural[:, 0:4], structural[:, 4]
+        real_len, real_shape = max(len(real_pw), 1), _shape(real_pw)
+        rows = []
+        for i, candidate in enumerate(candidates, start=1):
+            rows.append([
+                min(abs(len(candidate) - len(real_pw)) / real_len, 1.0),
+                0.5 * float(np.abs(ratios[i] - ratios[0]).sum()),
+                1 - levenshtein_similarity(_shape(candidate), real_shape),
+                1 - levenshtein_similarity(candidate.lower(), real_pw.lower()),
+                1 - jaccard_similarity(candidate, real_pw) if candidate or real_pw else 0.0,
+                min(abs(entropy[i] - entropy[0]) / max(entropy[0], 1.0), 1.0),
+            ])
+        return np.array(rows, dtype=np.float64).reshape(len(candidates), len(SURROGATE_FEATURES))
+
+    def logits(self, real_pw, candidates):
+        X = self.features(real_pw, candidates)
+        w = np.array([self.weights[name] for name in SURROGATE_FEATURES])
+        return X @ w + self.weights["bias"]
+
+    def scores(self, real_pw, candidates):
+        return 1.0 / (1.0 + np.exp(-self.logits(real_pw, candidates)))
+
+    def prefilter(self, real_pw, candidates):
+        """(decided, remaining): decided is the locally chosen honeyword list, or None if the LLM should decide among `remaining`."""
+        candidates = [c for c in dict.fromkeys(candidates) if c != real_pw]
+        if len(candidates) <= self.keep:
+            return None, candidates
+        logits = self.logits(real_pw, candidates)
+        scores = 1.0 / (1.0 + np.exp(-logits))
+        order = np.argsort(logits, kind="stable")
+        remaining = [candidates[i] for i in order if scores[i] < self.reject_threshold]
+        if len(remaining) <= self.keep:
+            return None, candidates
+        ranked = np.sort(logits[scores < self.reject_threshold])
+        if ranked[self.keep] - ranked[self.keep - 1] >= self.margin:
+            return remaining[:self.keep], remaining
+        return None, remaining
+
+    def fit(self, examples, C=1.0):
+        """Refit the weights on LLM decisions: examples of (real_pw, candidates, honeywords the LLM kept)."""
+        from sklearn.linear_model import LogisticRegression
+
+        X, y = [], []
+        for real_pw, candidates, kept in examples:
+            candidates = [c for c in dict.fromkeys(candidates) if c != real_pw]
+            if not candidates:
+                continue
+            X.append(self.features(real_pw, candidates))
+            kept = set(kept)
+            y.extend(0 if c in kept else 1 for c in candidates)  # 1 = the attacker rejected it as a fake
+        model = LogisticRegression(C=C, max_iter=1000).fit(np.vstack(X), np.array(y))
+        self.weights = {"bias": float(model.intercept_[0])}
+        self.weights.update({name: float(w) for name, w in zip(SURROGATE_FEATURES, model.coef_[0])})
+        return self.weights
+
+# ====== Concurrent Filtering Runner ======
+def _load_done(output_path):
+    """Users already written to output_path, truncating a partially written last line left by a crash."""
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, "rb") as f:
+        data = f.read()
+    complete = data[:data.rfind(b"\n") + 1]
+    if len(complete) != len(data):
+        with open(output_path, "wb") as f:
+            f.write(complete)
+    return {json.loads(line)["user"] for line in complete.decode("utf-8").splitlines() if line.strip()}
+
+def filter_honeywords_parallel(input_path, output_path, max_workers=8, users_per_prompt=1,
+                               max_retries=5, base_delay=1.0, max_delay=30.0, surrogate=None):
+    """
+    filter_all_honeywords with up to `max_workers` threat-LLM requests in flight.
+    With users_per_prompt > 1, that many users' candidate sets share one packed
+    prompt; users the packed answer does not cover are retried one by one.
+    Each filtered user is appended to output_path (JSONL, {"user", "password",
+    "honeywords"}) as soon as it completes, so a rerun skips them; users whose
+    requests failed on every retry are not written and are picked up again next run.
+    With a SurrogateAdversary, sets it decides locally are written without an LLM call
+    ("source": "surrogate") and borderline sets go to the LLM without the candidates it
+    rejected.
+    """
+    records = read_records(input_path)
+    done = _load_done(output_path)
+    pending = []
+    for user, entry in enumerate(records):
+        candidates = _candidates(entry)
+        if user in done:
+            continue
+        if not candidates:
+            print(f"[!] Skipping password '{entry.get('password')}' due to missing candidates.")
+            continue
+        pending.append((user, entry.get("password"), candidates))
+    groups = [pending[i:i + users_per_prompt] for i in range(0, len(pending), users_per_prompt)]
+    print(f"[>] {len(records)} users, {len(done)} already filtered, {len(pending)} to go in {len(groups)} requests")
+
+    lock = threading.Lock()
+    stats = {"filtered": 0, "failed": 0, "fallbacks": 0, "local": 0}
+    start = time.perf_counter()
+    local_rows = []
+    if surrogate is not None:
+        borderline = []
+        for user, pw, candidates in pending:
+            decided, remaining = surrogate.prefilter(pw, candidates)
+            if decided is not None:
+                local_rows.append((user, pw, decided))
+            else:
+                borderline.append((user, pw, remaining))
+        groups = [borderline[i:i + users_per_prompt] for i in range(0, len(borderline), users_per_prompt)]
+        print(f"[>] Surrogate decided {len(local_rows)} users locally, {len(borderline)} go to the LLM")
+
+    def run_group(group):
+        if len(group) == 1:
+            results = [None]
+        else:
+            results = query_threat_llm_packed([(pw, c) for _, pw, c in group], max_retries, base_delay, max_delay)
+        rows = []
+        for (user, pw, candidates), filtered in zip(group, results):
+            if filtered is None:
+                if len(group) > 1:
+                    with lock:
+                        stats["fallbacks"] += 1
+                text = _chat_with_backoff(threat_prompt(pw, candidates), 200, max_retries, base_delay, max_delay)
+                filtered = _parse_honeyword_list(text) if text is not None else None
+            rows.append((user, pw, filtered))
+        return rows
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for user, pw, filtered in local_rows:
+            out.write(json.dumps({"user": user, "password": pw, "honeywords": filtered, "source": "surrogate"},
+                                 ensure_ascii=False) + "\n")
+        stats["filtered"] += len(local_rows)
+        stats["local"] = len(local_rows)
+        out.flush()
+        groups_iter = iter(groups)
+        in_flight = set()
+        while True:
+            # Keep at most max_workers groups submitted, so huge inputs are not queued all at once
+            while len(in_flight) < max_workers:
+                group = next(groups_iter, None)
+                if group is None:
+                    break
+                in_flight.add(pool.submit(run_group, group))
+            if not in_flight:
+                break
+            completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                for user, pw, filtered in future.result():
+                    if filtered is None:
+                        stats["failed"] += 1
+                        continue
+                    out.write(json.dumps({"user": user, "password": pw, "honeywords": filtered}, ensure_ascii=False) + "\n")
+                    stats["filtered"] += 1
+                out.flush()
+
+    elapsed = time.perf_counter() - start
+    stats.update({"seconds": elapsed, "users_per_minute": stats["filtered"] / elapsed * 60 if elapsed > 0 else 0.0})
+    print(f"[✔] {stats['filtered']} users filtered, {stats['failed']} failed, saved to: {output_path} "
+          f"({stats['users_per_minute']:.0f} users/min)")
+    return stats
+
+# ====== Offline Benchmark ======
+def benchmark_filtering(num_users=200, latency=0.2, jitter=0.1, error_rate=0.05, configs=((8, 1), (32, 1), (32, 4))):
+    """users/minute of the serial filter_all_honeywords vs filter_honeywords_parallel (workers, users per prompt) against a MockLLMServer."""
+    import io
+    import tempfile
+    import contextlib
+    from mock_llm_server import mock_llm_environment
+
+    rnd = random.Random(0)
+    records = []
+    for i in range(num_users):
+        pw = f"user{i}pass{rnd.randint(0, 999)}"
+        records.append({"password": pw, "honeywords": [pw] + [f"{pw}{rnd.randint(0, 99)}" for _ in range(29)]})
+
+    report = {"users": num_users, "latency_s": latency, "error_rate": error_rate}
+    with mock_llm_environment(use_cache=False, latency=latency, jitter=jitter, error_rate=error_rate) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "honeywords.json")
+        with open(input_path, "w", encoding="utf-8") as f:
+            json.dump(records, f)
+
+        serial_users = max(num_users // 10, 1)
+        with open(os.path.join(tmp, "serial.json"), "w", encoding="utf-8") as f:
+            json.dump(records[:serial_users], f)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            filter_all_honeywords(os.path.join(tmp, "serial.json"), os.path.join(tmp, "serial_out.json"))
+        report["serial_users_per_minute"] = serial_users / (time.perf_counter() - start) * 60
+
+        for workers, per_prompt in configs:
+            output_path = os.path.join(tmp, f"out_{workers}_{per_prompt}.jsonl")
+            requests_before = server.requests
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = filter_honeywords_parallel(input_path, output_path, max_workers=workers,
+                                                   users_per_prompt=per_prompt, base_delay=0.1, max_delay=2.0)
+            report[f"parallel_{workers}w_{per_prompt}u_users_per_minute"] = stats["users_per_minute"]
+            report[f"parallel_{workers}w_{per_prompt}u_requests"] = server.requests - requests_before
+            report[f"parallel_{workers}w_{per_prompt}u_complete"] = stats["filtered"] == num_users
+
+    print("📊 Adversarial filtering benchmark (mock endpoint):")
+    for k, v in report.items():
+        print(f"  {k}: {v:,.2f}" if isinstance(v, float) else f"  {k}: {v}")
+    return report
+
+def _recorded_decisions(input_path, output_path):
+    """(real_pw, candidates) sets and the honeywords the threat LLM kept, from a filter_honeywords_parallel run."""
+    records = read_records(input_path)
+    users, llm_kept = [], []
+    for record in read_records(output_path):
+        if record.get("source") == "surrogate":
+            continue
+        entry = records[record["user"]]
+        users.append((entry.get("password"), _candidates(entry)))
+        llm_kept.append(record["honeywords"])
+    return users, llm_kept
+
+def benchmark_surrogate(num_users=300, train_fraction=0.3, latency=0.05, max_workers=32, seed=0, recorded=None):
+    """
+    LLM-call reduction and agreement of the SurrogateAdversary with the threat LLM. With
+    recorded=(input_path, output_path) of an earlier filter_honeywords_parallel run without
+    a surrogate, the real LLM's decisions are the reference. Otherwise candidate sets are
+    built from benchmark_dataset.csv (12-24 plausible variants of each real password plus
+    0-12 unrelated passwords as obvious fakes) and sent to a MockLLMServer, whose attacker
+    keeps a random 19, so agreement there is only a chance baseline. The surrogate is scored
+    with its default weights and after fit() on the first train_fraction of users.
+    """
+    if recorded is not None:
+        users, llm_kept = _recorded_decisions(*recorded)
+        reference = "recorded threat-LLM decisions"
+    else:
+        import pandas as pd
+        from mock_llm_server import mock_llm_environment, mutate_password
+
+        rnd = random.Random(seed)
+        pool = pd.read_csv("benchmark_dataset.csv", dtype=str, keep_default_na=False)["Password"].tolist()
+        users = []
+        for real_pw in rnd.sample(pool, num_users):
+            variants = list(dict.fromkeys(mutate_password(real_pw, rnd) for _ in range(40)))
+            candidates = [c for c in variants if c != real_pw][:rnd.randint(12, 24)] + rnd.sample(pool, rnd.randint(0, 12))
+            rnd.shuffle(candidates)
+            users.append((real_pw, candidates))
+
+        with mock_llm_environment(use_cache=False, latency=latency, seed=seed):
+            with ThreadPoolExecutor(max_workers=max_workers) as pool_exec:
+                llm_kept = list(pool_exec.map(lambda u: query_threat_llm(*u), users))
+        reference = "mock threat LLM, random picks"
+
+    split = int(len(users) * train_fraction)
+    fitted = SurrogateAdversary()
+    fitted.fit([(pw, c, kept) for (pw, c), kept in zip(users[:split], llm_kept[:split])])
+    report = {"users": len(users) - split}
+    for name, surrogate in (("default", SurrogateAdversary()), ("fitted", fitted)):
+        local, kept_overlap, rejected, rejected_agree, sent, total = 0, [], 0, 0, 0, 0
+        start = time.perf_counter()
+        decisions = [surrogate.prefilter(pw, c) for pw, c in users[split:]]
+        elapsed = time.perf_counter() - start
+        for (pw, candidates), kept, (decided, remaining) in zip(users[split:], llm_kept[split:], decisions):
+            kept = set(kept)
+            total += len(candidates)
+            dropped = set(candidates) - set(remaining) - {pw}
+            rejected += len(dropped)
+            rejected_agree += len(dropped - kept)
+            if decided is not None:
+                local += 1
+                kept_overlap.append(len(set(decided) & kept) / max(len(kept), 1))
+            else:
+                sent += len(remaining)
+        report[f"{name}_llm_call_reduction"] = local / report["users"]
+        report[f"{name}_agreement_on_local"] = float(np.mean(kept_overlap)) if kept_overlap else float("nan")
+        report[f"{name}_rejected_also_rejected_by_llm"] = rejected_agree / rejected if rejected else float("nan")
+        report[f"{name}_candidates_sent_fraction"] = sent / total
+        report[f"{name}_ms_per_user"] = elapsed / report["users"] * 1000
+
+    print(f"📊 Surrogate adversary benchmark ({reference}):")
+    for k, v in report.items():
+        print(f"  {k}: {v:,.3f}" if isinstance(v, float) else f"  {k}: {v}")
+    return report
+
 # ====== Main Entry ======
 if __name__ == "__main__":
-    filter_all_honeywords("abc123_honeywords.json", "filtered_honeywords.json")
+    if "--benchmark" in sys.argv:
+        benchmark_filtering()
+    elif "--benchmark-surrogate" in sys.argv:
+        args = [a for a in sys.argv[1:] if not a.startswith("--")]
+        benchmark_surrogate(recorded=tuple(args[:2]) if len(args) >= 2 else None)
+    elif len([a for a in sys.argv[1:] if not a.startswith("--")]) >= 2:
+        args = [a for a in sys.argv[1:] if not a.startswith("--")]
+        filter_honeywords_parallel(args[0], args[1],
+                                   max_workers=int(args[2]) if len(args) > 2 else 8,
+                                   users_per_prompt=int(args[3]) if len(args) > 3 else 1,
+                                   surrogate=SurrogateAdversary() if "--surrogate" in sys.argv else None)
+    else:
+        filter_all_honeywords("abc123_honeywords.json", "filtered_honeywords.json")
@@ -1,10 +1,16 @@
+import os
+import sys
 import json
+import math
 import random
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import List, Dict, Any
 from MoP_Router import get_password_class_prob
-from similar_password_finder import recommend_similar_passwords_from_csv
+from similar_password_finder import load_similar_password_index, levenshtein_similarity
 from feature_extraction import extract_semantic_feature
+from semantic_cache import pii_categories
 import openai
 import numpy as np
 
@@ -21,16 +27,47 @@ PROMPT_TEMPLATES = {
 }
 
 # ========== PII Masking ==========
-def mask_sensitive_segments(password: str) -> str:
-    result = extract_semantic_feature(password)
-    reason = result.get("Reason", "")
-    for pii_term in ["name", "email", "birthday", "phone", "ID"]:
-        if pii_term in reason.lower():
-            return "[MASK]"
+def mask_sensitive_segments(password: str, rate_limiter=None) -> str:
+    result = extract_semantic_feature(password, rate_limiter=rate_limiter)
+    if pii_categories(result):
+        return "[MASK]"
     return password
 
+# ========== Adaptive Oversampling ==========
+class PromptTypeStats:
+    """
+    Running per-prompt-type counts of returned vs accepted candidates. The oversampling
+    factor for a type is safety / acceptance rate, clamped to [1, max_factor]; until a
+    type has min_samples candidates it stays at the default of 4.
+    """
+
+    def __init__(self, default_factor: float = 4.0, safety: float = 1.5, max_factor: float = 8.0, min_samples: int = 20):
+        self.default_factor = default_factor
+        self.safety = safety
+        self.max_factor = max_factor
+        self.min_samples = min_samples
+        self.returned = [0] * len(PROMPT_TEMPLATES)
+        self.accepted = [0] * len(PROMPT_TEMPLATES)
+        self._lock = threading.Lock()
+
+    def record(self, k: int, returned: int, accepted: int):
+        with self._lock:
+            self.returned[k] += returned
+            self.accepted[k] += accepted
+
+    def oversampling(self, k: int) -> float:
+        with self._lock:
+            returned, accepted = self.returned[k], self.accepted[k]
+        if returned < self.min_samples:
+            return self.default_factor
+        rate = max(accepted, 1) / returned
+        return min(self.max_factor, max(1.0, self.safety / rate))
+
+PROMPT_TYPE_STATS = PromptTypeStats()
+
 # ========== Prompt Construction ==========
-def build_prompts(password: str, neighbors: List[str], weights: List[float], total_count: int) -> List[tuple]:
+def build_prompts(password: str, neighbors: List[str], weights: List[float], total_count: int,
+                  samples_per_request: int = 1, type_stats: PromptTypeStats = None, rate_limiter=None) -> List[tuple]:
     weights = list(weights)
     type_counts = [round(w * total_count) for w in weights]
     total = sum(type_counts)
@@ -43,17 +80,25 @@ def build_prompts(password: str, neighbors: List[str], weights: List[float], tot
 
     print(f"🧩 Prompt distribution by type: {type_counts}")
     prompts = []
+    masked_pw = mask_sensitive_segments(password, rate_limiter) if type_counts[2] else password
     for k in range(4):
-        for _ in range(type_counts[k] * 4):  # Oversample for retry flexibility
+        # Oversample for retry flexibility: 4x, or adapted to the measured acceptance rate of type k
+        oversample = type_stats.oversampling(k) if type_stats is not None else 4
+        for _ in range(math.ceil(type_counts[k] * oversample / samples_per_request)):
             examples = random.sample(neighbors, min(5, len(neighbors)))
-            masked_pw = mask_sensitive_segments(password) if k == 2 else password
-            prompt = PROMPT_TEMPLATES[k].format(examples=", ".join(examples), password=masked_pw)
+            prompt = PROMPT_TEMPLATES[k].format(examples=", ".join(examples), password=masked_pw if k == 2 else password)
             prompts.append((k, prompt))
     random.shuffle(prompts)
     return prompts
 
 # ========== GPT Query with Retry ==========
-def query_gpt(prompt: str, max_retries: int = 3, retry_delay: float = 2.0) -> str:
+def query_gpt_samples(prompt: str, n: int = 1, max_retries: int = 3, retry_delay: float = 2.0) -> tuple:
+    """
+    Ask for n completions of prompt in one request. Returns (completions, usage) where
+    usage holds prompt_tokens, completion_tokens and latency (seconds, incl. retries).
+    """
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "latency": 0.0}
+    start = time.perf_counter()
     for attempt in range(max_retries):
         try:
             response = openai.ChatCompletion.create(
@@ -64,47 +109,307 @@ def query_gpt(prompt: str, max_retries: int = 3, retry_delay: float = 2.0) -> st
                 ],
                 temperature=0.7,
                 max_tokens=16,
-                n=1,
+                n=n,
             )
-            return response.choices[0].message['content'].strip()
+            reported = response.get("usage") or {}
+            usage["prompt_tokens"] = reported.get("prompt_tokens", 0)
+            usage["completion_tokens"] = reported.get("completion_tokens", 0)
+            usage["latency"] = time.perf_counter() - start
+            return [choice.message['content'].strip() for choice in response.choices], usage
         except Exception as e:
             print(f"⚠️ GPT call failed (attempt {attempt+1}/{max_retries}): {e}")
             time.sleep(retry_delay)
-    return ""
+    usage["latency"] = time.perf_counter() - start
+    return [], usage
 
-# ========== Main Generation Function ==========
-def generate_honeywords(password: str, total_count: int = 30, save_path: str = None) -> Dict[str, Any]:
-    print(f"\n🔐 Generating honeywords for: {password}")
-    weights = get_password_class_prob(password)
-    print(f"📊 Class probabilities: {weights}")
-    neighbors = recommend_similar_passwords_from_csv(password, "benchmark_dataset_hash.csv", num_recommendations=10)
-    print(f"🔍 Similar passwords: {neighbors}")
+def query_gpt(prompt: str, max_retries: int = 3, retry_delay: float = 2.0) -> str:
+    completions, _ = query_gpt_samples(prompt, 1, max_retries, retry_delay)
+    return completions[0] if completions else ""
+
+# ========== Concurrent Generation Engine ==========
+def clean_honeyword(raw: str) -> str:
+    tokens = raw.strip().split()
+    return tokens[0].strip(".,:\"'") if tokens else ""
+
+_LEET_MAP = str.maketrans({"@": "a", "4": "a", "3": "e", "1": "i", "!": "i", "0": "o", "$": "s", "5": "s", "7": "t"})
+
+def normalize_honeyword(word: str) -> str:
+    """Case-, leet- and whitespace-insensitive form used for client-side deduplication."""
+    return "".join(word.lower().translate(_LEET_MAP).split())
+
+def select_exclusions(password: str, honeywords: List[str], max_exclusions: int) -> List[str]:
+    """The accepted honeywords closest to the password, i.e. the ones the model is most likely to repeat."""
+    if len(honeywords) <= max_exclusions:
+        return list(honeywords)
+    ranked = sorted(honeywords, key=lambda w: levenshtein_similarity(password, w), reverse=True)
+    return ranked[:max_exclusions]
 
-    prompt_pool = build_prompts(password, neighbors, weights, total_count)
-    honeyword_set = set()
-    result = []
-    prompt_idx = 0
+class GenerationJob:
+    """Generation state for one password: its prompt pool, accepted honeywords and requests in flight."""
 
-    print(f"\n🚀 Generating {total_count} honeywords...")
-    while len(honeyword_set) < total_count and prompt_idx < len(prompt_pool):
-        k, base_prompt = prompt_pool[prompt_idx]
-        prompt_idx += 1
+    def __init__(self, password: str, total_count: int, prompt_pool: List[tuple] = None, user: int = None,
+                 accepted: List[Dict[str, Any]] = None, verbose: bool = True, samples_per_request: int = 1,
+                 type_stats: PromptTypeStats = None, max_exclusions: int = None,
+                 weights: List[float] = None, neighbors: List[str] = None):
+        self.password = password
+        self.total_count = total_count
+        self.max_exclusions = max_exclusions
+        self.samples_per_request = samples_per_request
+        self.type_stats = type_stats
+        self.prompt_pool = prompt_pool
+        self.user = user
+        self.verbose = verbose
+        self.weights = weights
+        self.neighbors = neighbors
+        self.error = None
+        self.result = list(accepted or [])
+        self.honeyword_set = {item["honeyword"] for item in self.result}
+        self.normalized_set = {normalize_honeyword(w) for w in self.honeyword_set}
+        self.normalized_set.add(normalize_honeyword(password))
+        self.prompt_idx = 0
+        self.in_flight = 0
+        self.closed = False
 
-        exclusions = list(honeyword_set)
+    @property
+    def missing(self) -> int:
+        return self.total_count - len(self.honeyword_set)
+
+    @property
+    def finished(self) -> bool:
+        if self.missing <= 0:
+            return True
+        return self.prompt_pool is not None and self.prompt_idx >= len(self.prompt_pool) and self.in_flight == 0
+
+    def wants_request(self) -> bool:
+        return (not self.closed and self.prompt_pool is not None
+                and self.prompt_idx < len(self.prompt_pool)
+                and self.in_flight * self.samples_per_request < self.missing)
+
+    def next_prompt(self) -> tuple:
+        k, base_prompt = self.prompt_pool[self.prompt_idx]
+        self.prompt_idx += 1
+        self.in_flight += 1
+
+        if self.max_exclusions is None:
+            exclusions = list(self.honeyword_set)
+        else:
+            # Deduplication happens client-side; only a bounded, most-similar subset goes into the prompt
+            exclusions = select_exclusions(self.password, [item["honeyword"] for item in self.result], self.max_exclusions)
         full_prompt = base_prompt
         if exclusions:
             full_prompt += f" Avoid generating these: {', '.join(exclusions)}."
 
-        print(f"🔄 Generating entry {len(honeyword_set)+1}...")
-        honeyword = query_gpt(full_prompt)
-        clean = honeyword.strip().split()[0].strip(".,:\"'")
+        if self.verbose:
+            print(f"🔄 Generating entry {len(self.honeyword_set) + (self.in_flight - 1) * self.samples_per_request + 1}...")
+        return k, full_prompt
 
-        if clean and clean.lower() != password.lower() and clean not in honeyword_set:
-            honeyword_set.add(clean)
-            result.append({"type": k, "honeyword": clean})
-            print(f"[{len(honeyword_set):02d}/{total_count}] ✅ type-{k} → {clean}")
-        else:
-            print(f"[{len(honeyword_set):02d}/{total_count}] ⚠️ type-{k} → duplicate or invalid")
+    def accept(self, k: int, completions: List[str]) -> List[Dict[str, Any]]:
+        """Record the completions of one request; returns the newly accepted items."""
+        self.in_flight -= 1
+        if self.closed or self.missing <= 0:
+            return []
+        accepted = []
+        examined = 0
+        for raw in completions or [""]:
+            if self.missing <= 0:
+                break
+            examined += 1
+            clean = clean_honeyword(raw)
+            if self.max_exclusions is not None and normalize_honeyword(clean) in self.normalized_set:
+                clean = ""
+            if clean and clean.lower() != self.password.lower() and clean not in self.honeyword_set:
+                self.honeyword_set.add(clean)
+                self.normalized_set.add(normalize_honeyword(clean))
+                item = {"type": k, "honeyword": clean}
+                self.result.append(item)
+                accepted.append(item)
+                if self.verbose:
+                    print(f"[{len(self.honeyword_set):02d}/{self.total_count}] ✅ type-{k} → {clean}")
+            elif self.verbose:
+                print(f"[{len(self.honeyword_set):02d}/{self.total_count}] ⚠️ type-{k} → duplicate or invalid")
+        if self.type_stats is not None:
+            # Completions left over once the job is full say nothing about the acceptance rate
+            self.type_stats.record(k, examined, len(accepted))
+        return accepted
+
+class RateLimiter:
+    """Spaces calls to acquire() at least 1/requests_per_second apart, across threads."""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class RequestScheduler:
+    """
+    Runs many GenerationJobs through one shared request budget: at most max_in_flight
+    GPT calls outstanding (and at most requests_per_second started) across all jobs.
+    Requests are handed out round-robin over the active jobs, a job never has more
+    requests in flight than honeywords it still misses, and once a job is complete its
+    outstanding requests are abandoned instead of awaited. An abandoned request that has
+    not started is cancelled and not counted in `requests`; one already sent keeps running
+    on its worker thread until the API answers, is counted in `abandoned`, and its tokens
+    are never added to the cost report.
+    """
+
+    def __init__(self, max_in_flight: int = 8, requests_per_second: float = None):
+        self.max_in_flight = max_in_flight
+        self.rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency = 0.0
+        self.accepted = 0
+        self.abandoned = 0
+
+    def _query(self, prompt: str, n: int) -> tuple:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return query_gpt_samples(prompt, n)
+
+    def cost_report(self) -> Dict[str, float]:
+        """Requests, tokens and request latency in total and per accepted honeyword."""
+        per = max(self.accepted, 1)
+        return {
+            "accepted": self.accepted,
+            "requests": self.requests,
+            "abandoned_requests": self.abandoned,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "requests_per_honeyword": self.requests / per,
+            "tokens_per_honeyword": (self.prompt_tokens + self.completion_tokens) / per,
+            "latency_per_honeyword": self.latency / per,
+        }
+
+    def run(self, jobs, prepare=None, on_accept=None, on_finish=None, on_prepare=None, max_active_jobs: int = None):
+        """
+        prepare(job, rate_limiter) returns job.prompt_pool for a job that has none; it
+        runs on a worker thread and its own LLM calls must go through rate_limiter. If it
+        raises, job.error is set and the job finishes without requests. on_prepare(job),
+        on_accept(job, item) and on_finish(job) are called from this thread once the pool
+        is in place, as honeywords are accepted and as jobs complete.
+        """
+        max_active_jobs = max_active_jobs or self.max_in_flight
+        jobs = iter(jobs)
+        jobs_left = True
+        active = []
+        pending = {}
+
+        pool = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        try:
+            while True:
+                while jobs_left and len(active) < max_active_jobs:
+                    job = next(jobs, None)
+                    if job is None:
+                        jobs_left = False
+                    elif job.finished and (job.prompt_pool is not None or prepare is None):
+                        job.closed = True
+                        if on_finish:
+                            on_finish(job)
+                    else:
+                        active.append(job)
+                        if job.prompt_pool is None:
+                            pending[pool.submit(prepare, job, self.rate_limiter)] = (job, None)
+
+                issued = True
+                while issued and len(pending) < self.max_in_flight:
+                    issued = False
+                    for job in list(active):
+                        if len(pending) >= self.max_in_flight:
+                            break
+                        if job.wants_request():
+                            k, prompt = job.next_prompt()
+                            pending[pool.submit(self._query, prompt, job.samples_per_request)] = (job, k)
+                            self.requests += 1
+                            issued = True
+                    if active:
+                        active.append(active.pop(0))  # rotate so every job gets the first free slot in turn
+
+                if not pending and not active and not jobs_left:
+                    break
+                if pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job, k = pending.pop(future)
+                        if k is None:
+                            try:
+                                job.prompt_pool = future.result()
+                            except Exception as e:
+                                job.error = e
+                                job.prompt_pool = []
+                            else:
+                                if on_prepare:
+                                    on_prepare(job)
+                            continue
+                        completions, usage = future.result()
+                        self.prompt_tokens += usage["prompt_tokens"]
+                        self.completion_tokens += usage["completion_tokens"]
+                        self.latency += usage["latency"]
+                        for item in job.accept(k, completions):
+                            self.accepted += 1
+                            if on_accept:
+                                on_accept(job, item)
+
+                for job in list(active):
+                    if job.prompt_pool is not None and job.finished:
+                        job.closed = True
+                        active.remove(job)
+                        if on_finish:
+                            on_finish(job)
+        finally:
+            # Every queued future is in pending, so cancelling them by hand leaves the pool
+            # nothing to start (ThreadPoolExecutor.shutdown's cancel_futures needs Python 3.9)
+            for future, (job, k) in pending.items():
+                if future.cancel():
+                    if k is not None:
+                        self.requests -= 1
+                elif k is not None and not future.done():
+                    self.abandoned += 1
+            pool.shutdown(wait=False)
+
+def run_generation(password: str, prompt_pool: List[tuple], total_count: int, max_in_flight: int = 8,
+                   samples_per_request: int = 1, type_stats: PromptTypeStats = None,
+                   scheduler: RequestScheduler = None, max_exclusions: int = None) -> List[Dict[str, Any]]:
+    """
+    Issue prompts from prompt_pool with up to max_in_flight requests outstanding,
+    accepting unique honeywords as responses arrive. With max_in_flight=1 and
+    samples_per_request=1 this is the original sequential loop. max_exclusions bounds
+    the "Avoid generating these" suffix and switches to normalized deduplication.
+    """
+    job = GenerationJob(password, total_count, prompt_pool, samples_per_request=samples_per_request,
+                        type_stats=type_stats, max_exclusions=max_exclusions)
+    (scheduler or RequestScheduler(max_in_flight)).run([job])
+    return job.result
+
+# ========== Main Generation Function ==========
+def generate_honeywords(password: str, total_count: int = 30, save_path: str = None, max_in_flight: int = 8,
+                        samples_per_request: int = 1, adaptive_oversampling: bool = False,
+                        max_exclusions: int = None) -> Dict[str, Any]:
+    print(f"\n🔐 Generating honeywords for: {password}")
+    weights = get_password_class_prob(password)
+    print(f"📊 Class probabilities: {weights}")
+    neighbors = load_similar_password_index("benchmark_dataset_hash.csv").recommend(password, num_recommendations=10)
+    print(f"🔍 Similar passwords: {neighbors}")
+
+    type_stats = PROMPT_TYPE_STATS if adaptive_oversampling else None
+    prompt_pool = build_prompts(password, neighbors, weights, total_count, samples_per_request, type_stats)
+
+    print(f"\n🚀 Generating {total_count} honeywords ({max_in_flight} requests in flight, {samples_per_request} per request)...")
+    scheduler = RequestScheduler(max_in_flight)
+    result = run_generation(password, prompt_pool, total_count, samples_per_request=samples_per_request,
+                            type_stats=type_stats, scheduler=scheduler, max_exclusions=max_exclusions)
+    honeyword_set = {item["honeyword"] for item in result}
+    cost = scheduler.cost_report()
+    print(f"💰 Per accepted honeyword: {cost['requests_per_honeyword']:.2f} requests, "
+          f"{cost['tokens_per_honeyword']:.1f} tokens, {cost['latency_per_honeyword']:.3f}s request latency")
 
     if len(honeyword_set) < total_count:
         print("❌ Failed to generate enough honeywords. Consider increasing prompt volume or refining templates.")
@@ -117,7 +422,8 @@ def generate_honeywords(password: str, total_count: int = 30, save_path: str = N
         "password": password,
         "weights": [float(w) for w in weights],
         "neighbors": neighbors,
-        "honeywords": result
+        "honeywords": result,
+        "cost": cost
     }
 
     if save_path:
@@ -127,7 +433,199 @@ def generate_honeywords(password: str, total_count: int = 30, save_path: str = N
 
     return output
 
+# ========== Batch Multi-User Generation ==========
+def _read_passwords(input_path: str) -> List[str]:
+    if input_path.lower().endswith(".csv"):
+        import pandas as pd
+        return [str(pw) for pw in pd.read_csv(input_path, usecols=["Password"], dtype=str, keep_default_na=False)["Password"]]
+    with open(input_path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\r\n") for line in f if line.strip()]
+
+def _load_jsonl(path: str) -> List[dict]:
+    """Records of a JSONL file, truncating a partially written last line left by a crash."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+    complete = data[:data.rfind(b"\n") + 1]
+    if len(complete) != len(data):
+        with open(path, "wb") as f:
+            f.write(complete)
+    return [json.loads(line) for line in complete.decode("utf-8").splitlines() if line.strip()]
+
+def _prepare_job(job: GenerationJob, rate_limiter: RateLimiter = None) -> List[tuple]:
+    # Weights and neighbors journaled by an earlier run are reused instead of recomputed
+    if job.weights is None:
+        job.weights = get_password_class_prob(job.password, rate_limiter=rate_limiter)
+    if job.neighbors is None:
+        job.neighbors = load_similar_password_index("benchmark_dataset_hash.csv").recommend(job.password, num_recommendations=10)
+    if job.missing <= 0:
+        return []
+    return build_prompts(job.password, job.neighbors, job.weights, job.total_count,
+                         job.samples_per_request, job.type_stats, rate_limiter)
+
+def generate_honeywords_batch(input_path: str, output_path: str, total_count: int = 30, max_in_flight: int = 32,
+                              requests_per_second: float = None, max_active_users: int = None,
+                              samples_per_request: int = 1, adaptive_oversampling: bool = False,
+                              max_exclusions: int = None) -> Dict[str, Any]:
+    """
+    Generate honeywords for every password in input_path (one per line, or a CSV
+    with a Password column) and append one JSON record per user to output_path.
+    All users share one RequestScheduler budget. Each user's weights and neighbors
+    and its accepted honeywords are journaled to output_path + ".progress", so a
+    rerun skips finished users and continues partially generated ones. A user whose
+    routing fails is reported and left in the journal for the next run.
+    """
+    passwords = _read_passwords(input_path)
+    progress_path = output_path + ".progress"
+    done_users = {record["user"] for record in _load_jsonl(output_path)}
+    accepted, prepared = {}, {}
+    for entry in _load_jsonl(progress_path):
+        if entry["user"] in done_users:
+            continue
+        if "weights" in entry:
+            prepared[entry["user"]] = entry
+        else:
+            accepted.setdefault(entry["user"], []).append({"type": entry["type"], "honeyword": entry["honeyword"]})
+    print(f"👥 {len(passwords)} users, {len(done_users)} already done, {len(accepted)} partially generated")
+
+    type_stats = PROMPT_TYPE_STATS if adaptive_oversampling else None
+    jobs = (GenerationJob(pw, total_count, user=user, accepted=accepted.get(user), verbose=False,
+                          samples_per_request=samples_per_request, type_stats=type_stats,
+                          max_exclusions=max_exclusions, weights=prepared.get(user, {}).get("weights"),
+                          neighbors=prepared.get(user, {}).get("neighbors"))
+            for user, pw in enumerate(passwords) if user not in done_users)
+    scheduler = RequestScheduler(max_in_flight, requests_per_second)
+    finished = len(done_users)
+    failed = 0
+    start = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, open(progress_path, "a", encoding="utf-8") as journal:
+        def on_prepare(job):
+            if job.user not in prepared:
+                entry = {"user": job.user, "weights": [float(w) for w in job.weights], "neighbors": job.neighbors}
+                journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                journal.flush()
+
+        def on_accept(job, item):
+            journal.write(json.dumps({"user": job.user, **item}, ensure_ascii=False) + "\n")
+            journal.flush()
+
+        def on_finish(job):
+            nonlocal finished, failed
+            if job.error is not None:
+                failed += 1
+                print(f"❌ user {job.user}: preparation failed ({job.error}); kept in the journal for a rerun")
+                return
+            out.write(json.dumps({
+                "user": job.user,
+                "password": job.password,
+                "weights": [float(w) for w in job.weights],
+                "neighbors": job.neighbors,
+                "honeywords": job.result,
+            }, ensure_ascii=False) + "\n")
+            out.flush()
+            finished += 1
+            status = "✅" if job.missing <= 0 else "❌"
+            print(f"[{finished}/{len(passwords)}] {status} user {job.user}: {len(job.result)}/{job.total_count} honeywords")
+
+        scheduler.run(jobs, prepare=_prepare_job, on_accept=on_accept, on_finish=on_finish,
+                      on_prepare=on_prepare, max_active_jobs=max_active_users)
+
+    if not failed:
+        os.remove(progress_path)
+    elapsed = time.perf_counter() - start
+    users = finished - len(done_users)
+    stats = {"users": users, "failed": failed, "seconds": elapsed, "users_per_minute": users / elapsed * 60 if elapsed > 0 else 0.0,
+             **scheduler.cost_report()}
+    print(f"\n💾 Saved to: {output_path}  ({users} users in {elapsed:.1f}s, {scheduler.requests} requests)")
+    return stats
+
+# ========== Offline Benchmark ==========
+def benchmark_generation(passwords=("abc123", "lb1990401", "QwErTy!123"), total_count=30,
+                         in_flight_values=(1, 4, 8, 16), latency=0.2):
+    """Wall-clock generation time per in-flight limit against a local MockLLMServer."""
+    from mock_llm_server import mock_llm_environment
+
+    with mock_llm_environment(latency=latency):
+        report = []
+        for max_in_flight in in_flight_values:
+            random.seed(0)
+            start = time.perf_counter()
+            generated = [len(generate_honeywords(pw, total_count, max_in_flight=max_in_flight)["honeywords"]) for pw in passwords]
+            elapsed = time.perf_counter() - start
+            report.append({"max_in_flight": max_in_flight, "seconds_per_password": elapsed / len(passwords),
+                           "honeywords_per_password": sum(generated) / len(generated)})
+
+    base = report[0]["seconds_per_password"]
+    print(f"\n📊 Generation benchmark ({latency * 1000:.0f} ms mock latency, {total_count} honeywords/password):")
+    for r in report:
+        r["speedup"] = base / r["seconds_per_password"]
+        print(f"  in-flight {r['max_in_flight']:>3}: {r['seconds_per_password']:.2f}s/password  x{r['speedup']:.1f}")
+    return report
+
+def benchmark_sampling(passwords=("abc123", "lb1990401", "QwErTy!123", "P@ssw0rd123", "LiLei1990"), total_count=30,
+                       samples_per_request=4, latency=0.2):
+    """Cost per accepted honeyword: n=1 with fixed 4x oversampling vs n>1 with adaptive oversampling."""
+    from mock_llm_server import mock_llm_environment
+
+    modes = [("n=1, fixed 4x", 1, False), (f"n={samples_per_request}, adaptive", samples_per_request, True)]
+    report = {}
+    with mock_llm_environment(latency=latency):
+        for name, n, adaptive in modes:
+            random.seed(0)
+            totals = {"accepted": 0, "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency": 0.0}
+            for pw in passwords:
+                cost = generate_honeywords(pw, total_count, samples_per_request=n, adaptive_oversampling=adaptive)["cost"]
+                totals["accepted"] += cost["accepted"]
+                totals["requests"] += cost["requests"]
+                totals["prompt_tokens"] += cost["prompt_tokens"]
+                totals["completion_tokens"] += cost["completion_tokens"]
+                totals["latency"] += cost["latency_per_honeyword"] * cost["accepted"]
+            per = max(totals["accepted"], 1)
+            report[name] = {
+                "requests_per_honeyword": totals["requests"] / per,
+                "tokens_per_honeyword": (totals["prompt_tokens"] + totals["completion_tokens"]) / per,
+                "latency_per_honeyword": totals["latency"] / per,
+                "oversampling": [round(PROMPT_TYPE_STATS.oversampling(k), 2) for k in range(4)] if adaptive else [4] * 4,
+            }
+
+    print(f"\n📊 Sampling benchmark ({len(passwords)} passwords x {total_count} honeywords):")
+    for name, r in report.items():
+        print(f"  {name:<16} {r['requests_per_honeyword']:.2f} req  {r['tokens_per_honeyword']:.1f} tok  "
+              f"{r['latency_per_honeyword'] * 1000:.0f} ms per honeyword  oversampling={r['oversampling']}")
+    return report
+
+def benchmark_exclusions(passwords=("abc123", "lb1990401", "QwErTy!123", "P@ssw0rd123", "LiLei1990"), total_count=30,
+                         max_exclusions=8, latency=0.05):
+    """Prompt tokens per password: full "Avoid generating these" suffix vs a bounded one."""
+    from mock_llm_server import mock_llm_environment
+
+    report = {}
+    with mock_llm_environment(latency=latency):
+        for name, limit in (("full suffix", None), (f"bounded ({max_exclusions})", max_exclusions)):
+            random.seed(0)
+            costs = [generate_honeywords(pw, total_count, max_exclusions=limit)["cost"] for pw in passwords]
+            report[name] = {
+                "prompt_tokens_per_password": sum(c["prompt_tokens"] for c in costs) / len(passwords),
+                "requests_per_password": sum(c["requests"] for c in costs) / len(passwords),
+                "honeywords_per_password": sum(c["accepted"] for c in costs) / len(passwords),
+            }
+
+    print(f"\n📊 Exclusion context benchmark ({len(passwords)} passwords x {total_count} honeywords):")
+    for name, r in report.items():
+        print(f"  {name:<12} {r['prompt_tokens_per_password']:.0f} prompt tokens, "
+              f"{r['requests_per_password']:.1f} requests, {r['honeywords_per_password']:.1f} honeywords per password")
+    return report
+
 # ========== CLI Test Entry ==========
 if __name__ == "__main__":
-    test_password = "abc123"
-    generate_honeywords(test_password, save_path="abc123_honeywords.json")
+    if "--benchmark" in sys.argv:
+        benchmark_generation()
+        benchmark_sampling()
+        benchmark_exclusions()
+    elif len(sys.argv) == 3:
+        generate_honeywords_batch(sys.argv[1], sys.argv[2])
+    else:
+        test_password = "abc123"
+        generate_honeywords(test_password, save_path="abc123_honeywords.json")
@@ -1,27 +1,103 @@
-import pandas as pd
-import lightgbm as lgb
-from feature_extraction import extract_all_features
+import os
+import threading
+from feature_extraction import extract_all_features, extract_structural_matrix, resolve_pii_probabilities, FEATURE_NAMES
+from compiled_router import CompiledTreeModel
 import numpy as np
 
 # ========== Configuration ==========
 MODEL_PATH = "router_model.txt"
+# "compiled" evaluates the trees with NumPy (compiled_router): as fast as lightgbm.Booster for one
+# password, faster for large batches, and without lightgbm's import cost; "lightgbm" uses the Booster
+ROUTER_BACKEND = os.environ.get("MOPHONEY_ROUTER_BACKEND", "compiled")
 
-# ========== 1. Load the Pretrained LightGBM Model ==========
-model = lgb.Booster(model_file=MODEL_PATH)
+# ========== 1. Load the Pretrained Router Model (on first use) ==========
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+
+def get_router_model():
+    """The router model for ROUTER_BACKEND, loaded on first use; both expose predict(features)."""
+    global _MODEL
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            if ROUTER_BACKEND == "lightgbm":
+                import lightgbm as lgb
+                _MODEL = lgb.Booster(model_file=MODEL_PATH)
+            elif ROUTER_BACKEND == "compiled":
+                _MODEL = CompiledTreeModel.from_file(MODEL_PATH)
+            else:
+                raise ValueError(f"Unknown router backend: {ROUTER_BACKEND}")
+    return _MODEL
+
+def __getattr__(name):
+    # `MoP_Router.model` keeps working, without loading the model at import time
+    if name == "model":
+        return get_router_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ========== 2. Inference Function ==========
-def get_password_class_prob(password: str) -> list:
+def get_password_class_prob(password: str, rate_limiter=None) -> list:
     """
     Given a password string, return the classification probability distribution
     used for MoP-Mixer routing.
     """
-    features = extract_all_features(password)
-    df = pd.DataFrame([features])
-    prob = model.predict(df)  # Shape: [1, num_classes]
-    return prob[0]
+    return get_password_class_prob_batch([password], rate_limiter=rate_limiter)[0]
+
+def get_password_class_prob_batch(passwords, max_workers: int = 16, rate_limiter=None) -> np.ndarray:
+    """
+    Class probabilities for many passwords at once: structural features for the whole
+    batch, PII probabilities resolved in bulk (cache first, concurrent GPT calls for
+    misses, each gated by rate_limiter.acquire() if given) and a single model.predict
+    call. Returns shape [len(passwords), num_classes].
+    """
+    passwords = list(passwords)
+    features = np.empty((len(passwords), len(FEATURE_NAMES)), dtype=np.float64)
+    features[:, :-1] = extract_structural_matrix(passwords)
+    features[:, -1] = resolve_pii_probabilities(passwords, max_workers=max_workers, rate_limiter=rate_limiter)
+    return get_router_model().predict(features)
+
+def benchmark_batch(csv_file="benchmark_dataset.csv", batch_sizes=(1, 100, 10_000), latency=0.02, max_workers=32):
+    """Router throughput per batch size against a local mock LLM, with a cold and a warm PII cache."""
+    import time
+    import pandas as pd
+    from mock_llm_server import mock_llm_environment
+
+    passwords = pd.read_csv(csv_file, usecols=["Password"], dtype=str, keep_default_na=False)["Password"].tolist()
+    report = []
+    with mock_llm_environment(latency=latency):
+        for size in batch_sizes:
+            batch = passwords[:size]
+            start = time.perf_counter()
+            probs = get_password_class_prob_batch(batch, max_workers=max_workers)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            get_password_class_prob_batch(batch, max_workers=max_workers)
+            warm = time.perf_counter() - start
+
+            sample = batch[:min(size, 100)]
+            start = time.perf_counter()
+            single = [get_router_model().predict(pd.DataFrame([extract_all_features(pw)]))[0] for pw in sample]
+            per_password = (time.perf_counter() - start) / len(sample)
+            report.append({
+                "batch_size": size,
+                "cold_pw_per_s": size / cold,
+                "warm_pw_per_s": size / warm,
+                "single_warm_pw_per_s": 1 / per_password,
+                "matches_single": bool(np.allclose(probs[:len(sample)], single, rtol=0, atol=1e-12)),
+            })
+
+    print(f"📊 Router batch benchmark ({latency * 1000:.0f} ms mock PII latency):")
+    for r in report:
+        print(f"  batch {r['batch_size']:>6}: cold {r['cold_pw_per_s']:>9,.0f} pw/s  warm {r['warm_pw_per_s']:>9,.0f} pw/s  "
+              f"(one-by-one warm {r['single_warm_pw_per_s']:,.0f} pw/s)  matches={r['matches_single']}")
+    return report
 
 # ========== 3. Test Example ==========
 if __name__ == "__main__":
+    import sys
+    if "--benchmark" in sys.argv:
+        benchmark_batch()
+        sys.exit()
+
     sample_passwords = [
         "abc123",
         "lb1990401",
@@ -0,0 +1,220 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+import numpy as np
+import pandas as pd
+
+from mock_llm_server import mock_llm_environment
+from password_hash import hash_passwords, fit_ngram_vocabulary, GLOBAL_NUM_HASHES
+from similar_password_finder import SimilarPasswordIndex, load_similar_password_index, clear_index_cache
+from MoP_Router import get_password_class_prob_batch
+from Mixture_of_prompts import generate_honeywords_batch
+from Adversarial_filtering import filter_honeywords_parallel
+from global_shuffle import global_shuffle_streaming
+
+# ========== Configuration ==========
+DATASETS = ("benchmark_dataset.csv", "pii_10000password.csv")
+NEIGHBOR_CSV = "benchmark_dataset_hash.csv"  # the index Mixture_of_prompts recommends neighbors from
+RESULTS_PATH = "benchmark_results.json"
+REGRESSION_TOLERANCE = 0.25  # a stage regresses when it is this much slower than the baseline
+MIN_REGRESSION_SECONDS = 0.05  # ... and at least this many seconds slower, so millisecond stages don't flap
+
+
+# ========== Helpers ==========
+def _load_passwords(csv_files) -> list:
+    passwords = []
+    for csv_file in csv_files:
+        df = pd.read_csv(csv_file, usecols=["Password"], dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        passwords.extend(df["Password"].tolist())
+    return passwords
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _percentiles_ms(latencies) -> dict:
+    values = np.asarray(latencies) * 1000
+    return {"p50_ms": float(np.percentile(values, 50)), "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99))}
+
+
+class StageTimer:
+    """Collects one record per pipeline stage: wall time, throughput and mock endpoint traffic."""
+
+    def __init__(self, server=None):
+        self.server = server
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, items: int, quiet: bool = True):
+        record = {"items": items}
+        requests, errors = (self.server.requests, self.server.errors) if self.server else (0, 0)
+        sink = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+            yield record
+        seconds = time.perf_counter() - start
+        record.update(seconds=seconds, items_per_s=items / seconds if seconds > 0 else 0.0)
+        if self.server is not None:
+            record.update(llm_requests=self.server.requests - requests, llm_errors=self.server.errors - errors)
+        self.stages[name] = record
+        print(f"  {name:<20} {seconds:8.3f}s  {record['items_per_s']:>12,.1f} items/s")
+
+
+# ========== End-to-End Benchmark ==========
+def run_suite(datasets=DATASETS, num_queries=200, num_route=2000, num_users=20, honeywords_per_user=30,
+              latency=0.02, jitter=0.0, error_rate=0.0, canned=None, seed=0, work_dir=None) -> dict:
+    """
+    Time every pipeline stage on the bundled datasets against a local MockLLMServer:
+    LSH hashing, index build, neighbor lookup, routing, generation, adversarial
+    filtering and the global shuffle. Stages that call the LLM run with a throwaway
+    PII cache and the neighbor index is built in the temp dir, so every run starts
+    cold; openai settings and the process PII cache are restored afterwards. Returns
+    a JSON-serializable dict.
+    """
+    rng = random.Random(seed)
+    passwords = _load_passwords(datasets)
+    queries = rng.sample(passwords, min(num_queries, len(passwords)))
+    route_batch = rng.sample(passwords, min(num_route, len(passwords)))
+    users = rng.sample(passwords, min(num_users, len(passwords)))
+
+    tmp = tempfile.mkdtemp(prefix="mophoney_bench_", dir=work_dir)
+    results = {
+        "revision": _git_revision(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                        "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {"datasets": list(datasets), "passwords": len(passwords), "num_queries": len(queries),
+                   "num_route": len(route_batch), "num_users": len(users), "honeywords_per_user": honeywords_per_user,
+                   "latency": latency, "jitter": jitter, "error_rate": error_rate, "canned": bool(canned), "seed": seed},
+    }
+    print(f"🧪 MoPHoney offline benchmark ({len(passwords):,} passwords, {latency * 1000:.0f} ms mock latency)")
+    try:
+        with mock_llm_environment(latency=latency, jitter=jitter, error_rate=error_rate, seed=seed,
+                                  canned=canned) as server:
+            timer = StageTimer(server)
+
+            with timer.stage("lsh_hashing", len(passwords)):
+                vocabulary = fit_ngram_vocabulary(passwords)
+                hash_passwords(passwords, num_hashes=GLOBAL_NUM_HASHES, vocabulary=vocabulary)
+
+            with timer.stage("index_build", len(passwords)):
+                index = SimilarPasswordIndex.from_passwords_global(passwords, vocabulary=vocabulary)
+
+            latencies = []
+            with timer.stage("neighbor_lookup", len(queries)) as record:
+                for query in queries:
+                    start = time.perf_counter()
+                    index.recommend(query, num_recommendations=10)
+                    latencies.append(time.perf_counter() - start)
+                record.update(_percentiles_ms(latencies))
+
+            with timer.stage("routing", len(route_batch)) as record:
+                probs = get_password_class_prob_batch(route_batch, max_workers=32)
+                record["class_share"] = np.bincount(probs.argmax(axis=1), minlength=probs.shape[1]).tolist()
+
+            # Generation recommends neighbors from NEIGHBOR_CSV; build that index in its own stage, in tmp
+            clear_index_cache()
+            with timer.stage("neighbor_index_build", 1):
+                load_similar_password_index(NEIGHBOR_CSV, index_file=os.path.join(tmp, "neighbors.idx"))
+
+            users_path = os.path.join(tmp, "users.txt")
+            generated_path = os.path.join(tmp, "generated.jsonl")
+            with open(users_path, "w", encoding="utf-8") as f:
+                f.write("".join(pw + "\n" for pw in users))
+            with timer.stage("generation", len(users) * honeywords_per_user) as record:
+                stats = generate_honeywords_batch(users_path, generated_path, total_count=honeywords_per_user,
+                                                  max_in_flight=32)
+                record.update(users=stats["users"], requests_per_honeyword=stats["requests_per_honeyword"],
+                              accepted=stats["accepted"])
+
+            filtered_path = os.path.join(tmp, "filtered.jsonl")
+            with timer.stage("filtering", len(users)) as record:
+                stats = filter_honeywords_parallel(generated_path, filtered_path, max_workers=32,
+                                                   base_delay=0.1, max_delay=2.0)
+                record.update(filtered=stats["filtered"], failed=stats["failed"])
+
+            with timer.stage("shuffle", len(users)) as record:
+                stats = global_shuffle_streaming(filtered_path, os.path.join(tmp, "table.json"),
+                                                 os.path.join(tmp, "checker.json"), seed=seed,
+                                                 users_jsonl=os.path.join(tmp, "users.jsonl"))
+                record["entries"] = stats.get("entries")
+
+            results["stages"] = timer.stages
+            results["llm"] = {"requests": server.requests, "errors": server.errors}
+    finally:
+        clear_index_cache()  # the cached neighbor index maps a file in tmp
+        shutil.rmtree(tmp, ignore_errors=True)
+    results["total_seconds"] = sum(stage["seconds"] for stage in results["stages"].values())
+    print(f"  {'total':<20} {results['total_seconds']:8.3f}s  ({results['llm']['requests']} mock LLM requests)")
+    return results
+
+
+# ========== Regression Check ==========
+def compare_results(current: dict, baseline: dict, tolerance: float = REGRESSION_TOLERANCE,
+                    min_seconds: float = MIN_REGRESSION_SECONDS) -> list:
+    """Stages whose wall time grew by more than `tolerance` (relative) and `min_seconds` over the baseline run."""
+    regressions = []
+    for name, stage in current.get("stages", {}).items():
+        before = baseline.get("stages", {}).get(name)
+        if before is None or before["seconds"] <= 0:
+            continue
+        ratio = stage["seconds"] / before["seconds"]
+        if ratio > 1 + tolerance and stage["seconds"] - before["seconds"] > min_seconds:
+            regressions.append({"stage": name, "baseline_s": before["seconds"], "current_s": stage["seconds"],
+                                "ratio": ratio})
+    return regressions
+
+
+# ========== Standalone Entry ==========
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end offline MoPHoney benchmark against a mock LLM endpoint")
+    parser.add_argument("--output", default=RESULTS_PATH, help="where to write the JSON results")
+    parser.add_argument("--compare", help="baseline results JSON; exit with status 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--route", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--honeywords", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--canned", help="JSON object mapping prompt substrings to fixed mock completions")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    canned = None
+    if args.canned:
+        with open(args.canned, "r", encoding="utf-8") as f:
+            canned = json.load(f)
+    results = run_suite(num_queries=args.queries, num_route=args.route, num_users=args.users,
+                        honeywords_per_user=args.honeywords, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, canned=canned, seed=args.seed)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        results["regressions"] = compare_results(results, baseline, args.tolerance)
+        results["baseline_revision"] = baseline.get("revision")
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results written to: {args.output}")
+
+    for regression in results.get("regressions", []):
+        print(f"❌ {regression['stage']}: {regression['baseline_s']:.3f}s -> {regression['current_s']:.3f}s "
+              f"(x{regression['ratio']:.2f})")
+    sys.exit(1 if results.get("regressions") else 0)
@@ -0,0 +1,390 @@
+import re
+import sys
+import time
+import numpy as np
+
+# ========== Configuration ==========
+MODEL_PATH = "router_model.txt"
+
+_DEFAULT_LEFT_MASK = 2
+_MISSING_ZERO = 1
+_MISSING_NAN = 2
+_ZERO_THRESHOLD = 1e-35
+
+# ========== Compiled Tree Ensemble ==========
+class CompiledTreeModel:
+    """
+    A LightGBM text model (Booster.save_model / router_model.txt) flattened into
+    NumPy node arrays, evaluated without lightgbm or pandas.
+
+    All trees share one set of arrays. An internal node stores its split feature,
+    threshold, decision type and two children. A child >= 0 is another node
+    (global index); a child < 0 is leaf ~child in the leaf_value array. Split
+    semantics follow LightGBM's numerical decision: `x <= threshold` goes left,
+    and missing values go to the default side according to the decision type.
+
+    Batches of up to SMALL_BATCH_ROWS rows (the per-password hot path) are scored row by
+    row with a next-node table, see _build_walk_tables(). Larger batches of models
+    without missing-value routing (the router's case) use bitvector tables, see
+    _build_fast_tables(); otherwise every (row, tree) pair walks down one level per
+    step, max_depth vectorized steps per batch.
+    """
+
+    SMALL_BATCH_ROWS = 3
+
+    def __init__(self, split_feature, threshold, decision_type, left_child, right_child, leaf_value, roots,
+                 num_class, objective, tree_depths, feature_names=None):
+        self.split_feature = split_feature
+        self.threshold = threshold
+        self.decision_type = decision_type
+        self.left_child = left_child
+        self.right_child = right_child
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.num_class = num_class
+        self.objective = objective
+        self.tree_depths = np.asarray(tree_depths, dtype=np.int64)
+        self.max_depth = int(self.tree_depths.max(initial=0))
+        self.feature_names = feature_names or []
+        self._default_left = (decision_type & _DEFAULT_LEFT_MASK) > 0
+        self._missing_type = (decision_type >> 2) & 3
+        self._missing_routing = bool((self._missing_type != 0).any())
+        self._build_walk_tables()
+        self._build_fast_tables()
+
+    def _build_walk_tables(self):
+        """
+        Nodes and leaves in one index space (leaf i is num_nodes + i). For one row,
+        a single vectorized comparison over all nodes gives every node's next index;
+        leaves point to themselves, so max_depth gathers over the tree roots reach the
+        exit leaf of every tree at once.
+        """
+        num_nodes = len(self.split_feature)
+        leaf_self = np.arange(num_nodes, num_nodes + len(self.leaf_value), dtype=np.intp)
+
+        def combined(child):
+            return np.where(child >= 0, child, num_nodes + ~child).astype(np.intp)
+
+        self._walk_feature = self.split_feature.astype(np.intp)
+        self._walk_left = combined(self.left_child)
+        self._walk_right = combined(self.right_child)
+        self._walk_roots = combined(self.roots)
+        self._walk_leaves = leaf_self
+
+    def _build_fast_tables(self):
+        """
+        Bitvector tables (QuickScorer): leaves of each tree are numbered left to right,
+        and each internal node gets a mask clearing the leaves of its left subtree. A
+        row's exit leaf in a tree is the lowest bit left after ANDing the masks of the
+        nodes whose test sends it right. The nodes of one feature sorted by threshold
+        send a row right exactly up to np.searchsorted(thresholds, x), so the AND of
+        their masks per tree is precomputed for every such prefix (_prefix_masks): a
+        row costs one searchsorted and one (num_trees,) lookup per feature, independent
+        of depth and node count. Needs at most 64 leaves per tree and no missing-value
+        routing (a NaN then compares as 0.0).
+        """
+        self._bitvector = False
+        if self._missing_routing:
+            return
+        num_nodes = len(self.split_feature)
+        node_mask = np.zeros(num_nodes, dtype=np.uint64)
+        node_tree = np.zeros(num_nodes, dtype=np.intp)  # column of the node's tree among the split trees
+        split_trees, leaf_by_rank, rank_base = [], [], []
+        for tree, root in enumerate(self.roots):
+            if root < 0:
+                continue
+            # Walk left-first: leaves in the order met are ranked 0, 1, ...; collect each node's left-subtree ranks
+            ranks, first_rank, nodes = [], {}, []
+            stack = [int(root)]
+            while stack:
+                node = stack.pop()
+                if node < 0:
+                    ranks.append(~node)
+                    continue
+                nodes.append(node)
+                first_rank[node] = len(ranks)
+                stack.append(int(self.right_child[node]))
+                stack.append(int(self.left_child[node]))
+            if len(ranks) > 64:
+                return
+            left_leaves = {node: _count_leaves(self, int(self.left_child[node])) for node in nodes}
+            for node in nodes:
+                start, count = first_rank[node], left_leaves[node]
+                node_mask[node] = np.uint64(~(((1 << count) - 1) << start) & (2 ** 64 - 1))
+            node_tree[nodes] = len(split_trees)
+            split_trees.append(tree)
+            rank_base.append(len(leaf_by_rank))
+            leaf_by_rank.extend(ranks)
+
+        all_ones = np.uint64(2 ** 64 - 1)
+        self._feature_thresholds, self._prefix_offsets, prefix_masks = [], [], []
+        offset = 0
+        for feature in range(int(self.split_feature.max(initial=-1)) + 1):
+            nodes = np.flatnonzero(self.split_feature == feature)
+            nodes = nodes[np.argsort(self.threshold[nodes], kind="stable")]
+            # Row k: AND of the masks of the k lowest-threshold nodes, per tree
+            masks = np.full((len(nodes) + 1, len(split_trees)), all_ones, dtype=np.uint64)
+            masks[np.arange(1, len(nodes) + 1), node_tree[nodes]] = node_mask[nodes]
+            prefix_masks.append(np.bitwise_and.accumulate(masks, axis=0))
+            self._feature_thresholds.append(self.threshold[nodes])
+            self._prefix_offsets.append(offset)
+            offset += len(nodes) + 1
+        self._prefix_masks = np.concatenate(prefix_masks) if prefix_masks else np.zeros((0, 0), dtype=np.uint64)
+        self._split_trees = np.array(split_trees, dtype=np.intp)
+        self._exit_leaf_values = self.leaf_value[np.array(leaf_by_rank, dtype=np.intp)]
+        self._rank_base = np.array(rank_base, dtype=np.intp)
+        self._constant_trees = np.flatnonzero(self.roots < 0)
+        self._bitvector = True
+
+    def num_trees(self) -> int:
+        return len(self.roots)
+
+    # ---------- Parsing ----------
+    @classmethod
+    def from_string(cls, model_str: str):
+        blocks = model_str.split("\nend of trees", 1)[0].split("\nTree=")
+        params = dict(line.split("=", 1) for line in blocks[0].splitlines() if "=" in line)
+        num_class = int(params.get("num_class", 1))
+        objective = params.get("objective", "regression")
+
+        split_feature, threshold, decision_type, left_child, right_child = [], [], [], [], []
+        leaf_value, roots = [], []
+        tree_depths = []
+        for block in blocks[1:]:
+            fields = dict(line.split("=", 1) for line in block.splitlines()[1:] if "=" in line)
+            if "leaf_value" not in fields:
+                continue
+            if int(fields.get("num_cat", 0)) > 0:
+                raise ValueError("Categorical splits are not supported by the compiled router")
+            leaves = [float(v) for v in fields["leaf_value"].split()]
+            node_base, leaf_base = len(split_feature), len(leaf_value)
+            leaf_value.extend(leaves)
+            if int(fields["num_leaves"]) == 1:
+                roots.append(~leaf_base)
+                tree_depths.append(0)
+                continue
+
+            def encode(child):
+                return node_base + child if child >= 0 else ~(leaf_base + ~child)
+
+            lefts = [int(v) for v in fields["left_child"].split()]
+            rights = [int(v) for v in fields["right_child"].split()]
+            split_feature.extend(int(v) for v in fields["split_feature"].split())
+            threshold.extend(float(v) for v in fields["threshold"].split())
+            decision_type.extend(int(v) for v in fields["decision_type"].split())
+            left_child.extend(encode(c) for c in lefts)
+            right_child.extend(encode(c) for c in rights)
+            roots.append(node_base)
+            tree_depths.append(_tree_depth(lefts, rights))
+
+        if not roots:
+            raise ValueError("No trees found in model")
+        return cls(
+            np.array(split_feature, dtype=np.int64),
+            np.array(threshold, dtype=np.float64),
+            np.array(decision_type, dtype=np.int64),
+            np.array(left_child, dtype=np.int64),
+            np.array(right_child, dtype=np.int64),
+            np.array(leaf_value, dtype=np.float64),
+            np.array(roots, dtype=np.int64),
+            num_class=num_class,
+            objective=objective,
+            tree_depths=tree_depths,
+            feature_names=params.get("feature_names", "").split(),
+        )
+
+    @classmethod
+    def from_file(cls, path=MODEL_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_string(f.read())
+
+    # ---------- Inference ----------
+    def leaf_outputs(self, X) -> np.ndarray:
+        """Leaf value reached in every tree, shape (n, num_trees)."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        n, num_trees = len(X), self.num_trees()
+        if n == 1:
+            return self._walk_leaf_outputs(X[0])[None, :]
+        if n <= self.SMALL_BATCH_ROWS:
+            return np.array([self._walk_leaf_outputs(row) for row in X]).reshape(n, num_trees)
+        if self._bitvector:
+            return self._bitvector_leaf_outputs(X)
+        node = np.tile(self.roots, n)
+        for _ in range(self.max_depth):
+            active = np.flatnonzero(node >= 0)
+            if len(active) == 0:
+                break
+            current = node[active]
+            go_left = self._go_left(X[active // num_trees, self.split_feature[current]], current)
+            node[active] = np.where(go_left, self.left_child[current], self.right_child[current])
+        return self.leaf_value[~node].reshape(n, num_trees)
+
+    def _walk_leaf_outputs(self, x) -> np.ndarray:
+        """Leaf value reached in every tree for a single row."""
+        if self._missing_routing:
+            go_left = self._go_left(x[self._walk_feature], np.arange(len(self._walk_feature)))
+            step = np.where(go_left, self._walk_left, self._walk_right)
+        else:
+            fval = np.where(np.isnan(x), 0.0, x)[self._walk_feature]
+            step = np.where(fval > self.threshold, self._walk_right, self._walk_left)
+        step = np.concatenate((step, self._walk_leaves))
+        node = self._walk_roots
+        for _ in range(self.max_depth):
+            node = step[node]
+        return self.leaf_value[node - len(self._walk_feature)]
+
+    def _go_left(self, fval, nodes) -> np.ndarray:
+        """LightGBM's numerical decision for feature values fval at the given nodes."""
+        missing_type = self._missing_type[nodes]
+        is_nan = np.isnan(fval)
+        fval = np.where(is_nan & (missing_type != _MISSING_NAN), 0.0, fval)
+        to_default = (((missing_type == _MISSING_ZERO) & (np.abs(fval) <= _ZERO_THRESHOLD))
+                      | ((missing_type == _MISSING_NAN) & is_nan))
+        return np.where(to_default, self._default_left[nodes], fval <= self.threshold[nodes])
+
+    def _bitvector_leaf_outputs(self, X, chunk_rows=1024) -> np.ndarray:
+        X = np.where(np.isnan(X), 0.0, X)
+        outputs = np.empty((len(X), self.num_trees()), dtype=np.float64)
+        outputs[:, self._constant_trees] = self.leaf_value[~self.roots[self._constant_trees]]
+        for start in range(0, len(X), chunk_rows):
+            chunk = X[start:start + chunk_rows]
+            rows = np.empty((len(chunk), len(self._feature_thresholds)), dtype=np.intp)
+            for feature, (thresholds, offset) in enumerate(zip(self._feature_thresholds, self._prefix_offsets)):
+                rows[:, feature] = np.searchsorted(thresholds, chunk[:, feature], side="left") + offset
+            reachable = np.bitwise_and.reduce(self._prefix_masks[rows], axis=1)
+            lowest = reachable & (~reachable + np.uint64(1))
+            rank = np.log2(lowest.astype(np.float64)).astype(np.intp)
+            outputs[start:start + len(chunk), self._split_trees] = self._exit_leaf_values[self._rank_base + rank]
+        return outputs
+
+    def predict_raw(self, X) -> np.ndarray:
+        outputs = self.leaf_outputs(X)
+        # Trees are stored iteration-major: tree t belongs to class t % num_class
+        raw = outputs.reshape(len(outputs), -1, self.num_class).sum(axis=1)
+        return raw if self.num_class > 1 else raw[:, 0]
+
+    def predict(self, X, raw_score=False) -> np.ndarray:
+        """Same output as lightgbm.Booster.predict for multiclass, binary and regression models."""
+        raw = self.predict_raw(X)
+        if raw_score:
+            return raw
+        if self.objective.startswith("multiclass"):
+            shifted = np.exp(raw - raw.max(axis=1, keepdims=True))
+            return shifted / shifted.sum(axis=1, keepdims=True)
+        if self.objective.startswith("binary"):
+            match = re.search(r"sigmoid:([0-9.eE+-]+)", self.objective)
+            sigmoid = float(match.group(1)) if match else 1.0
+            return 1.0 / (1.0 + np.exp(-sigmoid * raw))
+        if self.objective.startswith("regression") or self.objective.startswith("huber"):
+            return raw
+        raise ValueError(f"Unsupported objective for the compiled router: {self.objective}")
+
+
+def _count_leaves(model, node) -> int:
+    count, stack = 0, [node]
+    while stack:
+        node = stack.pop()
+        if node < 0:
+            count += 1
+        else:
+            stack.extend((int(model.left_child[node]), int(model.right_child[node])))
+    return count
+
+
+def _tree_depth(lefts, rights) -> int:
+    depth, stack = 0, [(0, 1)]
+    while stack:
+        node, d = stack.pop()
+        depth = max(depth, d)
+        for child in (lefts[node], rights[node]):
+            if child >= 0:
+                stack.append((child, d + 1))
+    return depth
+
+# ========== Benchmark ==========
+_COLD_START = """
+import json, sys, time
+start = time.perf_counter()
+import MoP_Router
+imported = time.perf_counter()
+MoP_Router.get_router_model().predict(__import__("numpy").zeros((1, 12)))
+print(json.dumps({"import_s": imported - start, "first_prediction_s": time.perf_counter() - start}))
+"""
+
+def _cold_start(backend, repeats=3) -> dict:
+    import os
+    import json
+    import subprocess
+    env = dict(os.environ, MOPHONEY_ROUTER_BACKEND=backend)
+    runs = [json.loads(subprocess.run([sys.executable, "-c", _COLD_START], env=env, capture_output=True,
+                                      text=True, check=True).stdout.strip().splitlines()[-1])
+            for _ in range(repeats)]
+    return {key: min(run[key] for run in runs) for key in runs[0]}
+
+def benchmark_compiled(csv_file="benchmark_dataset.csv", model_path=MODEL_PATH, rows=10_000, single=500):
+    """Compiled trees vs lightgbm.Booster: agreement, cold start and prediction latency."""
+    import pandas as pd
+    import lightgbm as lgb
+    from feature_extraction import extract_structural_matrix
+
+    booster = lgb.Booster(model_file=model_path)
+    start = time.perf_counter()
+    compiled = CompiledTreeModel.from_file(model_path)
+    parse_s = time.perf_counter() - start
+
+    passwords = pd.read_csv(csv_file, usecols=["Password"], dtype=str, keep_default_na=False)["Password"].tolist()[:rows]
+    rng = np.random.RandomState(0)
+    X = np.empty((len(passwords), booster.num_feature()), dtype=np.float64)
+    X[:, :-1] = extract_structural_matrix(passwords)
+    X[:, -1] = rng.uniform(0, 1, len(passwords))
+    X[rng.rand(len(passwords)) < 0.01, -1] = np.nan
+
+    expected = booster.predict(X)
+    got = compiled.predict(X)
+
+    def per_call(fn, data):
+        start = time.perf_counter()
+        for row in data:
+            fn(row[None, :])
+        return (time.perf_counter() - start) / len(data)
+
+    start = time.perf_counter()
+    booster.predict(X)
+    booster_batch = time.perf_counter() - start
+    start = time.perf_counter()
+    compiled.predict(X)
+    compiled_batch = time.perf_counter() - start
+
+    report = {
+        "trees": compiled.num_trees(),
+        "max_depth": compiled.max_depth,
+        "rows": len(X),
+        "max_abs_diff": float(np.abs(expected - got).max()),
+        "within_1e-9": bool(np.allclose(expected, got, rtol=0, atol=1e-9)),
+        "parse_ms": parse_s * 1e3,
+        "booster_single_us": per_call(booster.predict, X[:single]) * 1e6,
+        "compiled_single_us": per_call(compiled.predict, X[:single]) * 1e6,
+        "booster_batch_rows_per_s": len(X) / booster_batch,
+        "compiled_batch_rows_per_s": len(X) / compiled_batch,
+    }
+    for backend in ("lightgbm", "compiled"):
+        for key, value in _cold_start(backend).items():
+            report[f"{backend}_{key}"] = value
+
+    print("📊 Compiled router benchmark:")
+    for k, v in report.items():
+        if k == "max_abs_diff":
+            print(f"  {k}: {v:.2e}")
+        else:
+            print(f"  {k}: {v:,.4f}" if isinstance(v, float) else f"  {k}: {v}")
+    return report
+
+# ========== Example Usage ==========
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_compiled()
+    else:
+        model = CompiledTreeModel.from_file(MODEL_PATH)
+        print(f"🌲 {model.num_trees()} trees, {model.num_class} classes, max depth {model.max_depth}")
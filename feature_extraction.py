@@ -2,7 +2,11 @@ import re
 import math
 import json
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 import openai
+from semantic_cache import get_semantic_cache
+from pii_detector import get_pii_detector
 
 # ------------------ GPT API Configuration ------------------
 openai.api_key = 'your-api-key-here'  # Replace with your actual key
@@ -16,6 +20,7 @@ class PasswordStructuralFeatures:
             'phone': r'1[3-9]\d{9}',
             'keyboard_walk': r'(qwerty|asdfgh|zxcvbn)',
         }
+        self._compiled_patterns = {name: re.compile(pattern) for name, pattern in self.regex_patterns.items()}
 
     def extract(self, password: str) -> dict:
         total_len = len(password)
@@ -33,11 +38,79 @@ class PasswordStructuralFeatures:
             'trigram_repetition_score': self._repetition_score([password[i:i+3] for i in range(total_len - 2)]),
         }
 
-        for name, pattern in self.regex_patterns.items():
-            features[f'regex_match_{name}'] = 1 if re.search(pattern, password.lower()) else 0
+        lowered = password.lower()
+        for name, pattern in self._compiled_patterns.items():
+            features[f'regex_match_{name}'] = 1 if pattern.search(lowered) else 0
 
         return features
 
+    def extract_batch(self, passwords, chunk_size: int = 4096) -> np.ndarray:
+        """
+        extract() for many passwords at once, as a float64 matrix in STRUCTURAL_FEATURE_NAMES
+        order. ASCII passwords are encoded into uint8 code matrices (sorted by length and
+        chunked to limit padding) and every feature is computed column-wise over the chunk;
+        the few non-ASCII passwords use extract(). Entropy terms come from math.log2 and are
+        summed in first-occurrence order, so results equal extract() exactly.
+        """
+        passwords = list(passwords)
+        matrix = np.zeros((len(passwords), len(STRUCTURAL_FEATURE_NAMES)), dtype=np.float64)
+        ascii_rows = []
+        for row, password in enumerate(passwords):
+            if password.isascii():
+                if password:
+                    ascii_rows.append(row)
+            else:
+                feats = self.extract(password)
+                matrix[row] = [feats[name] for name in STRUCTURAL_FEATURE_NAMES]
+
+        ascii_rows.sort(key=lambda r: len(passwords[r]))
+        for start in range(0, len(ascii_rows), chunk_size):
+            rows = ascii_rows[start:start + chunk_size]
+            matrix[rows] = self._extract_ascii_chunk([passwords[r] for r in rows])
+        return matrix
+
+    def _extract_ascii_chunk(self, passwords) -> np.ndarray:
+        n = len(passwords)
+        lengths = np.fromiter((len(pw) for pw in passwords), dtype=np.int64, count=n)
+        width = int(lengths.max())
+        codes = np.zeros((n, width), dtype=np.int64)
+        cols = np.arange(width)
+        valid = cols[None, :] < lengths[:, None]
+        codes[valid] = np.frombuffer("".join(passwords).encode("ascii"), dtype=np.uint8)
+
+        is_digit = _ASCII_DIGIT[codes] & valid
+        out = np.empty((n, len(STRUCTURAL_FEATURE_NAMES)), dtype=np.float64)
+        out[:, 0] = is_digit.sum(axis=1) / lengths
+        out[:, 1] = (_ASCII_LOWER[codes] & valid).sum(axis=1) / lengths
+        out[:, 2] = (_ASCII_UPPER[codes] & valid).sum(axis=1) / lengths
+        out[:, 3] = (~_ASCII_ALNUM[codes] & valid).sum(axis=1) / lengths
+
+        # Entropy: add each distinct character's term when it first occurs, like Counter order
+        row_ids = np.arange(n)
+        counts = np.zeros((n, 128), dtype=np.int64)
+        np.add.at(counts, (np.repeat(row_ids, lengths), codes[valid]), 1)
+        terms = _entropy_terms(width)
+        seen = np.zeros((n, 128), dtype=bool)
+        entropy = np.zeros(n, dtype=np.float64)
+        run = np.zeros(n, dtype=np.int64)
+        max_run = np.zeros(n, dtype=np.int64)
+        for j in range(width):
+            code = codes[:, j]
+            first = valid[:, j] & ~seen[row_ids, code]
+            seen[row_ids, code] |= valid[:, j]
+            entropy = np.where(first, entropy + terms[lengths, counts[row_ids, code]], entropy)
+            run = np.where(is_digit[:, j], run + 1, 0)
+            np.maximum(max_run, run, out=max_run)
+        out[:, 4] = -entropy
+        out[:, 5] = max_run
+
+        out[:, 6] = _repetition_scores(codes[:, :-1] * 128 + codes[:, 1:], lengths - 1)
+        out[:, 7] = _repetition_scores((codes[:, :-2] * 128 + codes[:, 1:-1]) * 128 + codes[:, 2:], lengths - 2)
+
+        for col, pattern in enumerate(self._compiled_patterns.values(), start=8):
+            out[:, col] = [1 if pattern.search(pw.lower()) else 0 for pw in passwords]
+        return out
+
     def _calculate_entropy(self, password: str) -> float:
         counter = Counter(password)
         total = len(password)
@@ -71,8 +144,48 @@ class PasswordStructuralFeatures:
             'regex_match_keyboard_walk': 0,
         }
 
+_ASCII_DIGIT = np.array([chr(i).isdigit() for i in range(128)])
+_ASCII_LOWER = np.array([chr(i).islower() for i in range(128)])
+_ASCII_UPPER = np.array([chr(i).isupper() for i in range(128)])
+_ASCII_ALNUM = np.array([chr(i).isalnum() for i in range(128)])
+_ENTROPY_TERMS = np.zeros((1, 1))
+
+def _entropy_terms(max_len: int) -> np.ndarray:
+    """terms[total, freq] = p * log2(p) with p = freq / total, computed exactly as extract() does."""
+    global _ENTROPY_TERMS
+    if _ENTROPY_TERMS.shape[0] <= max_len:
+        size = max(max_len + 1, 2 * _ENTROPY_TERMS.shape[0])
+        terms = np.zeros((size, size), dtype=np.float64)
+        for total in range(1, size):
+            for freq in range(1, total + 1):
+                p = freq / total
+                terms[total, freq] = p * math.log2(p)
+        _ENTROPY_TERMS = terms
+    return _ENTROPY_TERMS
+
+def _repetition_scores(ngram_codes: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    """Row-wise _repetition_score over integer-coded n-grams; positions >= totals[row] are padding."""
+    n, width = ngram_codes.shape
+    if width == 0:
+        return np.zeros(n, dtype=np.float64)
+    # Padding gets distinct negative codes so it never counts as a repeat
+    padded = np.where(np.arange(width)[None, :] < totals[:, None], ngram_codes, -1 - np.arange(width)[None, :])
+    ordered = np.sort(padded, axis=1)
+    same = ordered[:, 1:] == ordered[:, :-1]
+    repeated = np.zeros(ordered.shape, dtype=bool)
+    repeated[:, 1:] |= same
+    repeated[:, :-1] |= same
+    counts = repeated.sum(axis=1)
+    scores = np.zeros(n, dtype=np.float64)
+    positive = totals > 0
+    scores[positive] = counts[positive] / totals[positive]
+    return scores
+
+_STRUCTURAL_EXTRACTOR = PasswordStructuralFeatures()
+
 # ------------------ Semantic Feature via GPT ------------------
-def extract_semantic_feature(password: str) -> dict:
+def _query_semantic_feature(password: str, rate_limiter=None) -> tuple:
+    """Ask GPT for the PII assessment; returns (result, succeeded). rate_limiter.acquire() gates the request."""
     prompt = f"""
 You are a password security analyst. Assess whether the following password may contain PII (Personally Identifiable Information), such as name, birthday, email, phone, etc.
 
@@ -86,6 +199,8 @@ Only return valid JSON format.
 """
 
     try:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
         response = openai.ChatCompletion.create(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": prompt}],
@@ -93,17 +208,41 @@ Only return valid JSON format.
             max_tokens=256,
         )
         content = response['choices'][0]['message']['content'].strip()
-        return json.loads(content)
+        return json.loads(content), True
     except Exception as e:
         return {
             "Reason": f"Request failed: {str(e)}",
             "Probability": 0.0
-        }
+        }, False
+
+def _local_assessment(password: str):
+    """The local detector's {"Reason", "Probability"} answer, or None when it escalates to GPT."""
+    local = get_pii_detector().assess(password)
+    if local["Escalate"]:
+        return None
+    return {"Reason": local["Reason"], "Probability": local["Probability"]}
+
+def extract_semantic_feature(password: str, use_cache: bool = True, use_local: bool = False, rate_limiter=None) -> dict:
+    # Opt-in local tier: DEFAULT_WEIGHTS are not calibrated against the GPT labels the router was trained on
+    if use_local:
+        local = _local_assessment(password)
+        if local is not None:
+            return local
+
+    cache = get_semantic_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(password)
+        if cached is not None:
+            return cached
+
+    result, ok = _query_semantic_feature(password, rate_limiter)
+    if ok and cache is not None:
+        cache.set(password, result)  # failed requests are not cached
+    return result
 
 # ------------------ Combined Feature Extraction ------------------
 def extract_all_features(password: str) -> dict:
-    struct_extractor = PasswordStructuralFeatures()
-    struct_feats = struct_extractor.extract(password)
+    struct_feats = _STRUCTURAL_EXTRACTOR.extract(password)
 
     sem_result = extract_semantic_feature(password)
     pii_prob = sem_result.get('Probability', 0.0)
@@ -111,8 +250,115 @@ def extract_all_features(password: str) -> dict:
 
     return struct_feats
 
+# ------------------ Batch Feature Extraction ------------------
+STRUCTURAL_FEATURE_NAMES = list(PasswordStructuralFeatures()._empty_feature())
+FEATURE_NAMES = STRUCTURAL_FEATURE_NAMES + ['pii_included_probability']  # column order of the router model
+
+def extract_structural_matrix(passwords) -> np.ndarray:
+    """Structural features of every password as a float64 matrix in STRUCTURAL_FEATURE_NAMES order."""
+    return _STRUCTURAL_EXTRACTOR.extract_batch(passwords)
+
+def _probability(result: dict) -> float:
+    try:
+        return float(result.get('Probability', 0.0))
+    except (TypeError, ValueError):
+        return 0.0
+
+def resolve_pii_probabilities(passwords, max_workers: int = 16, use_local: bool = False,
+                              flush_every: int = 64, return_stats: bool = False, rate_limiter=None):
+    """
+    PII probability per password: with use_local the local detector answers whatever it
+    can first, then one bulk cache lookup and concurrent GPT calls (cached like
+    extract_semantic_feature) for the remaining distinct passwords. At most max_workers calls are in flight;
+    successful answers are written to the cache every flush_every completions, so an
+    interrupted run keeps what it already paid for. With return_stats, also returns
+    how many lookups each tier answered. A rate_limiter's acquire() gates every GPT call.
+    """
+    passwords = list(passwords)
+    unique = list(dict.fromkeys(passwords))
+    results = {}
+    if use_local:
+        for pw in unique:
+            local = _local_assessment(pw)
+            if local is not None:
+                results[pw] = local
+    local_hits = len(results)
+    escalated = [pw for pw in unique if pw not in results]
+    cache = get_semantic_cache()
+    results.update(cache.get_many(escalated))
+    misses = [pw for pw in escalated if pw not in results]
+    failures = 0
+    if misses:
+        pending = {}
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = {pool.submit(_query_semantic_feature, pw, rate_limiter): pw for pw in misses}
+                for future in as_completed(futures):
+                    pw = futures[future]
+                    result, ok = future.result()
+                    results[pw] = result
+                    if ok:
+                        pending[pw] = result  # failed requests are not cached
+                    else:
+                        failures += 1
+                    if len(pending) >= flush_every:
+                        cache.set_many(pending)
+                        pending = {}
+        finally:
+            cache.set_many(pending)
+    probabilities = np.array([_probability(results[pw]) for pw in passwords], dtype=np.float64)
+    if not return_stats:
+        return probabilities
+    return probabilities, {
+        "rows": len(passwords),
+        "unique": len(unique),
+        "local": local_hits,
+        "cache_hits": len(escalated) - len(misses),
+        "api_calls": len(misses),
+        "api_failures": failures,
+    }
+
+# ------------------ Benchmark ------------------
+def benchmark_structural(csv_files=("benchmark_dataset.csv", "pii_10000password.csv"), repeats: int = 3) -> dict:
+    """Per-password extract() loop vs extract_batch() on the bundled datasets (rows/s, exact equality)."""
+    import time
+    import pandas as pd
+
+    passwords = []
+    for csv_file in csv_files:
+        df = pd.read_csv(csv_file, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        passwords.extend(df["Password"].tolist())
+
+    extractor = PasswordStructuralFeatures()
+    start = time.perf_counter()
+    scalar = np.array([[extractor.extract(pw)[name] for name in STRUCTURAL_FEATURE_NAMES] for pw in passwords])
+    scalar_s = time.perf_counter() - start
+
+    batch_s = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        batch = extractor.extract_batch(passwords)
+        batch_s = min(batch_s, time.perf_counter() - start)
+
+    report = {
+        "passwords": len(passwords),
+        "scalar_rows_per_s": len(passwords) / scalar_s,
+        "batch_rows_per_s": len(passwords) / batch_s,
+        "speedup": scalar_s / batch_s,
+        "identical": bool(np.array_equal(scalar, batch)),
+    }
+    print("📊 Structural feature extraction benchmark:")
+    for k, v in report.items():
+        print(f"  {k}: {v:.1f}" if isinstance(v, float) else f"  {k}: {v}")
+    return report
+
 # ------------------ Sample Execution ------------------
 if __name__ == "__main__":
+    import sys
+    if "--benchmark" in sys.argv:
+        benchmark_structural()
+        sys.exit(0)
+
     sample_passwords = [
         "Alice19950608",
         "QwErTy!123",
@@ -0,0 +1,92 @@
+import os
+import json
+import tempfile
+import numpy as np
+
+# ========== JSON Records ==========
+def read_records(path: str) -> list:
+    """Records of a JSONL file or a JSON array (a single JSON object becomes a one-record list)."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        records = json.load(f)
+    return records if isinstance(records, list) else [records]
+
+# ========== Array Files ==========
+# magic | uint64 header length | JSON header | 64-byte aligned arrays, described by
+# header["arrays"][name] = {"dtype", "shape", "offset"} so they can be memory-mapped
+ARRAY_ALIGNMENT = 64
+
+
+def _align(offset):
+    return (offset + ARRAY_ALIGNMENT - 1) // ARRAY_ALIGNMENT * ARRAY_ALIGNMENT
+
+
+def array_layout(magic: bytes, header: dict, specs: dict) -> bytes:
+    """Fill header["arrays"] with dtype/shape/offset for each (dtype, shape) in specs; returns the encoded header."""
+    header["arrays"] = {}
+    header_bytes = b""
+    # Array offsets depend on the header length, so lay out until the header size is stable
+    while True:
+        offset = _align(len(magic) + 8 + len(header_bytes))
+        for name, (dtype, shape) in specs.items():
+            header["arrays"][name] = {"dtype": np.dtype(dtype).str, "shape": list(shape), "offset": offset}
+            offset = _align(offset + np.dtype(dtype).itemsize * int(np.prod(shape)))
+        new_header_bytes = json.dumps(header).encode("utf-8")
+        if len(new_header_bytes) == len(header_bytes):
+            return header_bytes
+        header_bytes = new_header_bytes
+
+
+def write_header(f, magic: bytes, header_bytes: bytes):
+    f.write(magic)
+    f.write(np.uint64(len(header_bytes)).tobytes())
+    f.write(header_bytes)
+
+
+def open_arrays(path: str, magic: bytes, mmap: bool = True):
+    """(header, {name: array}) of a file written with array_layout; arrays are memory-mapped by default."""
+    with open(path, "rb") as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"Unexpected file format (expected {magic!r}): {path}")
+        header_len = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+        elif mmap:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=spec["offset"], shape=shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)), offset=spec["offset"]).reshape(shape)
+    return header, arrays
+
+
+def open_temp_file(path: str):
+    """(binary file, its path): a new uniquely named file next to path, to be renamed over it with os.replace."""
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix=os.path.basename(path) + ".", suffix=".tmp")
+    return os.fdopen(fd, "wb"), tmp_file
+
+
+def write_arrays(path: str, magic: bytes, header: dict, arrays: dict):
+    """
+    Write header and {name: array} in the array_layout format. The file is written
+    aside under a unique name and renamed, so readers that memory-mapped path keep a
+    valid view and concurrent writers never share a temp file; the partial file is
+    removed if writing fails.
+    """
+    header_bytes = array_layout(magic, header, {name: (arr.dtype, arr.shape) for name, arr in arrays.items()})
+    f, tmp_file = open_temp_file(path)
+    try:
+        with f:
+            write_header(f, magic, header_bytes)
+            for name, arr in arrays.items():
+                f.seek(header["arrays"][name]["offset"])
+                f.write(np.ascontiguousarray(arr).tobytes())
+        os.replace(tmp_file, path)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
@@ -1,7 +1,15 @@
+import os
+import re
+import sys
 import json
+import time
+import shutil
 import hashlib
 import random
+import tempfile
 import uuid
+import numpy as np
+from file_formats import read_records, array_layout, write_header, open_arrays, open_temp_file
 
 # ========== Salt and Hash ========== #
 def salted_hash(salt: str, word: str) -> str:
@@ -74,8 +82,711 @@ def global_shuffle(input_json: str, output_json: str, checker_json: str):
     print(f"✅ HoneyChecker mapping saved to: {checker_json}")
     print(f"🔢 Total entries: {len(global_entries)}, Users: {len(records)}")
 
+# ========== Streaming Global Shuffle ========== #
+# Fixed-width temp record per entry; plaintext words and salts never leave the hashing step
+ENTRY_DTYPE = np.dtype([("key", "<u8"), ("user_id", "<u8"), ("is_real", "u1"), ("digest", "S32")])
+
+
+def parse_honeywords(record: dict) -> list:
+    """Honeywords of an input record: a single comma-separated string (as global_shuffle reads it), strings or {"honeyword": ...} items."""
+    items = record.get("honeywords", [])
+    if len(items) == 1 and isinstance(items[0], str):
+        return [w.strip() for w in items[0].split(",") if w.strip()]
+    words = [h["honeyword"] if isinstance(h, dict) else h for h in items]
+    return [w.strip() for w in words if w and w.strip()]
+
+
+def _iter_users(input_jsonl: str):
+    with open(input_jsonl, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            if line.strip():
+                record = json.loads(line)
+                yield int(record.get("user", line_no)), record
+
+
+# Record templates (JSONL line, item of the indented JSON array); values are ints and hex digests only
+TABLE_FORMATS = ('{{"hash": "{0}"}}', '  {{\n    "hash": "{0}"\n  }}')
+CHECKER_FORMATS = (
+    '{{"user_id": {0}, "real_index": {1}, "hash": "{2}"}}',
+    '  {{\n    "user_id": {0},\n    "real_index": {1},\n    "hash": "{2}"\n  }}',
+)
+
+
+class _TableWriter:
+    """Writes records either as JSONL (*.jsonl) or as the indented JSON array global_shuffle produces."""
+
+    def __init__(self, path: str, formats):
+        self.jsonl = path.endswith(".jsonl")
+        self.fmt = formats[0] if self.jsonl else formats[1]
+        self.f = open(path, "w", encoding="utf-8")
+        self.count = 0
+
+    def write(self, rows):
+        if not rows:
+            return
+        fmt = self.fmt.format
+        if self.jsonl:
+            self.f.write("".join(fmt(*row) + "\n" for row in rows))
+        else:
+            chunk = ",\n".join(fmt(*row) for row in rows)
+            self.f.write(("[\n" if self.count == 0 else ",\n") + chunk)
+        self.count += len(rows)
+
+    def close(self):
+        if not self.jsonl:
+            self.f.write("\n]" if self.count else "[]")
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.f.close()
+
+
+def _partition(entries, shard_files, shift: int, mask: int):
+    """Append entries to shard_files by bits [shift, shift + log2(len(shard_files))) of their random key."""
+    shards = (entries["key"] >> np.uint64(shift)) & np.uint64(mask)
+    order = np.argsort(shards, kind="stable")
+    entries, shards = entries[order], shards[order]
+    bounds = np.searchsorted(shards, np.arange(len(shard_files) + 1, dtype=np.uint64))
+    for i, f in enumerate(shard_files):
+        if bounds[i + 1] > bounds[i]:
+            f.write(entries[bounds[i]:bounds[i + 1]].tobytes())
+
+
+def _sorted_runs(path: str, shift: int, memory_limit: int, fanout: int):
+    """Entries of a shard file in random-key order, in chunks; shards larger than memory_limit are split again."""
+    size = os.path.getsize(path)
+    if size <= memory_limit or shift <= 0:
+        entries = np.fromfile(path, dtype=ENTRY_DTYPE)
+        os.remove(path)
+        yield entries[np.argsort(entries["key"], kind="stable")]
+        return
+
+    bits = fanout.bit_length() - 1
+    shift = max(shift - bits, 0)
+    sub_paths = [f"{path}.{i}" for i in range(fanout)]
+    files = [open(p, "wb") for p in sub_paths]
+    with open(path, "rb") as f:
+        rows = max(memory_limit // ENTRY_DTYPE.itemsize, 1)
+        while True:
+            chunk = np.fromfile(f, dtype=ENTRY_DTYPE, count=rows)
+            if not len(chunk):
+                break
+            _partition(chunk, files, shift, fanout - 1)
+    for f in files:
+        f.close()
+    os.remove(path)
+    for sub in sub_paths:
+        yield from _sorted_runs(sub, shift, memory_limit, fanout)
+
+
+def global_shuffle_streaming(input_jsonl: str, output_json: str, checker_json: str, num_shards: int = 64,
+                             memory_limit: int = 256 * 2**20, work_dir: str = None, seed=None,
+                             users_jsonl: str = None) -> dict:
+    """
+    global_shuffle for large user populations, in bounded memory. Users are read one
+    JSONL line at a time; each entry is salted, hashed and written with a random 64-bit
+    key to one of `num_shards` fixed-width temp files chosen by the key's top bits.
+    The shards are then sorted by key one at a time (a shard above `memory_limit` bytes
+    is split again on the next bits) and concatenated, which is a uniform random
+    permutation of all entries. The shuffled table and the HoneyChecker mapping are
+    written in that same pass. An output_json ending in .bin gets the binary table
+    format; otherwise files ending in .jsonl get one record per line, anything else
+    the JSON arrays global_shuffle writes. If `users_jsonl` is given, each
+    user's salt is written there ({"user_id", "salt"} per line) for login-time checks.
+    """
+    assert num_shards >= 2 and num_shards & (num_shards - 1) == 0, "num_shards must be a power of two"
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    tmp_dir = tempfile.mkdtemp(prefix="global_shuffle_", dir=work_dir)
+    shift = 64 - (num_shards.bit_length() - 1)
+    shard_paths = [os.path.join(tmp_dir, f"shard_{i:05d}.bin") for i in range(num_shards)]
+    users = entries_total = 0
+    try:
+        # ---------- Pass 1: salt, hash and scatter by random key ----------
+        files = [open(p, "wb") for p in shard_paths]
+        salts_file = open(users_jsonl, "w", encoding="utf-8") if users_jsonl else None
+        flush_rows = min(max(memory_limit // (4 * ENTRY_DTYPE.itemsize), 1), 1 << 18)
+        digests, user_ids, is_real = [], [], []
+
+        def flush():
+            batch = np.zeros(len(digests), dtype=ENTRY_DTYPE)
+            batch["key"] = rng.integers(0, 2**64, size=len(batch), dtype=np.uint64)
+            batch["user_id"] = user_ids
+            batch["is_real"] = is_real
+            batch["digest"] = digests
+            _partition(batch, files, shift, num_shards - 1)
+            digests.clear(), user_ids.clear(), is_real.clear()
+            return len(batch)
+
+        for user_id, record in _iter_users(input_jsonl):
+            full_list = [record["password"]] + parse_honeywords(record)
+            user_salt = uuid.uuid4().hex
+            if salts_file:
+                salts_file.write(f'{{"user_id": {user_id}, "salt": "{user_salt}"}}\n')
+            digests.extend(hashlib.sha256((user_salt + word).encode("utf-8")).digest() for word in full_list)
+            user_ids.extend([user_id] * len(full_list))
+            is_real.append(1)
+            is_real.extend([0] * (len(full_list) - 1))
+            users += 1
+            if len(digests) >= flush_rows:
+                entries_total += flush()
+        if digests:
+            entries_total += flush()
+        for f in files:
+            f.close()
+        if salts_file:
+            salts_file.close()
+
+        # ---------- Pass 2: sort each shard, write table and HoneyChecker ----------
+        binary = output_json.endswith(BINARY_TABLE_SUFFIX)
+        table = _BinaryTableWriter(output_json, entries_total) if binary else _TableWriter(output_json, TABLE_FORMATS)
+        index = 0
+        with table, _TableWriter(checker_json, CHECKER_FORMATS) as checker:
+            for path in shard_paths:
+                for run in _sorted_runs(path, shift, memory_limit, num_shards):
+                    real_rows = np.flatnonzero(run["is_real"])
+                    if binary:
+                        digests = _as_digest_rows(run["digest"])
+                        table.write_digests(digests)
+                        hashes = {r: digests[r].tobytes().hex() for r in real_rows}
+                    else:
+                        hex_all = run["digest"].tobytes().hex()
+                        hashes = [hex_all[i * 64:(i + 1) * 64] for i in range(len(run))]
+                        table.write([(h,) for h in hashes])
+                    checker.write([(int(run["user_id"][r]), index + int(r), hashes[r]) for r in real_rows])
+                    index += len(run)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Global password table saved to: {output_json}")
+    print(f"✅ HoneyChecker mapping saved to: {checker_json}")
+    print(f"🔢 Total entries: {entries_total}, Users: {users} ({entries_total / elapsed:,.0f} entries/s)")
+    return {"users": users, "entries": entries_total, "seconds": elapsed,
+            "entries_per_s": entries_total / elapsed if elapsed > 0 else 0.0}
+
+
+# ========== Binary Table Format ========== #
+# file_formats array file with magic MOPTBL01:
+#   digests (count, 32) uint8, and optionally index_keys (first 8 digest bytes, big-endian,
+#   sorted) with index_positions (table position of each key) for lookups by hash
+TABLE_MAGIC = b"MOPTBL01"
+BINARY_TABLE_SUFFIX = ".bin"
+
+
+def _as_digest_rows(digests) -> np.ndarray:
+    """(n, 32) uint8 view of digests given as uint8 rows or an S32 array/field."""
+    digests = np.ascontiguousarray(digests)
+    return digests.view(np.uint8).reshape(-1, 32)
+
+
+class _BinaryTableWriter:
+    """
+    Streams digests into a binary table of known size; the sorted index is added on
+    close. Used as a context manager, it closes on success and deletes the partial
+    temp file on error.
+    """
+
+    def __init__(self, path: str, count: int, sorted_index: bool = True):
+        self.path, self.count, self.sorted_index = path, count, sorted_index
+        specs = {"digests": (np.uint8, (count, 32))}
+        if sorted_index:
+            specs["index_keys"] = ("<u8", (count,))
+            specs["index_positions"] = (np.uint32 if count < 2**32 else np.uint64, (count,))
+        self.header = {"format": "shuffled-table", "count": count, "digest_size": 32}
+        header_bytes = array_layout(TABLE_MAGIC, self.header, specs)
+        self.f, self.tmp_file = open_temp_file(path)
+        write_header(self.f, TABLE_MAGIC, header_bytes)
+        self.f.seek(self.header["arrays"]["digests"]["offset"])
+        self.written = 0
+
+    def write_digests(self, digests):
+        rows = _as_digest_rows(digests)
+        self.f.write(rows.tobytes())
+        self.written += len(rows)
+
+    def close(self):
+        try:
+            self._finish()
+        except BaseException:
+            self.abort()
+            raise
+        os.replace(self.tmp_file, self.path)
+
+    def abort(self):
+        self.f.close()
+        if os.path.exists(self.tmp_file):
+            os.remove(self.tmp_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _finish(self):
+        assert self.written == self.count, f"expected {self.count} digests, got {self.written}"
+        if self.sorted_index and self.count:
+            self.f.flush()
+            spec = self.header["arrays"]["digests"]
+            digests = np.memmap(self.tmp_file, dtype=np.uint8, mode="r", offset=spec["offset"], shape=(self.count, 32))
+            keys = np.ascontiguousarray(digests[:, :8]).view(">u8").ravel().astype("<u8")
+            del digests
+            order = np.argsort(keys, kind="stable")
+            for name, arr in (("index_keys", keys[order]), ("index_positions", order)):
+                spec = self.header["arrays"][name]
+                self.f.seek(spec["offset"])
+                self.f.write(arr.astype(spec["dtype"]).tobytes())
+        self.f.close()
+
+
+def write_binary_table(path: str, digests, sorted_index: bool = True):
+    rows = _as_digest_rows(digests)
+    with _BinaryTableWriter(path, len(rows), sorted_index) as writer:
+        writer.write_digests(rows)
+
+
+class ShuffledTableFile:
+    """
+    Read access to a binary shuffled table: table[i] is the hex hash at position i
+    (memory-mapped, so only touched pages are read), find() the position of a hash.
+    """
+
+    def __init__(self, digests, index_keys=None, index_positions=None):
+        self.digests = digests
+        self.index_keys = index_keys
+        self.index_positions = index_positions
+
+    @classmethod
+    def open(cls, path: str, mmap: bool = True) -> "ShuffledTableFile":
+        _, arrays = open_arrays(path, TABLE_MAGIC, mmap)
+        return cls(**arrays)
+
+    def __len__(self):
+        return len(self.digests)
+
+    def __getitem__(self, pos: int) -> str:
+        return self.digests[pos].tobytes().hex()
+
+    def find(self, digest) -> int:
+        """Position of a digest (bytes or hex), or -1: binary search of the sorted index, else a scan."""
+        digest = bytes.fromhex(digest) if isinstance(digest, str) else bytes(digest)
+        if self.index_keys is None:
+            matches = np.flatnonzero((self.digests == np.frombuffer(digest, dtype=np.uint8)).all(axis=1))
+            return int(matches[0]) if len(matches) else -1
+        key = int.from_bytes(digest[:8], "big")
+        i = int(np.searchsorted(self.index_keys, np.uint64(key)))
+        while i < len(self.index_keys) and int(self.index_keys[i]) == key:
+            pos = int(self.index_positions[i])
+            if self.digests[pos].tobytes() == digest:
+                return pos
+            i += 1
+        return -1
+
+    def to_json(self, json_path: str, chunk: int = 1 << 18):
+        """Write the table as global_shuffle's JSON array (or JSONL for *.jsonl)."""
+        table = _TableWriter(json_path, TABLE_FORMATS)
+        for start in range(0, len(self), chunk):
+            hex_all = np.ascontiguousarray(self.digests[start:start + chunk]).tobytes().hex()
+            table.write([(hex_all[i:i + 64],) for i in range(0, len(hex_all), 64)])
+        table.close()
+
+
+_HASH_FIELD = re.compile(r'"hash": ?"([0-9a-f]{64})"')
+
+def _iter_json_digests(json_path: str, chunk_bytes: int = 16 * 2**20):
+    """Digests of a table in JSON/JSONL form, as (n, 32) uint8 chunks, without parsing the whole document."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        tail = ""
+        while True:
+            data = f.read(chunk_bytes)
+            text = tail + data
+            cut = text.rfind("\n") + 1 if data else len(text)
+            text, tail = text[:cut], text[cut:]
+            hashes = "".join(_HASH_FIELD.findall(text))
+            if hashes:
+                yield np.frombuffer(bytes.fromhex(hashes), dtype=np.uint8).reshape(-1, 32)
+            if not data:
+                return
+
+
+def json_to_binary_table(json_path: str, table_path: str, sorted_index: bool = True):
+    """Convert a global_shuffle table (JSON array or JSONL) to the binary format, one chunk at a time."""
+    count = sum(len(chunk) for chunk in _iter_json_digests(json_path))  # the layout needs the count up front
+    with _BinaryTableWriter(table_path, count, sorted_index) as writer:
+        for chunk in _iter_json_digests(json_path):
+            writer.write_digests(chunk)
+
+
+def binary_table_to_json(table_path: str, json_path: str):
+    ShuffledTableFile.open(table_path).to_json(json_path)
+
+
+def is_binary_table(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(TABLE_MAGIC)) == TABLE_MAGIC
+
+
+def read_table_digests(path: str) -> np.ndarray:
+    """(count, 32) uint8 digests of a table in any format (memory-mapped for binary tables)."""
+    if is_binary_table(path):
+        return ShuffledTableFile.open(path).digests
+    chunks = list(_iter_json_digests(path))
+    return np.concatenate(chunks) if chunks else np.zeros((0, 32), dtype=np.uint8)
+
+
+# ========== Incremental Updates ========== #
+
+class HoneywordTable:
+    """
+    Shuffled global table with per-user enrollment, password change and removal, so a
+    single change does not require rerunning global_shuffle.
+
+    New entries are inserted like an inside-out Fisher-Yates shuffle: each one is
+    appended and swapped with a uniformly chosen slot in [0, n]. Removal fills each
+    vacated slot with the current last entry. Both keep the table a uniformly random
+    permutation, and both touch O(k) slots in memory for a user with k sweetwords.
+
+    Besides the table itself, the login server side keeps each user's salt (`salts`),
+    and the HoneyChecker side keeps user_id -> real_index (`checker`) and the user's
+    sweetword positions (`positions`), which removal needs. The positions are never
+    written next to the table or salts: whoever holds them together with the table can
+    tell one user's sweetwords from the rest, so they cross the same trust boundary as
+    the real index. Methods return the table positions they rewrote; save() still
+    rewrites every file, since the table size and hash index change too.
+    """
+
+    def __init__(self, seed=None, capacity: int = 1024):
+        self.rng = np.random.default_rng(seed)
+        self.size = 0
+        self.digests = np.zeros((capacity, 32), dtype=np.uint8)
+        self.owner = np.zeros(capacity, dtype=np.int64)  # user_id of each slot
+        self.slot = np.zeros(capacity, dtype=np.int32)  # index of the slot in its owner's positions list
+        self.salts = {}
+        self.positions = {}  # user_id -> table positions of the user's sweetwords
+        self.checker = {}  # user_id -> real_index
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, user_id):
+        return user_id in self.positions
+
+    def _reserve(self, extra: int):
+        if self.size + extra <= len(self.owner):
+            return
+        capacity = max(2 * len(self.owner), self.size + extra)
+        for name in ("digests", "owner", "slot"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _place(self, pos: int, digest, owner: int, slot: int):
+        self.digests[pos] = digest
+        self.owner[pos] = owner
+        self.slot[pos] = slot
+        self.positions[owner][slot] = pos
+        if slot == 0:
+            self.checker[owner] = pos  # slot 0 holds the real password
+
+    def _move(self, src: int, dst: int):
+        self._place(dst, self.digests[src].copy(), int(self.owner[src]), int(self.slot[src]))
+
+    # ---------- Changes ----------
+    def enroll(self, user_id: int, password: str, honeywords) -> set:
+        """Add a user's real password and honeywords at uniformly random positions."""
+        if user_id in self.positions:
+            raise ValueError(f"user {user_id} is already enrolled")
+        full_list = [password] + list(honeywords)
+        salt = uuid.uuid4().hex
+        self.salts[user_id] = salt
+        self.positions[user_id] = [0] * len(full_list)
+        self._reserve(len(full_list))
+        touched = set()
+        for slot, word in enumerate(full_list):
+            digest = np.frombuffer(hashlib.sha256((salt + word).encode("utf-8")).digest(), dtype=np.uint8)
+            pos = self.size
+            self.size += 1
+            swap = int(self.rng.integers(0, pos + 1))
+            if swap != pos:
+                self._move(swap, pos)
+                touched.add(pos)
+            self._place(swap, digest, user_id, slot)
+            touched.add(swap)
+        return touched
+
+    def remove(self, user_id: int) -> set:
+        """Delete a user's entries, filling each hole with the current last entry."""
+        positions = self.positions[user_id]
+        touched = set()
+        for pos in sorted(positions, reverse=True):
+            last = self.size - 1
+            if pos != last:
+                self._move(last, pos)
+                touched.add(pos)
+            self.size -= 1
+        del self.positions[user_id], self.salts[user_id], self.checker[user_id]
+        return touched
+
+    def update(self, user_id: int, password: str, honeywords) -> set:
+        """Password change: drop the old sweetwords and enroll the new ones with a fresh salt."""
+        touched = self.remove(user_id)
+        touched |= self.enroll(user_id, password, honeywords)
+        return {pos for pos in touched if pos < self.size}
+
+    # ---------- Views ----------
+    def hash(self, pos: int) -> str:
+        return self.digests[pos].tobytes().hex()
+
+    def checker_entries(self) -> list:
+        """HoneyChecker records in global_shuffle's layout, ordered by real_index."""
+        return [{"user_id": int(u), "real_index": int(i), "hash": self.hash(i)}
+                for u, i in sorted(self.checker.items(), key=lambda item: item[1])]
+
+    # ---------- Persistence ----------
+    @classmethod
+    def from_jsonl(cls, input_jsonl: str, seed=None) -> "HoneywordTable":
+        table = cls(seed=seed)
+        for user_id, record in _iter_users(input_jsonl):
+            table.enroll(user_id, record["password"], parse_honeywords(record))
+        return table
+
+    def save(self, output_json: str, checker_json: str, users_jsonl: str, positions_jsonl: str):
+        """
+        Write the table (binary for *.bin) and checker as global_shuffle does, the
+        login-side salts to users_jsonl and the HoneyChecker-side sweetword positions
+        to positions_jsonl; O(total).
+        """
+        if output_json.endswith(BINARY_TABLE_SUFFIX):
+            write_binary_table(output_json, self.digests[:self.size])
+        else:
+            table = _TableWriter(output_json, TABLE_FORMATS)
+            hex_all = self.digests[:self.size].tobytes().hex()
+            table.write([(hex_all[i * 64:(i + 1) * 64],) for i in range(self.size)])
+            table.close()
+        checker = _TableWriter(checker_json, CHECKER_FORMATS)
+        checker.write([(e["user_id"], e["real_index"], e["hash"]) for e in self.checker_entries()])
+        checker.close()
+        with open(users_jsonl, "w", encoding="utf-8") as f:
+            for user_id, salt in self.salts.items():
+                f.write(json.dumps({"user_id": user_id, "salt": salt}) + "\n")
+        with open(positions_jsonl, "w", encoding="utf-8") as f:
+            for user_id, positions in self.positions.items():
+                f.write(json.dumps({"user_id": user_id, "positions": positions}) + "\n")
+
+    @classmethod
+    def load(cls, output_json: str, checker_json: str, users_jsonl: str, positions_jsonl: str,
+             seed=None) -> "HoneywordTable":
+        digests = read_table_digests(output_json)
+        real_index = {record["user_id"]: record["real_index"] for record in read_records(checker_json)}
+        table = cls(seed=seed, capacity=max(len(digests), 1))
+        table.size = len(digests)
+        table.digests[:table.size] = digests
+        with open(users_jsonl, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                table.salts[record["user_id"]] = record["salt"]
+        with open(positions_jsonl, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                user_id = record["user_id"]
+                real = real_index[user_id]
+                # keep the real entry in slot 0, the rest in file order
+                positions = [real] + [p for p in record["positions"] if p != real]
+                table.positions[user_id] = positions
+                table.checker[user_id] = real
+                table.owner[positions] = user_id
+                table.slot[positions] = np.arange(len(positions))
+        return table
+
+
+def unlinkability_report(trials: int = 20_000, seed: int = 0) -> dict:
+    """
+    Chi-square checks (p-values; small values would indicate a bias) that incremental
+    changes keep the table a uniform random permutation:
+      new_user_positions - where a newly enrolled user's entries land in a populated table
+      real_rank          - rank of the real entry among its user's positions
+      permutation        - full arrangement of a small table after enroll/remove/update
+    """
+    from itertools import permutations
+    from scipy.stats import chisquare
+
+    rng = np.random.default_rng(seed)
+    base_users, new_k = 10, 4
+    position_counts = np.zeros(base_users * 3 + new_k, dtype=np.int64)
+    rank_counts = np.zeros(new_k, dtype=np.int64)
+    arrangements = {perm: 0 for perm in permutations(range(5))}
+    for _ in range(trials):
+        table = HoneywordTable(seed=int(rng.integers(2**63)))
+        for user in range(base_users):
+            table.enroll(user, f"pw{user}", [f"hw{user}a", f"hw{user}b"])
+        table.enroll(99, "new", ["n1", "n2", "n3"])
+        position_counts[table.positions[99]] += 1
+        rank_counts[sorted(table.positions[99]).index(table.checker[99])] += 1
+
+        small = HoneywordTable(seed=int(rng.integers(2**63)))
+        small.enroll(0, "a", ["b"])
+        small.enroll(1, "c", ["d"])
+        small.enroll(2, "e", [])
+        small.remove(1)
+        small.enroll(3, "f", ["g"])
+        small.update(2, "h", [])
+        # arrangement of the five sweetwords (user 0: 0-1, user 3: 2-3, user 2: 4)
+        label = {(0, 0): 0, (0, 1): 1, (3, 0): 2, (3, 1): 3, (2, 0): 4}
+        arrangement = tuple(label[(int(small.owner[p]), int(small.slot[p]))] for p in range(len(small)))
+        arrangements[arrangement] += 1
+
+    report = {
+        "trials": trials,
+        "new_user_positions_p": float(chisquare(position_counts).pvalue),
+        "real_rank_p": float(chisquare(rank_counts).pvalue),
+        "permutation_p": float(chisquare(list(arrangements.values())).pvalue),
+    }
+    print("🔍 Unlinkability checks (uniform if p is not small):")
+    for k, v in report.items():
+        print(f"  {k}: {v:.4f}" if isinstance(v, float) else f"  {k}: {v}")
+    return report
+
+
+# ========== Benchmark ========== #
+def _peak_rss_mb() -> float:
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+def _run_shuffle(streaming: bool, input_path: str, output_json: str, checker_json: str) -> dict:
+    start = time.perf_counter()
+    if streaming:
+        stats = global_shuffle_streaming(input_path, output_json, checker_json)
+    else:
+        global_shuffle(input_path, output_json, checker_json)
+        stats = {}
+    stats["seconds"] = time.perf_counter() - start
+    stats["peak_rss_mb"] = _peak_rss_mb()
+    return stats
+
+def benchmark_shuffle(num_users: int = 100_000, honeywords_per_user: int = 20, work_dir: str = None) -> dict:
+    """
+    Peak RSS and throughput of global_shuffle vs global_shuffle_streaming on synthetic
+    users. Each run happens in a fresh process so ru_maxrss is its own peak.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    tmp = tempfile.mkdtemp(prefix="shuffle_bench_", dir=work_dir)
+    rnd = random.Random(0)
+    json_path, jsonl_path = os.path.join(tmp, "users.json"), os.path.join(tmp, "users.jsonl")
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for user in range(num_users):
+            pw = f"user{user}pw{rnd.randint(0, 9999)}"
+            honeywords = ", ".join(f"{pw}{rnd.randint(0, 999)}" for _ in range(honeywords_per_user))
+            f.write(json.dumps({"password": pw, "honeywords": [honeywords]}) + "\n")
+    with open(jsonl_path, "r", encoding="utf-8") as src, open(json_path, "w", encoding="utf-8") as dst:
+        json.dump([json.loads(line) for line in src], dst)
+
+    entries = num_users * (honeywords_per_user + 1)
+    report = {"users": num_users, "entries": entries}
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        for name, streaming, path in (("in_memory", False, json_path), ("streaming", True, jsonl_path)):
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                stats = pool.submit(_run_shuffle, streaming, path,
+                                    os.path.join(tmp, f"{name}_table.json"), os.path.join(tmp, f"{name}_checker.json")).result()
+            report[f"{name}_s"] = stats["seconds"]
+            report[f"{name}_entries_per_s"] = entries / stats["seconds"]
+            report[f"{name}_peak_rss_mb"] = stats["peak_rss_mb"]
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("📊 Global shuffle benchmark:")
+    for k, v in report.items():
+        print(f"  {k}: {v:,.1f}" if isinstance(v, float) else f"  {k}: {v}")
+    return report
+
+def _time_json_load(path: str) -> dict:
+    start = time.perf_counter()
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    return {"seconds": time.perf_counter() - start, "entries": len(records), "peak_rss_mb": _peak_rss_mb()}
+
+def benchmark_table_format(num_entries: int = 10_000_000, lookups: int = 10_000, work_dir: str = None) -> dict:
+    """Size, write time and load time of the indented JSON table vs the binary table (with and without index)."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    tmp = tempfile.mkdtemp(prefix="table_bench_", dir=work_dir)
+    rng = np.random.default_rng(0)
+    digests = rng.integers(0, 256, size=(num_entries, 32), dtype=np.uint8)
+    probe = rng.integers(0, num_entries, size=lookups)
+    report = {"entries": num_entries}
+    try:
+        json_path = os.path.join(tmp, "table.json")
+        start = time.perf_counter()
+        ShuffledTableFile(digests).to_json(json_path)
+        report["json_write_s"] = time.perf_counter() - start
+        report["json_mb"] = os.path.getsize(json_path) / 2**20
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            stats = pool.submit(_time_json_load, json_path).result()
+        report["json_load_s"] = stats["seconds"]
+        report["json_load_peak_rss_mb"] = stats["peak_rss_mb"]
+
+        for name, sorted_index in (("bin", False), ("bin_indexed", True)):
+            path = os.path.join(tmp, f"table_{name}.bin")
+            start = time.perf_counter()
+            write_binary_table(path, digests, sorted_index=sorted_index)
+            report[f"{name}_write_s"] = time.perf_counter() - start
+            report[f"{name}_mb"] = os.path.getsize(path) / 2**20
+            start = time.perf_counter()
+            table = ShuffledTableFile.open(path)
+            report[f"{name}_open_s"] = time.perf_counter() - start
+            start = time.perf_counter()
+            hashes = [table[int(i)] for i in probe]
+            report[f"{name}_random_read_us"] = (time.perf_counter() - start) / lookups * 1e6
+            if sorted_index:
+                start = time.perf_counter()
+                found = [table.find(h) for h in hashes]
+                report[f"{name}_find_us"] = (time.perf_counter() - start) / lookups * 1e6
+                report["find_correct"] = found == probe.tolist()
+            del table
+
+        start = time.perf_counter()
+        json_to_binary_table(json_path, os.path.join(tmp, "converted.bin"))
+        report["json_to_bin_s"] = time.perf_counter() - start
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("📊 Table format benchmark:")
+    for k, v in report.items():
+        print(f"  {k}: {v:,.4f}" if isinstance(v, float) else f"  {k}: {v}")
+    return report
+
 # ========== Entry Point ========== #
 if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_shuffle()
+        sys.exit(0)
+    if "--benchmark-format" in sys.argv:
+        benchmark_table_format()
+        sys.exit(0)
+    if len(sys.argv) == 4 and sys.argv[1] in ("--to-binary", "--to-json"):
+        (json_to_binary_table if sys.argv[1] == "--to-binary" else binary_table_to_json)(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+    if "--unlinkability" in sys.argv:
+        unlinkability_report()
+        sys.exit(0)
+    if len(sys.argv) == 5 and sys.argv[1] == "--stream":
+        global_shuffle_streaming(sys.argv[2], sys.argv[3], sys.argv[4])
+        sys.exit(0)
+
     global_shuffle(
         input_json="filtered_honeywords.json",
         output_json="global_shuffled_passwords.json",
@@ -0,0 +1,372 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from file_formats import read_records, write_arrays, open_arrays
+from global_shuffle import read_table_digests
+
+# ========== Configuration ==========
+CHECKER_MAGIC = b"MOPHCK01"
+REAL, HONEYWORD, MISS = "real", "honeyword", "miss"
+SALT_BYTES = 16  # global_shuffle salts are uuid4().hex
+
+
+def _check_salt(user_id: int, salt: str):
+    # Salts are stored as raw bytes and hex-encoded again per check, so only lowercase hex of this width round-trips
+    if len(salt) != 2 * SALT_BYTES or not all(c in "0123456789abcdef" for c in salt):
+        raise ValueError(f"user {user_id}: salt must be {2 * SALT_BYTES} lowercase hex characters, got {len(salt)} characters")
+
+
+def _digest_keys(digests: np.ndarray) -> np.ndarray:
+    """First 8 bytes of each SHA-256 digest as uint64: already uniformly distributed, so used directly as hash keys."""
+    return np.ascontiguousarray(digests[:, :8]).view("<u8").ravel()
+
+
+def _build_slots(keys: np.ndarray, capacity: int) -> np.ndarray:
+    """Open-addressing table (linear probing) of position + 1 per slot, 0 = empty, filled in vectorized rounds."""
+    slots = np.zeros(capacity, dtype=np.int64)
+    mask = np.uint64(capacity - 1)
+    pending = np.arange(len(keys), dtype=np.int64)
+    probe = keys & mask
+    while len(pending):
+        free = slots[probe.astype(np.int64)] == 0
+        # of several entries probing the same free slot, the first one takes it
+        candidates = np.flatnonzero(free)
+        _, first = np.unique(probe[candidates], return_index=True)
+        winners = candidates[first]
+        slots[probe[winners].astype(np.int64)] = pending[winners] + 1
+        placed = np.zeros(len(pending), dtype=bool)
+        placed[winners] = True
+        pending, probe = pending[~placed], (probe[~placed] + np.uint64(1)) & mask
+    return slots
+
+
+# ========== HoneyChecker Index ==========
+class HoneyChecker:
+    """
+    Login-time verifier over a shuffled table. Holds the table digests with an
+    open-addressing hash -> position index, and per user the salt and real_index,
+    all as flat arrays (memory-mapped when loaded from an index file).
+
+        checker = HoneyChecker.load("honeychecker.idx")
+        checker.check(user_id, submitted_password)  # -> "real" | "honeyword" | "miss"
+
+    A check is one salted SHA-256, an expected O(1) probe sequence and an O(1) user
+    lookup (ids 0..U-1 are indexed directly, other ids through a sorted id array).
+    """
+
+    def __init__(self, digests, slots, user_ids, salts, real_index):
+        self.digests = digests
+        self.slots = slots
+        self.mask = len(slots) - 1
+        self.user_ids = user_ids
+        self.salts = salts
+        self.real_index = real_index
+        self.dense_users = bool(len(user_ids) == 0 or (user_ids[0] == 0 and user_ids[-1] == len(user_ids) - 1))
+
+    def __len__(self):
+        return len(self.digests)
+
+    # ---------- Build ----------
+    @classmethod
+    def from_arrays(cls, digests: np.ndarray, user_salts: dict, real_index: dict, load_factor: float = 0.5):
+        capacity = 1
+        while capacity * load_factor < max(len(digests), 1):
+            capacity *= 2
+        slots = _build_slots(_digest_keys(digests), capacity)
+        user_ids = np.array(sorted(real_index), dtype=np.int64)
+        for u in user_ids.tolist():
+            _check_salt(u, user_salts[u])
+        salts = np.frombuffer(bytes.fromhex("".join(user_salts[u] for u in user_ids.tolist())), dtype=np.uint8)
+        return cls(digests, slots, user_ids, salts.reshape(-1, SALT_BYTES),
+                   np.array([real_index[u] for u in user_ids.tolist()], dtype=np.int64))
+
+    @classmethod
+    def from_files(cls, table_json: str, checker_json: str, users_jsonl: str):
+        """From global_shuffle_streaming / HoneywordTable.save output (users file carries the salts)."""
+        digests = np.array(read_table_digests(table_json))
+        real_index = {record["user_id"]: record["real_index"] for record in read_records(checker_json)}
+        user_salts = {}
+        with open(users_jsonl, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                user_salts[record["user_id"]] = record["salt"]
+        return cls.from_arrays(digests, user_salts, real_index)
+
+    @classmethod
+    def from_table(cls, table):
+        """From an in-memory global_shuffle.HoneywordTable."""
+        return cls.from_arrays(table.digests[:len(table)].copy(), table.salts, table.checker)
+
+    # ---------- Index File ----------
+    def _arrays(self):
+        return {"digests": self.digests, "slots": self.slots, "user_ids": self.user_ids,
+                "salts": self.salts, "real_index": self.real_index}
+
+    def save(self, index_file: str):
+        header = {"count": len(self), "users": len(self.user_ids)}
+        write_arrays(index_file, CHECKER_MAGIC, header, self._arrays())
+
+    @classmethod
+    def load(cls, index_file: str, mmap: bool = True):
+        _, arrays = open_arrays(index_file, CHECKER_MAGIC, mmap)
+        return cls(**arrays)
+
+    # ---------- Verification ----------
+    def _user_row(self, user_id: int) -> int:
+        if self.dense_users:
+            return user_id if 0 <= user_id < len(self.user_ids) else -1
+        row = int(np.searchsorted(self.user_ids, user_id))
+        return row if row < len(self.user_ids) and self.user_ids[row] == user_id else -1
+
+    def position(self, digest: bytes) -> int:
+        """Table position of a digest, or -1."""
+        i = int.from_bytes(digest[:8], "little") & self.mask
+        slots, digests = self.slots, self.digests
+        while True:
+            slot = int(slots[i])
+            if slot == 0:
+                return -1
+            if digests[slot - 1].tobytes() == digest:
+                return slot - 1
+            i = (i + 1) & self.mask
+
+    def check(self, user_id: int, submitted_password: str) -> str:
+        row = self._user_row(user_id)
+        if row < 0:
+            return MISS
+        salt = self.salts[row].tobytes().hex()
+        pos = self.position(hashlib.sha256((salt + submitted_password).encode("utf-8")).digest())
+        if pos < 0:
+            return MISS
+        return REAL if pos == int(self.real_index[row]) else HONEYWORD
+
+
+# ========== Local Verification Service ==========
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class HoneyCheckerServer:
+    """
+    Serves HoneyChecker.check over HTTP on a local address:
+    POST /check {"user_id": 1, "password": "..."} -> {"result": "real" | "honeyword" | "miss"}
+    """
+
+    def __init__(self, checker: HoneyChecker, host="127.0.0.1", port=0):
+        self.checker = checker
+        self._httpd = _HTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        checker = self.checker
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so a login is one round trip
+            disable_nagle_algorithm = True  # headers and body are separate writes; avoid delayed-ACK stalls
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/check":
+                    self._send_json({"error": "not found"}, 404)
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                    result = checker.check(int(body["user_id"]), str(body["password"]))
+                except (ValueError, KeyError, TypeError) as e:
+                    self._send_json({"error": str(e)}, 400)
+                    return
+                self._send_json({"result": result})
+
+            def _send_json(self, payload, status=200):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ========== Load Test ==========
+def _percentiles(latencies) -> dict:
+    ms = np.asarray(latencies) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p99_ms": float(np.percentile(ms, 99)), "max_ms": float(ms.max())}
+
+
+def load_test(url: str, logins, rate: float = 2000.0, concurrency: int = 16) -> dict:
+    """
+    Open-loop load test: `logins` ((user_id, password) pairs) are scheduled at `rate`
+    requests/s over `concurrency` keep-alive connections; latency is measured from
+    the scheduled send time, so queueing delay counts when the server falls behind.
+    """
+    import http.client
+    from urllib.parse import urlparse
+
+    target = urlparse(url)
+    logins = list(logins)
+    latencies = [0.0] * len(logins)
+    results = [None] * len(logins)
+    errors = [0]
+    start = time.perf_counter() + 0.05
+
+    def worker(offset):
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        for i in range(offset, len(logins), concurrency):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            user_id, password = logins[i]
+            try:
+                conn.request("POST", "/check", json.dumps({"user_id": user_id, "password": password}),
+                             {"Content-Type": "application/json"})
+                results[i] = json.loads(conn.getresponse().read())["result"]
+            except Exception:
+                errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+            latencies[i] = time.perf_counter() - scheduled
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {"requests": len(logins), "target_rate": rate, "achieved_rate": len(logins) / elapsed,
+            "errors": errors[0], **_percentiles(latencies), "results": results}
+
+
+def benchmark_checker(num_users: int = 100_000, honeywords_per_user: int = 20, num_logins: int = 20_000,
+                      rates=(500, 1000, 2000), work_dir: str = None) -> dict:
+    """
+    Builds a synthetic population with global_shuffle_streaming, then reports index
+    build/load time, in-process check() latency and HTTP p50/p99 at several request
+    rates for a mix of 80% real, 10% honeyword and 10% wrong-password logins.
+    """
+    import random
+    import shutil
+    import tempfile
+    from global_shuffle import global_shuffle_streaming
+
+    tmp = tempfile.mkdtemp(prefix="honeychecker_bench_", dir=work_dir)
+    rnd = random.Random(0)
+    users = []
+    try:
+        input_path = os.path.join(tmp, "users.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for user in range(num_users):
+                pw = f"user{user}pw{rnd.randint(0, 9999)}"
+                honeywords = [f"{pw}{i}" for i in range(honeywords_per_user)]
+                users.append((pw, honeywords))
+                f.write(json.dumps({"password": pw, "honeywords": honeywords}) + "\n")
+        paths = [os.path.join(tmp, name) for name in ("table.jsonl", "checker.jsonl", "salts.jsonl")]
+        global_shuffle_streaming(input_path, *paths[:2], users_jsonl=paths[2])
+
+        start = time.perf_counter()
+        checker = HoneyChecker.from_files(*paths)
+        build_s = time.perf_counter() - start
+        index_file = os.path.join(tmp, "honeychecker.idx")
+        checker.save(index_file)
+        start = time.perf_counter()
+        checker = HoneyChecker.load(index_file)
+        load_s = time.perf_counter() - start
+
+        logins, expected = [], []
+        for _ in range(num_logins):
+            user = rnd.randrange(num_users)
+            pw, honeywords = users[user]
+            kind = rnd.random()
+            if kind < 0.8:
+                logins.append((user, pw)), expected.append(REAL)
+            elif kind < 0.9:
+                logins.append((user, rnd.choice(honeywords))), expected.append(HONEYWORD)
+            else:
+                logins.append((user, pw + "x")), expected.append(MISS)
+
+        latencies = []
+        for user, pw in logins:
+            t = time.perf_counter()
+            checker.check(user, pw)
+            latencies.append(time.perf_counter() - t)
+        local = _percentiles(latencies)
+        correct = all(checker.check(u, pw) == e for (u, pw), e in zip(logins, expected))
+
+        report = {"entries": len(checker), "users": num_users, "index_bytes": os.path.getsize(index_file),
+                  "build_s": build_s, "load_s": load_s, "correct": correct,
+                  "check_p50_us": local["p50_ms"] * 1000, "check_p99_us": local["p99_ms"] * 1000}
+        with HoneyCheckerServer(checker) as server:
+            for rate in rates:
+                stats = load_test(server.url, logins, rate=rate)
+                report[f"http_{rate}_rps"] = {k: v for k, v in stats.items() if k != "results"}
+                report["correct"] &= stats["results"] == expected
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print("📊 HoneyChecker benchmark:")
+    for k, v in report.items():
+        if isinstance(v, dict):
+            v = ", ".join(f"{name}={x:.2f}" if isinstance(x, float) else f"{name}={x}" for name, x in v.items())
+        print(f"  {k}: {v:.4f}" if isinstance(v, float) else f"  {k}: {v}")
+    return report
+
+
+# ========== Standalone Entry ==========
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_checker()
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Build or serve the HoneyChecker login verifier")
+    parser.add_argument("--build", nargs=3, metavar=("TABLE", "CHECKER", "USERS"),
+                        help="build the index from global_shuffle output and the users/salts file")
+    parser.add_argument("--index", default="honeychecker.idx")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+
+    if args.build:
+        HoneyChecker.from_files(*args.build).save(args.index)
+        print(f"✅ HoneyChecker index saved to: {args.index}")
+    else:
+        server = HoneyCheckerServer(HoneyChecker.load(args.index), args.host, args.port)
+        print(f"🔐 HoneyChecker listening on {server.url}/check")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
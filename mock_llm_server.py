@@ -0,0 +1,244 @@
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ========== Deterministic Responses ==========
+_TARGET_PATTERN = re.compile(
+    r"(?:target password|similar to|anonymized password|Given the password): (.*?)(?:\. Only output|, generate ONE)"
+)
+_ASSESS_PATTERN = re.compile(r'Password: "(.*)"')
+_LEET = {"a": "@", "e": "3", "i": "1", "o": "0", "s": "$"}
+
+
+def _rng(*parts) -> random.Random:
+    digest = hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def mutate_password(password: str, rng: random.Random) -> str:
+    """A plausible honeyword-style variant of password."""
+    if password == "[MASK]" or not password:
+        name = rng.choice(["lihua", "zhangwei", "wangfang", "alice", "john", "maria"])
+        return f"{name}{rng.randint(1960, 2010)}"
+    chars = list(password)
+    op = rng.randrange(5)
+    pos = rng.randrange(len(chars))
+    if op == 0 and any(c.isdigit() for c in chars):
+        digit_pos = rng.choice([i for i, c in enumerate(chars) if c.isdigit()])
+        chars[digit_pos] = str(rng.randrange(10))
+    elif op == 1:
+        chars[pos] = chars[pos].swapcase()
+    elif op == 2:
+        chars.append(str(rng.randrange(10)))
+    elif op == 3:
+        chars[pos] = _LEET.get(chars[pos].lower(), chars[pos])
+        chars.append(rng.choice("!@#123"))
+    else:
+        chars.insert(pos, rng.choice("abcdefghijklmnopqrstuvwxyz0123456789"))
+    return "".join(chars)
+
+
+def mock_completion(prompt: str, rng: random.Random) -> str:
+    if "may contain PII" in prompt:
+        match = _ASSESS_PATTERN.search(prompt)
+        password = match.group(1) if match else ""
+        has_digits_run = bool(re.search(r"\d{4,}", password))
+        has_letters = bool(re.search(r"[a-zA-Z]{3,}", password))
+        probability = round(0.2 + 0.35 * has_digits_run + 0.35 * has_letters, 2)
+        reason = "Looks like a name followed by a birthday." if probability > 0.5 else "No obvious personal information."
+        return json.dumps({"Reason": reason, "Probability": probability})
+    if "honeyword generator" in prompt:
+        match = _TARGET_PATTERN.search(prompt)
+        return mutate_password(match.group(1) if match else "password", rng)
+    if "real passwords of several users" in prompt:
+        chosen = {}
+        for user, real, candidates in re.findall(r"User (\d+):\nReal password: (.*)\nCandidates: (.*)", prompt):
+            kept = [c.strip() for c in candidates.split(",") if c.strip() != real]
+            rng.shuffle(kept)
+            chosen[user] = kept[:19]
+        return json.dumps(chosen)
+    if "simulated attacker" in prompt:
+        match = re.search(r"candidates:\n(.*)\n", prompt)
+        candidates = [c.strip() for c in match.group(1).split(",")] if match else []
+        real = re.search(r"The real password is: (.*)\. You must", prompt)
+        kept = [c for c in candidates if not real or c != real.group(1)]
+        rng.shuffle(kept)
+        return "\n".join(kept[:19])
+    return "ok"
+
+
+# ========== OpenAI-Compatible HTTP Server ==========
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default backlog of 5 refuses connections under concurrent load
+
+
+class MockLLMServer:
+    """
+    Local stand-in for the OpenAI chat completions endpoint, for offline
+    benchmarks. Answers PII assessment, honeyword generation and threat
+    filtering prompts deterministically (per prompt and request count) after
+    `latency` seconds (+ uniform `jitter`). A fraction `error_rate` of requests
+    is answered with HTTP 429 instead, to exercise client retries. `canned` maps
+    prompt substrings to fixed completions; the first match wins over the
+    deterministic answers.
+
+        with MockLLMServer(latency=0.2) as server:
+            openai.api_base = server.url
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, jitter=0.0, seed=0, error_rate=0.0, canned=None):
+        self.latency = latency
+        self.canned = dict(canned or {})
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.errors = 0
+        self.seed = seed
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = _HTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _next_request_id(self) -> int:
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def completion(self, prompt: str, rng: random.Random) -> str:
+        for needle, content in self.canned.items():
+            if needle in prompt:
+                return content
+        return mock_completion(prompt, rng)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                request_id = server._next_request_id()
+                rng = _rng(server.seed, request_id)
+                time.sleep(max(0.0, server.latency + rng.uniform(0, server.jitter)))
+                if rng.random() < server.error_rate:
+                    with server._lock:
+                        server.errors += 1
+                    self._send_json({"error": {"message": "Rate limit reached (mock)", "type": "requests"}}, 429)
+                    return
+
+                prompt = "\n".join(m.get("content", "") for m in body.get("messages", []) if m.get("role") == "user")
+                choices = []
+                for i in range(int(body.get("n", 1) or 1)):
+                    content = server.completion(prompt, _rng(server.seed, prompt, request_id, i))
+                    choices.append({"index": i, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"})
+                prompt_tokens = max(1, len(prompt) // 4)
+                completion_tokens = sum(max(1, len(c["message"]["content"]) // 4) for c in choices)
+                self._send_json({
+                    "id": f"chatcmpl-mock-{request_id}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "mock"),
+                    "choices": choices,
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                })
+
+            def _send_json(self, payload, status=200):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ========== Offline Benchmark Environment ==========
+@contextlib.contextmanager
+def mock_llm_environment(use_cache: bool = True, **server_args):
+    """
+    Start a MockLLMServer(**server_args) and point openai at it; with use_cache, also
+    install a throwaway SemanticCache so PII lookups start cold and nothing reaches
+    the real cache. openai.api_base / api_key and the process cache are restored on
+    exit, before the server stops and the temp dir is deleted.
+
+        with mock_llm_environment(latency=0.05) as server:
+            generate_honeywords("abc123")
+    """
+    import openai
+    import semantic_cache
+
+    saved_base, saved_key = openai.api_base, openai.api_key
+    with MockLLMServer(**server_args) as server, tempfile.TemporaryDirectory() as tmp:
+        previous_cache = None
+        try:
+            openai.api_base = server.url
+            openai.api_key = saved_key or "mock"
+            if use_cache:
+                previous_cache = semantic_cache.set_semantic_cache(
+                    semantic_cache.SemanticCache(f"{tmp}/semantic_cache.sqlite3"))
+            yield server
+        finally:
+            openai.api_base, openai.api_key = saved_base, saved_key
+            if use_cache:
+                semantic_cache.set_semantic_cache(previous_cache)
+
+
+# ========== Standalone Entry ==========
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible endpoint for offline MoPHoney benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--canned", help="JSON object mapping prompt substrings to fixed completions")
+    args = parser.parse_args()
+
+    canned = None
+    if args.canned:
+        with open(args.canned, "r", encoding="utf-8") as f:
+            canned = json.load(f)
+    server = MockLLMServer(args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           canned=canned)
+    print(f"🧪 Mock LLM endpoint listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -1,3 +1,13 @@
+import io
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
 import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import CountVectorizer
@@ -17,16 +27,20 @@ class LSH:
         return [1 if np.dot(self.hash_funcs[i], password_vector) > 0 else 0 for i in range(self.num_hashes)]
 
 # ========== Process Individual Password ==========
-def process_password(pwd, hashed_results, num_hashes, seed):
+def process_password(pwd, hashed_results, num_hashes, seed, vocabulary=None):
     pwd = str(pwd).strip()
     if len(pwd) == 0:
         return  # Skip empty passwords
 
     try:
-        vectorizer = CountVectorizer(analyzer='char', ngram_range=(1, 3), max_features=15)
-        lsh = LSH(num_hashes=num_hashes, input_dim=15, seed=seed)
-
-        vector = vectorizer.fit_transform([pwd]).toarray()[0]
+        if vocabulary is not None:
+            vectorizer = CountVectorizer(analyzer='char', ngram_range=(1, 3), vocabulary=vocabulary)
+            lsh = LSH(num_hashes=num_hashes, input_dim=len(vocabulary), seed=seed)
+            vector = vectorizer.transform([pwd]).toarray()[0]
+        else:
+            vectorizer = CountVectorizer(analyzer='char', ngram_range=(1, 3), max_features=15)
+            lsh = LSH(num_hashes=num_hashes, input_dim=15, seed=seed)
+            vector = vectorizer.fit_transform([pwd]).toarray()[0]
         vector = np.pad(vector, (0, max(0, lsh.input_dim - len(vector))), 'constant')[:lsh.input_dim]
 
         hashed_password = lsh.hash_password(vector)
@@ -35,8 +49,393 @@ def process_password(pwd, hashed_results, num_hashes, seed):
     except Exception as e:
         print(f"Error processing password '{pwd}': {e}")
 
+# ========== Global N-gram Vocabulary ==========
+GLOBAL_VOCAB_SIZE = 128
+GLOBAL_NUM_HASHES = 64
+GLOBAL_MAX_HAMMING_DIST = 22
+
+def fit_ngram_vocabulary(passwords, size=GLOBAL_VOCAB_SIZE) -> list:
+    """
+    The `size` most frequent char 1-3 grams over the whole corpus, with the same
+    analyzer as process_password. A CountVectorizer fitted on one password at a time
+    gives every password its own dimensions, so their LSH signatures cannot be
+    compared; counting every password against this one vocabulary fixes that.
+    """
+    vectorizer = CountVectorizer(analyzer='char', ngram_range=(1, 3), max_features=size)
+    vectorizer.fit([str(pwd).strip() for pwd in passwords])
+    return vectorizer.get_feature_names_out().tolist()
+
+def vocabulary_vectorizer(vocabulary) -> CountVectorizer:
+    """Char 1-3 gram counter over a fixed vocabulary; reusable across transform() calls."""
+    return CountVectorizer(analyzer='char', ngram_range=(1, 3), vocabulary=vocabulary)
+
+def vocabulary_vectors(passwords, vocabulary) -> np.ndarray:
+    return vocabulary_vectorizer(vocabulary).transform(passwords).toarray()
+
+def vocabulary_path(hash_csv) -> str:
+    """Where the vocabulary used for a hash CSV is kept, next to it."""
+    return os.path.splitext(hash_csv)[0] + '.vocab.json'
+
+def save_vocabulary(path, vocabulary, num_hashes, seed, max_hamming_dist=GLOBAL_MAX_HAMMING_DIST):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'analyzer': 'char', 'ngram_range': [1, 3], 'num_hashes': num_hashes, 'seed': seed,
+                   'max_hamming_dist': max_hamming_dist, 'vocabulary': list(vocabulary)}, f, ensure_ascii=False)
+
+def load_vocabulary(path):
+    """The saved vocabulary settings, or None if there is no vocabulary file."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# ========== Batch Vectorization ==========
+_WHITE_SPACES = re.compile(r"\s\s+")
+
+def projection_matrix(num_hashes, input_dim, seed=42) -> np.ndarray:
+    """Rows equal LSH(num_hashes, input_dim, seed).hash_funcs, without reseeding the global RNG."""
+    return np.random.RandomState(seed).randn(num_hashes, input_dim)
+
+def password_vector(pwd: str, input_dim=15) -> np.ndarray:
+    """
+    The vector process_password gets from a CountVectorizer fitted on this password
+    alone: char 1-3 gram counts of the lowercased, whitespace-normalised text, limited
+    to the input_dim most frequent n-grams (same argsort as sklearn), in sorted n-gram
+    order and zero-padded.
+    """
+    text = _WHITE_SPACES.sub(" ", pwd.lower())
+    counts = Counter(text)
+    for n in (2, 3):
+        counts.update(text[i:i + n] for i in range(len(text) - n + 1))
+    terms = sorted(counts)
+    tfs = np.array([counts[t] for t in terms], dtype=np.int64)
+    if len(tfs) > input_dim:
+        keep = np.zeros(len(tfs), dtype=bool)
+        keep[(-tfs).argsort()[:input_dim]] = True
+        tfs = tfs[keep]
+    vector = np.zeros(input_dim, dtype=np.int64)
+    vector[:len(tfs)] = tfs
+    return vector
+
+def _ngram_counts(passwords):
+    """
+    The chunk's char 1-3 gram counts as one CSR matrix (indptr, term keys, counts),
+    analyzed like password_vector. A term is packed as three 21-bit code points + 1
+    with 0 padding, so each row's terms come out in the same order as sorted strings.
+    """
+    codes, lengths = flat_code_points([_WHITE_SPACES.sub(" ", pwd.lower()) for pwd in passwords])
+    starts = np.cumsum(lengths) - lengths
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    offset = np.arange(len(codes)) - starts[rows]
+    shifted = codes + 1
+    keys, key_rows = [shifted << 42], [rows]
+    for n in (2, 3):
+        ok = offset + n <= lengths[rows]
+        key = shifted[ok] << 42
+        for i in range(1, n):
+            key |= shifted[np.flatnonzero(ok) + i] << (42 - 21 * i)
+        keys.append(key)
+        key_rows.append(rows[ok])
+    keys, key_rows = np.concatenate(keys), np.concatenate(key_rows)
+    order = np.lexsort((keys, key_rows))
+    keys, key_rows = keys[order], key_rows[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = (keys[1:] != keys[:-1]) | (key_rows[1:] != key_rows[:-1])
+    heads = np.flatnonzero(first)
+    counts = np.diff(np.append(heads, len(keys)))
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(key_rows[heads], minlength=len(lengths)), out=indptr[1:])
+    return indptr, keys[heads], counts
+
+def vectorize_passwords(passwords, input_dim=15) -> np.ndarray:
+    """
+    password_vector for every password, built from one CSR count matrix per chunk.
+    Rows with more than input_dim terms keep their top input_dim counts through the
+    same (-tfs).argsort() sklearn uses; rows of equal length are sorted together, which
+    runs the same 1-D sort per row and so breaks ties identically.
+    """
+    matrix = np.zeros((len(passwords), input_dim), dtype=np.int64)
+    if len(passwords) == 0:
+        return matrix
+    indptr, _, counts = _ngram_counts(passwords)
+    terms = np.diff(indptr)
+
+    short = np.flatnonzero(terms <= input_dim)
+    rows = np.repeat(short, terms[short])
+    cols = np.arange(len(rows)) - np.repeat(np.cumsum(terms[short]) - terms[short], terms[short])
+    matrix[rows, cols] = counts[indptr[rows] + cols]
+
+    long_rows = np.flatnonzero(terms > input_dim)
+    for width in np.unique(terms[long_rows]):
+        group = long_rows[terms[long_rows] == width]
+        tfs = counts[indptr[group][:, None] + np.arange(width)]
+        keep = np.sort((-tfs).argsort(axis=1)[:, :input_dim], axis=1)
+        matrix[group] = np.take_along_axis(tfs, keep, axis=1)
+    return matrix
+
+def hash_vectors(vectors, projection) -> np.ndarray:
+    """
+    LSH bits for a (n, input_dim) count matrix with one matrix multiply. Products whose
+    sign could differ from the per-row np.dot by summation-order rounding are recomputed
+    with np.dot, so the bits match LSH.hash_password exactly.
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    scores = vectors @ projection.T
+    bound = np.abs(vectors) @ np.abs(projection).T
+    for row, col in zip(*np.nonzero(np.abs(scores) <= 1e-12 * bound)):
+        scores[row, col] = np.dot(projection[col], vectors[row])
+    return (scores > 0).astype(np.uint8)
+
+def hash_passwords(passwords, num_hashes=10, seed=42, input_dim=15, projection=None, vocabulary=None) -> np.ndarray:
+    """LSH bits per password; counted against `vocabulary` if given, else the per-password fit."""
+    if vocabulary is not None:
+        input_dim = len(vocabulary)
+        vectors = vocabulary_vectors(passwords, vocabulary)
+    else:
+        vectors = vectorize_passwords(passwords, input_dim)
+    if projection is None:
+        projection = projection_matrix(num_hashes, input_dim, seed)
+    return hash_vectors(vectors, projection)
+
+def format_hash(bits) -> str:
+    return "[" + ", ".join("1" if b else "0" for b in bits) + "]"
+
+# ========== Precomputed Similarity Features ==========
+FEATURE_BIGRAM_BITS = 128
+_BIGRAM_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+def flat_code_points(passwords):
+    """Code points of all passwords back to back (row-contiguous), plus per-password lengths."""
+    lengths = np.fromiter((len(p) for p in passwords), dtype=np.int64, count=len(passwords))
+    codes = np.frombuffer("".join(passwords).encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    return codes.astype(np.int64), lengths
+
+def code_point_bigrams(codes, lengths):
+    """Row-contiguous bigrams packed as (first << 21) | second, and the number per row."""
+    keep = np.ones(len(codes), dtype=bool)
+    keep[np.cumsum(lengths)[lengths > 0] - 1] = False
+    keep = keep[:-1] if len(keep) else keep
+    return (codes[:-1][keep] << 21) | codes[1:][keep], np.maximum(lengths - 1, 0)
+
+def hashed_bigram_bits(bigrams, bigram_bits=FEATURE_BIGRAM_BITS) -> np.ndarray:
+    """Bit position (0 .. bigram_bits - 1) of each packed bigram: multiplicative hashing, top bits."""
+    shift = np.uint64(64 - (bigram_bits.bit_length() - 1))
+    return ((np.asarray(bigrams).astype(np.uint64) * _BIGRAM_HASH) >> shift).astype(np.int64)
+
+def _row_bitsets(positions, lengths, words, valid=None) -> np.ndarray:
+    """(n, words) uint64 bitsets: OR of 1 << positions over each row's run of row-contiguous (valid) positions."""
+    masks = np.zeros((len(lengths), words), dtype=np.uint64)
+    nonempty = lengths > 0
+    if not nonempty.any():
+        return masks
+    starts = (np.cumsum(lengths) - lengths)[nonempty]
+    bits = np.uint64(1) << (positions % 64).astype(np.uint64)
+    if valid is not None:
+        bits[~valid] = 0
+    for word in range(words):
+        masks[nonempty, word] = np.bitwise_or.reduceat(np.where(positions // 64 == word, bits, np.uint64(0)), starts)
+    return masks
+
+def _distinct_per_row(values, lengths) -> np.ndarray:
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    order = np.lexsort((values, rows))
+    values, rows = values[order], rows[order]
+    first = np.ones(len(values), dtype=bool)
+    first[1:] = (values[1:] != values[:-1]) | (rows[1:] != rows[:-1])
+    return np.bincount(rows[first], minlength=len(lengths))
+
+def _narrow(values) -> np.ndarray:
+    """Non-negative integers in the smallest unsigned dtype that holds them."""
+    return values.astype(np.min_scalar_type(int(values.max(initial=0))))
+
+def password_features(passwords, bigram_bits=FEATURE_BIGRAM_BITS) -> dict:
+    """
+    Fixed-width columns from which similar_password_finder scores candidates with
+    popcounts instead of building Python sets:
+
+      lengths        uint          characters
+      char_masks     (n, 2) uint64 bit c set for every ASCII character c
+      char_counts    uint          distinct characters
+      non_ascii      bool          row has characters char_masks cannot hold
+      bigram_masks   (n, bigram_bits // 64) uint64, hashed set of character bigrams
+      bigram_counts  uint          distinct bigrams
+
+    The counts use the smallest unsigned dtype that holds them (uint8 for
+    typical password lists).
+    """
+    if bigram_bits < 64 or bigram_bits & (bigram_bits - 1):
+        raise ValueError("bigram_bits must be a power of two >= 64")
+    passwords = [str(pwd) for pwd in passwords]
+    codes, lengths = flat_code_points(passwords)
+    ascii = codes < 128
+    rows = np.repeat(np.arange(len(passwords)), lengths)
+    bigrams, bigram_lengths = code_point_bigrams(codes, lengths)
+    return {
+        "lengths": _narrow(lengths),
+        "char_masks": _row_bitsets(codes, lengths, 2, valid=ascii),
+        "char_counts": _narrow(_distinct_per_row(codes, lengths)),
+        "non_ascii": np.bincount(rows[~ascii], minlength=len(passwords)) > 0,
+        "bigram_masks": _row_bitsets(hashed_bigram_bits(bigrams, bigram_bits), bigram_lengths, bigram_bits // 64),
+        "bigram_counts": _narrow(_distinct_per_row(bigrams, bigram_lengths)),
+    }
+
 # ========== Preprocess Password Dataset ==========
-def preprocess_hashes(csv_file, output_file, num_hashes=10, seed=42):
+def _hash_csv_stream(reader, output_file, projection, header=True, vocabulary=None):
+    total = 0
+    mode = 'w'
+    for chunk in reader:
+        passwords = [str(pwd).strip() for pwd in chunk['Password']]
+        passwords = [pwd for pwd in passwords if pwd]
+        bits = hash_passwords(passwords, projection=projection, vocabulary=vocabulary)
+        pd.DataFrame({'Password': passwords, 'Hash': [format_hash(b) for b in bits]}).to_csv(
+            output_file, index=False, mode=mode, header=header and mode == 'w')
+        mode = 'a'
+        total += len(passwords)
+    if mode == 'w':
+        pd.DataFrame(columns=['Password', 'Hash']).to_csv(output_file, index=False, header=header)
+    return total
+
+def _write_vocabulary_file(output_file, vocabulary, num_hashes, seed):
+    # Keep the vocabulary next to the hashes it produced; drop a stale one when hashing per password
+    path = vocabulary_path(output_file)
+    if vocabulary is not None:
+        save_vocabulary(path, vocabulary, num_hashes, seed)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def preprocess_hashes(csv_file, output_file, num_hashes=10, seed=42, chunksize=100_000, vocabulary=None):
+    """
+    Stream csv_file in chunks, hash each chunk with one matrix multiply and append it
+    to output_file. Produces the same rows as hashing every password with process_password.
+    With a `vocabulary` (fit_ngram_vocabulary) it is saved next to output_file.
+    """
+    projection = projection_matrix(num_hashes, len(vocabulary) if vocabulary is not None else 15, seed)
+    try:
+        reader = pd.read_csv(csv_file, usecols=['Password'], dtype=str, chunksize=chunksize)
+    except Exception as e:
+        raise Exception(f"Failed to read CSV file: {str(e)}")
+
+    start = time.perf_counter()
+    total = _hash_csv_stream(reader, output_file, projection, vocabulary=vocabulary)
+    _write_vocabulary_file(output_file, vocabulary, num_hashes, seed)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Hashed results saved to: {output_file}")
+    print(f"⚡ {total} passwords in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} passwords/s)")
+    return total
+
+# ========== Parallel Sharded Build ==========
+def _shard_ranges(csv_file, num_shards):
+    """
+    Split the data rows of csv_file into byte ranges that start and end on line
+    boundaries. Assumes no quoted field spans several lines, which holds for
+    password lists with one password per row.
+    """
+    size = os.path.getsize(csv_file)
+    with open(csv_file, 'rb') as f:
+        f.readline()
+        data_start = f.tell()
+        bounds = [data_start]
+        for i in range(1, num_shards):
+            target = data_start + (size - data_start) * i // num_shards
+            if target <= bounds[-1]:
+                continue
+            f.seek(target - 1)
+            f.readline()
+            if bounds[-1] < f.tell() < size:
+                bounds.append(f.tell())
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+def _hash_shard(task):
+    csv_file, start, end, shard_file, num_hashes, seed, chunksize, vocabulary = task
+    with open(csv_file, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        data = f.read(end - start)
+    reader = pd.read_csv(io.BytesIO(header + data), usecols=['Password'], dtype=str, chunksize=chunksize)
+    tmp_file = shard_file + '.tmp'
+    projection = projection_matrix(num_hashes, len(vocabulary) if vocabulary is not None else 15, seed)
+    total = _hash_csv_stream(reader, tmp_file, projection, header=False, vocabulary=vocabulary)
+    os.replace(tmp_file, shard_file)  # the finished shard file is the checkpoint
+    return shard_file, total
+
+def _remove_shard_files(work_dir):
+    # Only what preprocess_hashes_parallel writes, including shard_*.tmp left by a killed run
+    for name in os.listdir(work_dir):
+        if name.startswith('shard_') or name == 'manifest.json':
+            os.remove(os.path.join(work_dir, name))
+
+def preprocess_hashes_parallel(csv_file, output_file, num_hashes=10, seed=42, num_workers=None,
+                               shard_bytes=64 * 1024 * 1024, work_dir=None, chunksize=100_000, keep_shards=False,
+                               vocabulary=None):
+    """
+    Hash csv_file in byte-range shards on a process pool and merge the shard outputs,
+    in order, into output_file (same content as preprocess_hashes). Each finished shard
+    is kept in work_dir, so rerunning after a crash only hashes the missing shards.
+    Shard boundaries depend only on the input and shard_bytes, so a rerun may use a
+    different num_workers; lower shard_bytes to spread a small input over more workers.
+    Without keep_shards the shard files and manifest are deleted at the end; the
+    directory itself is only removed when it is the default output_file + '.shards'.
+    """
+    num_workers = num_workers or os.cpu_count()
+    own_work_dir = work_dir is None
+    work_dir = work_dir or output_file + '.shards'
+    os.makedirs(work_dir, exist_ok=True)
+
+    stat = os.stat(csv_file)
+    num_shards = max(1, -(-stat.st_size // shard_bytes))
+    plan = {
+        'csv_file': os.path.abspath(csv_file),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'num_hashes': num_hashes,
+        'seed': seed,
+        'vocabulary': list(vocabulary) if vocabulary is not None else None,
+        'ranges': _shard_ranges(csv_file, num_shards),
+    }
+    manifest_file = os.path.join(work_dir, 'manifest.json')
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        plan['ranges'] = [tuple(r) for r in plan['ranges']]
+        previous['ranges'] = [tuple(r) for r in previous['ranges']]
+        if previous != plan:
+            print(f"♻️ Input or settings changed, discarding shards in {work_dir}")
+            _remove_shard_files(work_dir)
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(plan, f)
+
+    shard_files = [os.path.join(work_dir, f'shard_{i:05d}.csv') for i in range(len(plan['ranges']))]
+    tasks = [(csv_file, start, end, shard_file, num_hashes, seed, chunksize, vocabulary)
+             for (start, end), shard_file in zip(plan['ranges'], shard_files)
+             if not os.path.exists(shard_file)]
+    print(f"🧩 {len(shard_files)} shards, {len(shard_files) - len(tasks)} already done, {num_workers} workers")
+
+    start_time = time.perf_counter()
+    hashed = 0
+    if tasks:
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            for done, (shard_file, count) in enumerate(pool.map(_hash_shard, tasks), 1):
+                hashed += count
+                print(f"[{done:03d}/{len(tasks)}] ✅ {os.path.basename(shard_file)} ({count} passwords)")
+    elapsed = time.perf_counter() - start_time
+
+    with open(output_file, 'wb') as out:
+        out.write(b'Password,Hash\n')
+        for shard_file in shard_files:
+            with open(shard_file, 'rb') as f:
+                shutil.copyfileobj(f, out)
+    _write_vocabulary_file(output_file, vocabulary, num_hashes, seed)
+    if not keep_shards:
+        if own_work_dir:
+            shutil.rmtree(work_dir)
+        else:
+            _remove_shard_files(work_dir)
+
+    print(f"✅ Hashed results saved to: {output_file}")
+    print(f"⚡ {hashed} passwords hashed in {elapsed:.2f}s ({hashed / max(elapsed, 1e-9):,.0f} passwords/s)")
+    return hashed
+
+def preprocess_hashes_per_password(csv_file, output_file, num_hashes=10, seed=42):
     try:
         df = pd.read_csv(csv_file, usecols=['Password'])
     except Exception as e:
@@ -49,6 +448,82 @@ def preprocess_hashes(csv_file, output_file, num_hashes=10, seed=42):
     pd.DataFrame(hashed_results, columns=['Password', 'Hash']).to_csv(output_file, index=False)
     print(f"✅ Hashed results saved to: {output_file}")
 
+# ========== Benchmark ==========
+def benchmark_preprocess(csv_file, sample_size=2000, num_hashes=10, seed=42):
+    passwords = pd.read_csv(csv_file, usecols=['Password'], dtype=str, nrows=sample_size)['Password']
+    passwords = [str(pwd).strip() for pwd in passwords if str(pwd).strip()]
+
+    start = time.perf_counter()
+    legacy = []
+    for pwd in passwords:
+        process_password(pwd, legacy, num_hashes, seed)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bits = hash_passwords(passwords, num_hashes=num_hashes, seed=seed)
+    batch_time = time.perf_counter() - start
+
+    report = {
+        "passwords": len(passwords),
+        "per_password_pw_per_s": len(passwords) / legacy_time,
+        "batch_pw_per_s": len(passwords) / batch_time,
+        "speedup": legacy_time / batch_time,
+        "bit_identical": [h for _, h in legacy] == bits.tolist(),
+    }
+    print("📊 Hashing benchmark:")
+    for k, v in report.items():
+        print(f"  {k}: {v:,.2f}" if isinstance(v, float) else f"  {k}: {v}")
+    return report
+
+def benchmark_parallel_scaling(csv_file, worker_counts=None, repeat_input=8):
+    """Time preprocess_hashes_parallel for 1..N workers on csv_file repeated repeat_input times."""
+    worker_counts = worker_counts or sorted({1, 2, 4, os.cpu_count() or 1})
+    # The same shard plan for every worker count: enough shards to keep the largest pool busy
+    work_root = tempfile.mkdtemp(prefix='mop_hash_bench_')
+    try:
+        big_csv = os.path.join(work_root, 'input.csv')
+        with open(csv_file, 'rb') as src, open(big_csv, 'wb') as dst:
+            header = src.readline()
+            body = src.read()
+            if not body.endswith(b'\n'):
+                body += b'\n'
+            dst.write(header)
+            for _ in range(repeat_input):
+                dst.write(body)
+
+        serial_out = os.path.join(work_root, 'serial.csv')
+        preprocess_hashes(big_csv, serial_out)
+        with open(serial_out, 'rb') as f:
+            expected = f.read()
+
+        shard_bytes = max(1, os.path.getsize(big_csv) // (4 * max(worker_counts)))
+        results = []
+        for workers in worker_counts:
+            out = os.path.join(work_root, f'parallel_{workers}.csv')
+            start = time.perf_counter()
+            preprocess_hashes_parallel(big_csv, out, num_workers=workers, shard_bytes=shard_bytes)
+            elapsed = time.perf_counter() - start
+            with open(out, 'rb') as f:
+                identical = f.read() == expected
+            results.append({'workers': workers, 'seconds': elapsed, 'identical': identical})
+
+        base = results[0]['seconds']
+        print("📊 Parallel hashing scaling:")
+        for r in results:
+            r['speedup'] = base / r['seconds']
+            print(f"  {r['workers']:>3} workers: {r['seconds']:.2f}s  x{r['speedup']:.2f}  identical={r['identical']}")
+        return results
+    finally:
+        shutil.rmtree(work_root)
+
 # ========== Example Usage ==========
 if __name__ == "__main__":
-    preprocess_hashes('benchmark_dataset.csv', 'benchmark_dataset_hash.csv')
+    if "--benchmark" in sys.argv:
+        benchmark_preprocess('benchmark_dataset.csv')
+        benchmark_parallel_scaling('benchmark_dataset.csv')
+    elif "--global-vocab" in sys.argv:
+        passwords = pd.read_csv('benchmark_dataset.csv', usecols=['Password'], dtype=str)['Password'].dropna()
+        preprocess_hashes('benchmark_dataset.csv', 'benchmark_dataset_hash.csv', num_hashes=GLOBAL_NUM_HASHES,
+                          vocabulary=fit_ngram_vocabulary(passwords))
+    else:
+        preprocess_hashes('benchmark_dataset.csv', 'benchmark_dataset_hash.csv')
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import hmac
+import hashlib
+import secrets
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# ========== Configuration ==========
+DEFAULT_CACHE_PATH = os.environ.get("MOPHONEY_SEMANTIC_CACHE", "semantic_cache.sqlite3")
+SALT_ENV_VAR = "MOPHONEY_CACHE_SALT"
+KEY_FILE_ENV_VAR = "MOPHONEY_CACHE_KEY_FILE"
+PII_CATEGORIES = ("name", "email", "birthday", "phone", "ID")
+
+# ========== Stored Record ==========
+def pii_categories(result: dict) -> list:
+    """The PII categories an assessment names: stored ones, else those its "Reason" mentions."""
+    if "Categories" in result:
+        return list(result["Categories"])
+    reason = str(result.get("Reason", "")).lower()
+    return [term for term in PII_CATEGORIES if term in reason]
+
+def cache_record(result: dict) -> dict:
+    """What the cache keeps of an assessment: the probability and PII categories, never the "Reason" text."""
+    return {"Probability": result.get("Probability", 0.0), "Categories": pii_categories(result)}
+
+def _read_or_create_key(key_file: str, new_salt: str) -> str:
+    # Publish a complete file with os.link so concurrent openers agree on one salt
+    if not os.path.exists(key_file):
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(key_file)))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(new_salt)
+            os.link(tmp_file, key_file)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_file)
+    with open(key_file, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+# ========== Shared PII Assessment Cache ==========
+class SemanticCache:
+    """
+    Persistent cache for extract_semantic_feature results, shared by every caller
+    and safe to use from several processes at once (SQLite in WAL mode).
+
+    Entries are keyed by HMAC-SHA256(salt, password) and hold only cache_record()
+    (probability and PII categories), so no plaintext password or LLM text that may quote
+    it is written to disk. The salt comes from the `salt` argument, the MOPHONEY_CACHE_SALT
+    environment variable, or a key file (`key_file`, MOPHONEY_CACHE_KEY_FILE, default
+    `path + ".key"`) created on first use; it is never stored in the database.
+    Least recently used entries beyond `max_entries` are evicted, and entries older
+    than `ttl_seconds` (if set) are treated as misses and dropped. Reads do not write:
+    hits are remembered in memory and their access times are written in one batch
+    every `touch_every` hits, with the next write, or before an eviction.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=1_000_000, ttl_seconds=None, salt=None, evict_every=256,
+                 touch_every=1024, key_file=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = evict_every
+        self.touch_every = touch_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._pending_touches = {}
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.writes = 0
+        self.evictions = 0
+
+        conn = self._conn()
+        with self._transaction(conn):
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            legacy_salt = conn.execute("SELECT value FROM meta WHERE key = 'salt'").fetchone()
+        salt = salt or os.environ.get(SALT_ENV_VAR)
+        if salt is None:
+            key_file = key_file or os.environ.get(KEY_FILE_ENV_VAR) or path + ".key"
+            # Databases written before the key file kept their salt in meta; it moves out
+            new_salt = legacy_salt[0] if legacy_salt is not None else secrets.token_hex(16)
+            salt = _read_or_create_key(key_file, new_salt)
+        self._salt = salt.encode("utf-8") if isinstance(salt, str) else salt
+        if legacy_salt is not None:
+            self._migrate_legacy_entries(conn)
+
+    def _migrate_legacy_entries(self, conn):
+        # Older entries stored the whole assessment, "Reason" included; keep only cache_record()
+        with self._transaction(conn):
+            rows = conn.execute("SELECT key, value FROM entries").fetchall()
+            conn.executemany("UPDATE entries SET value = ? WHERE key = ?",
+                             [(json.dumps(cache_record(json.loads(value))), key) for key, value in rows])
+            conn.execute("DELETE FROM meta WHERE key = 'salt'")
+        # Rewrite the file so the old values and salt do not linger in free pages or the WAL
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread and per process: sqlite connections must not cross a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self, conn):
+        # The connection runs in autocommit mode (isolation_level=None), where `with conn:`
+        # does nothing; group each batch of writes into one explicit transaction instead
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def key(self, password: str) -> str:
+        return hmac.new(self._salt, password.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    # ---------- Lookup ----------
+    def get(self, password: str):
+        return self.get_many([password]).get(password)
+
+    def get_many(self, passwords) -> dict:
+        """Cached results for the given passwords; misses are simply absent."""
+        keys = {self.key(pw): pw for pw in passwords}
+        if not keys:
+            return {}
+        now = time.time()
+        conn = self._conn()
+        rows = []
+        key_list = list(keys)
+        for i in range(0, len(key_list), 500):
+            batch = key_list[i:i + 500]
+            rows.extend(conn.execute(
+                f"SELECT key, value, created FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+
+        found, stale, touched = {}, [], []
+        for key, value, created in rows:
+            if self.ttl_seconds is not None and now - created > self.ttl_seconds:
+                stale.append(key)
+            else:
+                found[keys[key]] = cache_record(json.loads(value))
+                touched.append(key)
+        if stale:
+            with self._transaction(conn):
+                conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in stale])
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            self.expired += len(stale)
+            self._pending_touches.update(dict.fromkeys(touched, now))
+            flush = len(self._pending_touches) >= self.touch_every
+        if flush:
+            self.flush_touches()
+        return found
+
+    def _take_touches(self) -> list:
+        with self._lock:
+            touches, self._pending_touches = self._pending_touches, {}
+        return [(accessed, key) for key, accessed in touches.items()]
+
+    def flush_touches(self):
+        """Write the access times of hits since the last flush (LRU order only, never values)."""
+        touches = self._take_touches()
+        if touches:
+            conn = self._conn()
+            with self._transaction(conn):
+                conn.executemany("UPDATE entries SET accessed = MAX(accessed, ?) WHERE key = ?", touches)
+
+    # ---------- Update ----------
+    def set(self, password: str, value: dict):
+        self.set_many({password: value})
+
+    def set_many(self, items: dict):
+        if not items:
+            return
+        now = time.time()
+        rows = [(self.key(pw), json.dumps(cache_record(value)), now, now) for pw, value in items.items()]
+        touches = self._take_touches()
+        conn = self._conn()
+        with self._transaction(conn):
+            conn.executemany("INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)", rows)
+            if touches:
+                conn.executemany("UPDATE entries SET accessed = MAX(accessed, ?) WHERE key = ?", touches)
+        with self._lock:
+            self.writes += len(rows)
+            self._writes_since_evict += len(rows)
+            evict = self._writes_since_evict >= self.evict_every
+            if evict:
+                self._writes_since_evict = 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        self.flush_touches()
+        conn = self._conn()
+        with self._transaction(conn):
+            if self.ttl_seconds is not None:
+                cur = conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl_seconds,))
+                self._count_evictions(cur.rowcount)
+            excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                cur = conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)", (excess,)
+                )
+                self._count_evictions(cur.rowcount)
+
+    def _count_evictions(self, n):
+        with self._lock:
+            self.evictions += max(n, 0)
+
+    def clear(self):
+        self._take_touches()
+        conn = self._conn()
+        with self._transaction(conn):
+            conn.execute("DELETE FROM entries")
+
+    # ---------- Counters ----------
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+
+_DEFAULT_CACHE = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+def get_semantic_cache() -> SemanticCache:
+    """The process-wide cache at DEFAULT_CACHE_PATH, opened on first use."""
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = SemanticCache(DEFAULT_CACHE_PATH)
+    return _DEFAULT_CACHE
+
+def set_semantic_cache(cache: SemanticCache):
+    """Replace the process-wide cache (e.g. with a throwaway one for offline benchmarks); returns the previous one."""
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        previous, _DEFAULT_CACHE = _DEFAULT_CACHE, cache
+    return previous
@@ -1,8 +1,27 @@
+import os
+import sys
+import json
+import time
+import threading
+import shutil
+import tempfile
 import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import CountVectorizer
 from Levenshtein import distance as levenshtein_distance
 import ast
+from math import comb
+from password_hash import (password_vector, hash_vectors, hash_passwords, flat_code_points, password_features,
+                           code_point_bigrams, hashed_bigram_bits, FEATURE_BIGRAM_BITS, fit_ngram_vocabulary,
+                           vocabulary_vectorizer, vocabulary_path, load_vocabulary,
+                           GLOBAL_VOCAB_SIZE, GLOBAL_NUM_HASHES, GLOBAL_MAX_HAMMING_DIST)
+from file_formats import write_arrays, open_arrays
+
+try:
+    from rapidfuzz.process import cdist as _rf_cdist
+    from rapidfuzz.distance import Levenshtein as _rf_levenshtein
+except ImportError:  # optional: falls back to python-Levenshtein one candidate at a time
+    _rf_cdist = None
 
 # ====== LSH Hash Function Definition ======
 class LSH:
@@ -11,6 +30,7 @@ class LSH:
         self.input_dim = input_dim
         np.random.seed(seed)
         self.hash_funcs = [self._generate_random_hash(self.input_dim) for _ in range(num_hashes)]
+        self._table_cache = None
 
     def _generate_random_hash(self, input_dim):
         return np.random.randn(input_dim)
@@ -21,14 +41,128 @@ class LSH:
     def hamming_distance(self, hash1, hash2):
         return sum(c1 != c2 for c1, c2 in zip(hash1, hash2))
 
+    def build_bucket_table(self, hash_data, num_bands=1):
+        hash_bits = np.asarray(hash_data['Hash'].tolist(), dtype=np.uint64).reshape(-1, self.num_hashes)
+        signatures = (hash_bits << np.arange(self.num_hashes, dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+        return LSHBucketTable(signatures, self.num_hashes, num_bands=num_bands)
+
     def get_candidates_from_hashes(self, target_hash, hash_data, max_hamming_dist=2):
-        candidates = []
-        for _, row in hash_data.iterrows():
-            stored_hash = row['Hash']
-            hamming_dist = self.hamming_distance(stored_hash, target_hash)
-            if hamming_dist <= max_hamming_dist:
-                candidates.append(row['Password'])
-        return candidates
+        """
+        Passwords in hash_data whose hash is within max_hamming_dist of target_hash,
+        in row order. hash_data may be a prebuilt (password list, LSHBucketTable) pair.
+        For a DataFrame the bucket table is built once and reused while the same
+        DataFrame object is passed again (do not modify it in place in between).
+        """
+        if isinstance(hash_data, tuple):
+            passwords, table = hash_data
+        else:
+            cached = self._table_cache
+            if cached is None or cached[0] is not hash_data or len(cached[1]) != len(hash_data):
+                cached = (hash_data, hash_data['Password'].tolist(), self.build_bucket_table(hash_data))
+                self._table_cache = cached
+            passwords, table = cached[1], cached[2]
+        ids = table.query(pack_hash(target_hash), max_hamming_dist=max_hamming_dist)
+        return [passwords[i] for i in ids]
+
+# ====== Bucketed Multi-Probe Lookup ======
+
+def pack_hash(hash_bits) -> int:
+    """Pack a list of 0/1 LSH bits into an integer (bit i <- hash_bits[i])."""
+    packed = 0
+    for i, bit in enumerate(hash_bits):
+        if bit:
+            packed |= 1 << i
+    return packed
+
+
+def _popcount64(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    as_bytes = values.view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(as_bytes, axis=1).sum(axis=1)
+
+
+_PROBE_MASKS = {}
+
+def probe_masks(width, radius) -> np.ndarray:
+    """All XOR masks over `width` bits flipping at most `radius` bits, in increasing order."""
+    key = (width, radius)
+    if key not in _PROBE_MASKS:
+        masks = [0]
+        frontier = [0]
+        for _ in range(min(radius, width)):
+            frontier = sorted({m | (1 << b) for m in frontier for b in range(width) if not m >> b & 1})
+            masks.extend(frontier)
+        _PROBE_MASKS[key] = np.array(sorted(masks), dtype=np.uint64)
+    return _PROBE_MASKS[key]
+
+
+class LSHBucketTable:
+    """
+    Hash-bucket tables over packed LSH signatures. The signature bits are split
+    into `num_bands` contiguous bands with one table each; every table maps a band
+    key to the sorted row ids sharing it (stored CSR-style: unique keys, offsets, ids).
+
+    A query probes, in every band, each bucket within `probe_radius` bit flips of the
+    target's band key. By the pigeonhole principle a row within `max_hamming_dist` of
+    the target is within max_hamming_dist // num_bands of it in at least one band, so
+    the default radius returns exactly the rows a linear Hamming scan would. A smaller
+    radius trades recall for fewer probes on large corpora. When the probes would
+    outnumber the rows (wide signatures, large radius) the query is a popcount
+    scan over all signatures instead, with the same result.
+    """
+
+    def __init__(self, signatures, num_hashes, num_bands=1):
+        if not 1 <= num_bands <= num_hashes:
+            raise ValueError("num_bands must be between 1 and num_hashes")
+        self.signatures = np.asarray(signatures, dtype=np.uint64)
+        self.num_hashes = num_hashes
+        self.num_bands = num_bands
+
+        bounds = np.linspace(0, num_hashes, num_bands + 1).astype(int)
+        self.bands = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            width = int(end - start)
+            keys = (self.signatures >> np.uint64(start)) & np.uint64((1 << width) - 1)
+            ids = np.argsort(keys, kind="stable")
+            unique_keys, first = np.unique(keys[ids], return_index=True)
+            offsets = np.append(first, len(ids))
+            self.bands.append((int(start), width, unique_keys, offsets, ids))
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def query(self, target_signature, max_hamming_dist=2, probe_radius=None) -> np.ndarray:
+        """Sorted row ids whose signature is within max_hamming_dist of target_signature."""
+        if probe_radius is None:
+            probe_radius = max_hamming_dist // self.num_bands
+        target_signature = np.uint64(target_signature)
+        num_probes = sum(comb(width, r) for _, width, *_ in self.bands for r in range(min(probe_radius, width) + 1))
+        if num_probes > len(self.signatures):
+            distances = _popcount64(self.signatures ^ target_signature)
+            return np.flatnonzero(distances <= max_hamming_dist)
+
+        parts = []
+        for start, width, unique_keys, offsets, ids in self.bands:
+            band_key = (target_signature >> np.uint64(start)) & np.uint64((1 << width) - 1)
+            probes = band_key ^ probe_masks(width, probe_radius)
+            pos = np.searchsorted(unique_keys, probes)
+            hit = pos < len(unique_keys)
+            hit[hit] = unique_keys[pos[hit]] == probes[hit]
+            for p in pos[hit]:
+                parts.append(ids[offsets[p]:offsets[p + 1]])
+
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.concatenate(parts)
+        # Probing exactly max_hamming_dist flips of a single band finds only rows within range;
+        # any other radius needs the full popcount check
+        exact = self.num_bands == 1 and probe_radius == max_hamming_dist
+        if exact:
+            return np.sort(candidates)
+        candidates = np.unique(candidates)
+        distances = _popcount64(self.signatures[candidates] ^ target_signature)
+        return candidates[distances <= max_hamming_dist]
 
 # ====== Similarity Functions ======
 
@@ -53,9 +187,137 @@ def calculate_final_similarity(target_pwd, candidate_pwd, weights):
     s3 = ngram_similarity(target_pwd, candidate_pwd)
     return weights[0] * s1 + weights[1] * s2 + weights[2] * s3
 
+# ====== Batch Re-Ranking ======
+
+_LOOKUP_LIMIT = 1 << 22  # largest symbol range mapped through a dense lookup table instead of a binary search
+
+
+def _sorted_unique(values) -> np.ndarray:
+    # np.unique may take a hash-based path that is far slower than sorting for these int keys
+    ordered = np.sort(values)
+    return ordered[np.concatenate(([True], ordered[1:] != ordered[:-1]))] if len(ordered) else ordered
+
+
+def _row_overlap(symbols, lengths, target_symbols, key_base):
+    """
+    For row-contiguous `symbols` (row i has lengths[i] entries, each below key_base):
+    the number of distinct symbols per row and how many of them the target shares.
+    Shared symbols are counted as a bitset over the target's distinct symbols (one
+    bit each), OR-reduced per row and popcounted.
+    """
+    n = len(lengths)
+    distinct = np.zeros(n, dtype=np.int64)
+    shared = np.zeros(n, dtype=np.int64)
+    if len(symbols) == 0:
+        return distinct, shared
+    rows = np.repeat(np.arange(n, dtype=np.int64), lengths)
+    pairs = _sorted_unique(rows * key_base + symbols)
+    distinct += np.bincount(pairs // key_base, minlength=n)
+
+    target_symbols = _sorted_unique(target_symbols)
+    if key_base <= _LOOKUP_LIMIT:
+        lookup = np.full(key_base, -1, dtype=np.int64)
+        lookup[target_symbols] = np.arange(len(target_symbols))
+        slot = lookup[symbols]
+        in_target = slot >= 0
+    else:
+        slot = np.searchsorted(target_symbols, symbols)
+        in_target = slot < len(target_symbols)
+        in_target[in_target] = target_symbols[slot[in_target]] == symbols[in_target]
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    nonempty = lengths > 0
+    for word in range((len(target_symbols) + 63) // 64):
+        in_word = in_target & (slot // 64 == word)
+        bits = np.where(in_word, np.uint64(1) << (slot % 64).astype(np.uint64), np.uint64(0))
+        masks = np.bitwise_or.reduceat(bits, starts[nonempty])
+        shared[nonempty] += _popcount64(masks).astype(np.int64)
+    return distinct, shared
+
+
+def _bigrams(codes, lengths, alphabet_size):
+    """Row-contiguous bigrams (first * alphabet_size + second) of row-contiguous codes, and their per-row counts."""
+    last = np.cumsum(lengths)[lengths > 0] - 1
+    keep = np.ones(len(codes), dtype=bool)
+    keep[last] = False
+    keep = keep[:-1] if len(keep) else keep
+    return codes[:-1][keep] * alphabet_size + codes[1:][keep], np.maximum(lengths - 1, 0)
+
+
+def _levenshtein_distances(target_pwd, candidates) -> np.ndarray:
+    if _rf_cdist is not None:
+        return _rf_cdist([target_pwd], candidates, scorer=_rf_levenshtein.distance, dtype=np.int64)[0]
+    return np.fromiter((levenshtein_distance(target_pwd, c) for c in candidates), dtype=np.int64, count=len(candidates))
+
+
+def batch_final_similarity(target_pwd, candidates, weights) -> np.ndarray:
+    """
+    calculate_final_similarity(target_pwd, c, weights) for every candidate at once, with
+    bit-identical results. The target's character and bigram sets are built once; the
+    candidates' sets are compared against them as bitsets. Where the bigram Jaccard is
+    undefined (both passwords shorter than 2 characters) it scores 0 instead of raising.
+    """
+    candidates = list(candidates)
+    if not candidates:
+        return np.zeros(0, dtype=np.float64)
+    codes, lengths = flat_code_points(candidates + [target_pwd])
+    alphabet = _sorted_unique(codes)
+    if len(alphabet) and alphabet[-1] < _LOOKUP_LIMIT:
+        lookup = np.zeros(int(alphabet[-1]) + 1, dtype=np.int64)
+        lookup[alphabet] = np.arange(len(alphabet))
+        codes = lookup[codes]
+    else:
+        codes = np.searchsorted(alphabet, codes).astype(np.int64)
+    alphabet_size = len(alphabet)
+    bigrams, bigram_lengths = _bigrams(codes, lengths, alphabet_size)
+    target_chars = codes[len(codes) - lengths[-1]:]
+    target_bigrams = bigrams[len(bigrams) - bigram_lengths[-1]:]
+    codes, lengths = codes[:len(codes) - lengths[-1]], lengths[:-1]
+    bigrams, bigram_lengths = bigrams[:len(bigrams) - bigram_lengths[-1]], bigram_lengths[:-1]
+
+    max_len = np.maximum(lengths, len(target_pwd))
+    dist = _levenshtein_distances(target_pwd, candidates)
+    s1 = np.where(max_len > 0, 1 - dist / np.maximum(max_len, 1), 0)
+
+    distinct, shared = _row_overlap(codes, lengths, target_chars, alphabet_size)
+    union = distinct + len(_sorted_unique(target_chars)) - shared
+    s2 = shared / np.maximum(union, 1)
+
+    distinct, shared = _row_overlap(bigrams, bigram_lengths, target_bigrams, alphabet_size * alphabet_size)
+    union = distinct + len(_sorted_unique(target_bigrams)) - shared
+    s3 = np.where(union > 0, shared / np.maximum(union, 1), 0)
+
+    return weights[0] * s1 + weights[1] * s2 + weights[2] * s3
+
+
+def top_k_indices(scores, k) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first, ties in index order: the same order as a
+    stable descending sort, but selected with a partial partition instead of a full sort.
+    """
+    scores = np.asarray(scores)
+    if k <= 0 or len(scores) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        selected = np.flatnonzero(scores >= kth)
+    else:
+        selected = np.arange(len(scores))
+    return selected[np.argsort(-scores[selected], kind="stable")][:k]
+
+
+def rerank_candidates(target_pwd, candidates, num_recommendations=5, weights=(1, 1, 1)):
+    """
+    The num_recommendations best candidates by hybrid similarity, skipping the target
+    itself and repeats. Same ranking as scoring each candidate with
+    calculate_final_similarity and stable-sorting, in one vectorized pass.
+    """
+    unique = [c for c in dict.fromkeys(candidates) if c != target_pwd]
+    scores = batch_final_similarity(target_pwd, unique, weights)
+    return [unique[i] for i in top_k_indices(scores, num_recommendations)]
+
 # ====== Main Similarity Matching Function ======
 
-def recommend_similar_passwords_from_csv(target_password, csv_file, num_recommendations=5, num_hashes=10, seed=42, max_hamming_dist=2):
+def recommend_similar_passwords_from_csv(target_password, csv_file, num_recommendations=5, num_hashes=10, seed=42, max_hamming_dist=None):
     try:
         hash_data = pd.read_csv(csv_file)
         hash_data['Hash'] = hash_data['Hash'].apply(lambda x: ast.literal_eval(x))
@@ -63,11 +325,20 @@ def recommend_similar_passwords_from_csv(target_password, csv_file, num_recommen
         print(f"Error reading CSV file: {e}")
         return []
 
-    # Vectorize and hash the target password
-    vectorizer = CountVectorizer(analyzer='char', ngram_range=(1, 3), max_features=15)
-    lsh = LSH(num_hashes=num_hashes, input_dim=15, seed=seed)
-
-    target_vector = vectorizer.fit_transform([target_password]).toarray()[0]
+    # Vectorize and hash the target password, with the CSV's global vocabulary if it was hashed with one
+    vocab = load_vocabulary(vocabulary_path(csv_file))
+    if vocab is not None:
+        vectorizer = CountVectorizer(analyzer='char', ngram_range=(1, 3), vocabulary=vocab['vocabulary'])
+        lsh = LSH(num_hashes=vocab['num_hashes'], input_dim=len(vocab['vocabulary']), seed=vocab['seed'])
+        target_vector = vectorizer.transform([target_password]).toarray()[0]
+        if max_hamming_dist is None:
+            max_hamming_dist = vocab['max_hamming_dist']
+    else:
+        vectorizer = CountVectorizer(analyzer='char', ngram_range=(1, 3), max_features=15)
+        lsh = LSH(num_hashes=num_hashes, input_dim=15, seed=seed)
+        target_vector = vectorizer.fit_transform([target_password]).toarray()[0]
+    if max_hamming_dist is None:
+        max_hamming_dist = 2
     target_vector = np.pad(target_vector, (0, max(0, lsh.input_dim - len(target_vector))), 'constant')[:lsh.input_dim]
     target_hash = lsh.hash_password(target_vector)
 
@@ -90,9 +361,478 @@ def recommend_similar_passwords_from_csv(target_password, csv_file, num_recommen
     candidates_with_scores.sort(key=lambda x: x[1], reverse=True)
     return [pwd for pwd, _ in candidates_with_scores[:num_recommendations]]
 
+# ====== Preloaded LSH Index ======
+
+INDEX_MAGIC = b"MOPLSH01"
+FEATURE_COLUMNS = ("lengths", "char_masks", "char_counts", "non_ascii", "bigram_masks", "bigram_counts", "duplicate")
+
+
+class SimilarPasswordIndex:
+    """
+    LSH signatures and passwords of a hash dataset held in compact arrays:
+    signatures packed into uint64, passwords as one contiguous UTF-8 blob
+    with an offsets array. Built once, saved to a binary file, loaded
+    memory-mapped and queried many times.
+
+    With a `vocabulary` (password_hash.fit_ngram_vocabulary, stored in the index
+    header) passwords are vectorized against that one global n-gram vocabulary;
+    without it, against a vocabulary fitted on each password alone as in
+    process_password, which only the legacy hash CSVs use.
+
+    `features` holds the FEATURE_COLUMNS precomputed per password (see
+    password_hash.password_features, plus a `duplicate` flag for repeats of an
+    earlier password) so re-ranking can bound most candidates with popcounts.
+    """
+
+    def __init__(self, signatures, password_offsets, password_blob, num_hashes=10, seed=42, input_dim=15, num_bands=1,
+                 features=None, bigram_bits=FEATURE_BIGRAM_BITS, vocabulary=None, max_hamming_dist=None):
+        if num_hashes > 64:
+            raise ValueError("SimilarPasswordIndex supports at most 64 hash bits")
+        self.signatures = signatures
+        self.password_offsets = password_offsets
+        self.password_blob = password_blob
+        self.num_hashes = num_hashes
+        self.seed = seed
+        self.vocabulary = list(vocabulary) if vocabulary is not None else None
+        self.input_dim = len(self.vocabulary) if self.vocabulary is not None else input_dim
+        if max_hamming_dist is None:
+            max_hamming_dist = GLOBAL_MAX_HAMMING_DIST if self.vocabulary is not None else 2
+        self.max_hamming_dist = max_hamming_dist
+        self.num_bands = num_bands
+        self.features = features
+        self.bigram_bits = bigram_bits
+        self._bucket_table = None
+        self._analyzer = None  # the vocabulary vectorizer's n-gram analyzer and its term -> column map
+        self._term_ids = None
+        # Same projection as LSH(num_hashes, input_dim, seed), without touching the global RNG
+        self.projection = np.random.RandomState(seed).randn(num_hashes, self.input_dim)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    # ---------- Construction ----------
+    @classmethod
+    def from_passwords(cls, passwords, hashes, num_hashes=10, seed=42, input_dim=15, with_features=True,
+                       bigram_bits=FEATURE_BIGRAM_BITS, vocabulary=None, max_hamming_dist=None):
+        signatures = np.fromiter((pack_hash(h) for h in hashes), dtype=np.uint64, count=len(hashes))
+        passwords = [str(pwd) for pwd in passwords]
+        encoded = [pwd.encode("utf-8") for pwd in passwords]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        features = None
+        if with_features:
+            features = password_features(passwords, bigram_bits=bigram_bits)
+            first_row = {}
+            features["duplicate"] = np.fromiter((first_row.setdefault(pwd, i) != i for i, pwd in enumerate(passwords)),
+                                                dtype=bool, count=len(passwords))
+        return cls(signatures, offsets, blob, num_hashes=num_hashes, seed=seed, input_dim=input_dim,
+                   features=features, bigram_bits=bigram_bits, vocabulary=vocabulary, max_hamming_dist=max_hamming_dist)
+
+    @classmethod
+    def from_passwords_global(cls, passwords, num_hashes=GLOBAL_NUM_HASHES, seed=42, vocab_size=GLOBAL_VOCAB_SIZE,
+                              vocabulary=None, with_features=True):
+        """Fit a global n-gram vocabulary on the passwords (unless given) and hash them against it."""
+        passwords = [str(pwd) for pwd in passwords]
+        if vocabulary is None:
+            vocabulary = fit_ngram_vocabulary(passwords, size=vocab_size)
+        hashes = hash_passwords(passwords, num_hashes=num_hashes, seed=seed, vocabulary=vocabulary)
+        return cls.from_passwords(passwords, hashes, num_hashes=num_hashes, seed=seed,
+                                  with_features=with_features, vocabulary=vocabulary)
+
+    @classmethod
+    def from_csv(cls, csv_file, num_hashes=None, seed=42, input_dim=15, with_features=True, vectorizer="stored"):
+        """
+        Index a hash CSV with the hashes stored in it: global-vocabulary signatures if
+        it has a vocabulary file next to it, the legacy per-password ones otherwise.
+        vectorizer="global" is the explicit build option to fit a vocabulary on the
+        passwords of a CSV without one and rehash them, ignoring its Hash column.
+        """
+        if vectorizer not in ("stored", "global"):
+            raise ValueError(f"Unknown vectorizer: {vectorizer} (expected 'stored' or 'global')")
+        hash_data = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+        vocab = load_vocabulary(vocabulary_path(csv_file))
+        if vocab is None and vectorizer == "global":
+            print(f"🔁 Rehashing {len(hash_data)} passwords of {csv_file} against a fitted global vocabulary")
+            return cls.from_passwords_global(hash_data['Password'].tolist(), num_hashes=num_hashes or GLOBAL_NUM_HASHES,
+                                             seed=seed, with_features=with_features)
+        hashes = [[int(bit) for bit in h.strip("[]").split(",")] for h in hash_data['Hash']]
+        if vocab is not None:
+            return cls.from_passwords(hash_data['Password'].tolist(), hashes, num_hashes=vocab['num_hashes'],
+                                      seed=vocab['seed'], with_features=with_features, vocabulary=vocab['vocabulary'],
+                                      max_hamming_dist=vocab['max_hamming_dist'])
+        return cls.from_passwords(hash_data['Password'].tolist(), hashes, num_hashes=num_hashes or 10, seed=seed,
+                                  input_dim=input_dim, with_features=with_features)
+
+    @property
+    def vectorizer(self) -> str:
+        return "global" if self.vocabulary is not None else "per_password"
+
+    # ---------- Binary Persistence ----------
+    def _arrays(self):
+        arrays = {
+            "signatures": self.signatures,
+            "password_offsets": self.password_offsets,
+            "password_blob": self.password_blob,
+        }
+        if self.features is not None:
+            arrays.update((name, self.features[name]) for name in FEATURE_COLUMNS)
+        return arrays
+
+    def save(self, index_file):
+        header = {
+            "num_hashes": self.num_hashes,
+            "seed": self.seed,
+            "input_dim": self.input_dim,
+            "bigram_bits": self.bigram_bits,
+            "vocabulary": self.vocabulary,
+            "max_hamming_dist": self.max_hamming_dist,
+            "count": len(self),
+        }
+        # Written aside and renamed, so indexes already memory-mapped from index_file stay intact
+        write_arrays(index_file, INDEX_MAGIC, header, self._arrays())
+
+    @classmethod
+    def load(cls, index_file, mmap=True, num_bands=1):
+        header, arrays = open_arrays(index_file, INDEX_MAGIC, mmap)
+        features = {name: arrays[name] for name in FEATURE_COLUMNS} if set(FEATURE_COLUMNS) <= set(arrays) else None
+        return cls(arrays["signatures"], arrays["password_offsets"], arrays["password_blob"],
+                   num_hashes=header["num_hashes"], seed=header["seed"], input_dim=header["input_dim"],
+                   num_bands=num_bands, features=features, bigram_bits=header.get("bigram_bits", FEATURE_BIGRAM_BITS),
+                   vocabulary=header.get("vocabulary"), max_hamming_dist=header.get("max_hamming_dist"))
+
+    @classmethod
+    def load_or_build(cls, csv_file, index_file=None, num_hashes=None, seed=42, num_bands=1, vectorizer="stored"):
+        index_file = index_file or os.path.splitext(csv_file)[0] + ".idx"
+        vocab_file = vocabulary_path(csv_file)
+        sources = [csv_file] + ([vocab_file] if os.path.exists(vocab_file) else [])
+        if os.path.exists(index_file) and os.path.getmtime(index_file) >= max(map(os.path.getmtime, sources)):
+            index = cls.load(index_file, num_bands=num_bands)
+            expected = "global" if len(sources) > 1 or vectorizer == "global" else "per_password"
+            if (index.vectorizer == expected and num_hashes in (None, index.num_hashes) and index.seed == seed
+                    and index.features is not None):
+                return index
+        index = cls.from_csv(csv_file, num_hashes=num_hashes, seed=seed, vectorizer=vectorizer)
+        index.save(index_file)
+        index.num_bands = num_bands
+        return index
+
+    # ---------- Query ----------
+    def password(self, i) -> str:
+        start, end = int(self.password_offsets[i]), int(self.password_offsets[i + 1])
+        return self.password_blob[start:end].tobytes().decode("utf-8")
+
+    def passwords(self, ids) -> list:
+        """Decode many passwords at once: gather their bytes newline-separated and split."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return []
+        starts = self.password_offsets[ids].astype(np.int64)
+        sizes = self.password_offsets[ids + 1].astype(np.int64) - starts
+        out_starts = np.cumsum(sizes + 1) - (sizes + 1)
+        source = np.repeat(starts - out_starts, sizes + 1) + np.arange(int(out_starts[-1] + sizes[-1] + 1))
+        separators = out_starts + sizes
+        source[separators] = 0
+        gathered = np.asarray(self.password_blob)[source] if len(self.password_blob) else np.zeros(len(source), dtype=np.uint8)
+        gathered[separators] = ord("\n")
+        decoded = gathered.tobytes().decode("utf-8").split("\n")[:-1]
+        if len(decoded) != len(ids):  # a password contains a newline
+            return [self.password(i) for i in ids]
+        return decoded
+
+    def hash_password(self, password) -> int:
+        if self.vocabulary is not None:
+            if self._analyzer is None:
+                self._term_ids = {term: i for i, term in enumerate(self.vocabulary)}
+                self._analyzer = vocabulary_vectorizer(self.vocabulary).build_analyzer()
+            # Same counts as vocabulary_vectors([password]) without building a sparse matrix per query
+            vector = np.zeros((1, self.input_dim), dtype=np.int64)
+            for term in self._analyzer(password):
+                i = self._term_ids.get(term)
+                if i is not None:
+                    vector[0, i] += 1
+        else:
+            vector = password_vector(password, self.input_dim)[None, :]
+        bits = hash_vectors(vector, self.projection)[0]
+        return pack_hash(bits)
+
+    @property
+    def bucket_table(self) -> LSHBucketTable:
+        if self._bucket_table is None:
+            self._bucket_table = LSHBucketTable(self.signatures, self.num_hashes, num_bands=self.num_bands)
+        return self._bucket_table
+
+    def get_candidates(self, target_signature, max_hamming_dist=None, probe_radius=None) -> np.ndarray:
+        if max_hamming_dist is None:
+            max_hamming_dist = self.max_hamming_dist
+        return self.bucket_table.query(target_signature, max_hamming_dist=max_hamming_dist, probe_radius=probe_radius)
+
+    def get_candidates_linear(self, target_signature, max_hamming_dist=None) -> np.ndarray:
+        if max_hamming_dist is None:
+            max_hamming_dist = self.max_hamming_dist
+        distances = _popcount64(self.signatures ^ np.uint64(target_signature))
+        return np.flatnonzero(distances <= max_hamming_dist)
+
+    def recommend(self, target_password, num_recommendations=5, max_hamming_dist=None, weights=(1, 1, 1)):
+        target_signature = self.hash_password(target_password)
+        candidate_ids = self.get_candidates(target_signature, max_hamming_dist=max_hamming_dist)
+        if len(candidate_ids) == 0:
+            print("⚠️ No similar candidates found.")
+            return []
+
+        return self.rerank(target_password, candidate_ids, num_recommendations=num_recommendations, weights=weights)
+
+    def rerank(self, target_password, candidate_ids, num_recommendations=5, weights=(1, 1, 1)):
+        """
+        Same result as rerank_candidates over the passwords at the ascending
+        candidate_ids, using the stored features. Levenshtein and character
+        Jaccard come exactly from the features and one bulk distance call. The
+        hashed bigram bitsets give an upper bound on the bigram Jaccard.
+        Candidates are then scored exactly in two small rounds: the best
+        bounds first, to set a threshold, then every candidate whose bound
+        still reaches it.
+        """
+        if self.features is None or min(weights) < 0 or num_recommendations <= 0:
+            return rerank_candidates(target_password, self.passwords(candidate_ids),
+                                     num_recommendations=num_recommendations, weights=weights)
+        features = self.features
+        ids = np.asarray(candidate_ids, dtype=np.int64)
+        # Repeats of a password share its signature, so its first occurrence is in the same pool
+        ids = ids[~np.asarray(features["duplicate"])[ids]]
+        candidates = self.passwords(ids)
+        dist = _levenshtein_distances(target_password, candidates)
+        not_target = dist > 0
+        if not not_target.all():
+            ids, dist = ids[not_target], dist[not_target]
+            candidates = [c for c, keep in zip(candidates, not_target) if keep]
+        if not candidates:
+            return []
+
+        target = password_features([target_password], bigram_bits=self.bigram_bits)
+        lengths = features["lengths"][ids].astype(np.int64)
+        max_len = np.maximum(lengths, len(target_password))
+        s1 = np.where(max_len > 0, 1 - dist / np.maximum(max_len, 1), 0)
+
+        # Exact for ASCII-only candidates: they cannot share the target's other characters
+        shared = _popcount64(features["char_masks"][ids] & target["char_masks"][0]).sum(axis=1).astype(np.int64)
+        union = features["char_counts"][ids].astype(np.int64) + int(target["char_counts"][0]) - shared
+        s2 = shared / np.maximum(union, 1)
+
+        # Upper bound: a shared bigram sets a shared bit, and bits several target bigrams hash to count for all of them
+        target_codes, target_len = flat_code_points([target_password])
+        target_bigrams = np.unique(code_point_bigrams(target_codes, target_len)[0])
+        multiplicity = np.bincount(hashed_bigram_bits(target_bigrams, self.bigram_bits), minlength=self.bigram_bits)
+        hits = features["bigram_masks"][ids] & target["bigram_masks"][0]
+        shared = _popcount64(hits).sum(axis=1).astype(np.int64)
+        for bit in np.flatnonzero(multiplicity > 1):
+            shared += (multiplicity[bit] - 1) * ((hits[:, bit // 64] >> np.uint64(bit % 64)) & np.uint64(1)).astype(np.int64)
+        counts = features["bigram_counts"][ids].astype(np.int64)
+        shared = np.minimum(shared, np.minimum(counts, len(target_bigrams)))
+        union = counts + len(target_bigrams) - shared
+        s3_bound = np.where(union > 0, shared / np.maximum(union, 1), 0)
+
+        bound = weights[0] * s1 + weights[1] * s2 + weights[2] * s3_bound
+        bound[np.asarray(features["non_ascii"])[ids]] = np.inf
+
+        k = num_recommendations
+        probe = top_k_indices(bound, min(len(candidates), max(4 * k, 64)))
+        probe_scores = batch_final_similarity(target_password, [candidates[i] for i in probe], weights)
+        threshold = np.partition(probe_scores, len(probe) - k)[len(probe) - k] if len(probe) >= k else -np.inf
+        refine = np.flatnonzero(bound >= threshold)
+        scores = batch_final_similarity(target_password, [candidates[i] for i in refine], weights)
+        return [candidates[refine[i]] for i in top_k_indices(scores, k)]
+
+
+_INDEX_CACHE = {}
+_INDEX_LOCK = threading.Lock()
+
+def load_similar_password_index(csv_file, num_hashes=None, seed=42, vectorizer="stored",
+                                index_file=None) -> SimilarPasswordIndex:
+    """
+    Return the process-wide index for a hash CSV, loading it on first use from
+    index_file (by default next to the CSV), which is built if missing or stale.
+    Thread-safe: concurrent first calls wait for a single load/build.
+    """
+    key = (os.path.abspath(csv_file), num_hashes, seed, vectorizer)
+    with _INDEX_LOCK:
+        if key not in _INDEX_CACHE:
+            _INDEX_CACHE[key] = SimilarPasswordIndex.load_or_build(csv_file, index_file=index_file,
+                                                                   num_hashes=num_hashes, seed=seed,
+                                                                   vectorizer=vectorizer)
+        return _INDEX_CACHE[key]
+
+def clear_index_cache():
+    """Forget the indexes load_similar_password_index has loaded; the next call loads them again."""
+    with _INDEX_LOCK:
+        _INDEX_CACHE.clear()
+
+# ====== Benchmark ======
+
+def benchmark_index(csv_file, queries=("password123", "abc123", "lb1990401", "QwErTy!123"), repeats=200):
+    index_file = os.path.splitext(csv_file)[0] + ".bench.idx"
+
+    start = time.perf_counter()
+    legacy_results = [recommend_similar_passwords_from_csv(q, csv_file, num_recommendations=10) for q in queries]
+    legacy_per_query = (time.perf_counter() - start) / len(queries)
+
+    start = time.perf_counter()
+    SimilarPasswordIndex.from_csv(csv_file).save(index_file)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = SimilarPasswordIndex.load(index_file)
+    load_time = time.perf_counter() - start
+
+    index_results = [index.recommend(q, num_recommendations=10) for q in queries]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for q in queries:
+            index.recommend(q, num_recommendations=10)
+    index_per_query = (time.perf_counter() - start) / (repeats * len(queries))
+
+    signatures = [index.hash_password(q) for q in queries]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for sig in signatures:
+            index.get_candidates(sig)
+    lookup_per_query = (time.perf_counter() - start) / (repeats * len(queries))
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for sig in signatures:
+            index.get_candidates_linear(sig)
+    linear_lookup_per_query = (time.perf_counter() - start) / (repeats * len(queries))
+    same_candidates = all(np.array_equal(index.get_candidates(sig), index.get_candidates_linear(sig)) for sig in signatures)
+
+    report = {
+        "entries": len(index),
+        "index_bytes": os.path.getsize(index_file),
+        "build_s": build_time,
+        "load_s": load_time,
+        "legacy_query_ms": legacy_per_query * 1e3,
+        "index_query_ms": index_per_query * 1e3,
+        "bucket_lookup_us": lookup_per_query * 1e6,
+        "linear_lookup_us": linear_lookup_per_query * 1e6,
+        "same_candidates": same_candidates,
+        "speedup": legacy_per_query / index_per_query,
+        "identical_results": legacy_results == index_results,
+    }
+    os.remove(index_file)
+
+    print("📊 SimilarPasswordIndex benchmark:")
+    for k, v in report.items():
+        print(f"  {k}: {v:.4f}" if isinstance(v, float) else f"  {k}: {v}")
+    return report
+
+def benchmark_rerank(csv_file, queries=("password123", "abc123", "lb1990401", "QwErTy!123"), max_hamming_dist=4, repeats=5):
+    """
+    Per-candidate scoring loop vs the fused re-ranker vs re-ranking from the stored
+    features, on the large pools a wide Hamming radius returns; plus the on-disk
+    cost of the features.
+    """
+    index = SimilarPasswordIndex.from_csv(csv_file)
+    plain = SimilarPasswordIndex(index.signatures, index.password_offsets, index.password_blob,
+                                 num_hashes=index.num_hashes, seed=index.seed, input_dim=index.input_dim)
+    id_pools = [index.get_candidates(index.hash_password(q), max_hamming_dist=max_hamming_dist) for q in queries]
+    pools = [index.passwords(ids) for ids in id_pools]
+
+    def loop_rerank(target, candidates, k):
+        scored, seen = [], set()
+        for cand in candidates:
+            if cand == target or cand in seen:
+                continue
+            scored.append((cand, calculate_final_similarity(target, cand, (1, 1, 1))))
+            seen.add(cand)
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return [pwd for pwd, _ in scored[:k]]
+
+    variants = {
+        "loop": lambda q, ids, pool: loop_rerank(q, pool, 10),
+        "fused": lambda q, ids, pool: rerank_candidates(q, plain.passwords(ids), 10),
+        "features": lambda q, ids, pool: index.rerank(q, ids, 10),
+    }
+    timings = {}
+    for name, rerank in variants.items():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            results = [rerank(q, ids, pool) for q, ids, pool in zip(queries, id_pools, pools)]
+        timings[name] = ((time.perf_counter() - start) / (repeats * len(queries)), results)
+
+    work_dir = tempfile.mkdtemp(prefix="mop_rerank_bench_")
+    try:
+        sizes = {}
+        for name, idx in (("plain", plain), ("features", index)):
+            path = os.path.join(work_dir, name + ".idx")
+            idx.save(path)
+            sizes[name] = os.path.getsize(path)
+    finally:
+        shutil.rmtree(work_dir)
+
+    report = {
+        "mean_candidates": float(np.mean([len(pool) for pool in pools])),
+        "loop_rerank_ms": timings["loop"][0] * 1e3,
+        "fused_rerank_ms": timings["fused"][0] * 1e3,
+        "features_rerank_ms": timings["features"][0] * 1e3,
+        "fused_speedup": timings["loop"][0] / timings["fused"][0],
+        "features_speedup": timings["loop"][0] / timings["features"][0],
+        "features_vs_fused": timings["fused"][0] / timings["features"][0],
+        "bulk_levenshtein": "rapidfuzz" if _rf_cdist is not None else "python-Levenshtein",
+        "index_bytes": sizes["plain"],
+        "index_with_features_bytes": sizes["features"],
+        "feature_bytes_per_password": (sizes["features"] - sizes["plain"]) / len(index),
+        "identical_results": timings["loop"][1] == timings["fused"][1] == timings["features"][1],
+    }
+    print("📊 Re-ranking benchmark:")
+    for k, v in report.items():
+        print(f"  {k}: {v:.4f}" if isinstance(v, float) else f"  {k}: {v}")
+    return report
+
+def benchmark_vectorizer(csv_file, num_queries=150, k=10, seed=0):
+    """
+    Per-password-fitted vs global-vocabulary LSH signatures: mean candidate-set size,
+    recall@k against the exact top-k over the whole corpus, and query time. Queries
+    are passwords sampled from the corpus.
+    """
+    indexes = {
+        "per_password": SimilarPasswordIndex.from_csv(csv_file),
+        "global": SimilarPasswordIndex.from_csv(csv_file, vectorizer="global"),
+    }
+    corpus_ids = np.arange(len(indexes["global"]))
+    rng = np.random.RandomState(seed)
+    queries = indexes["global"].passwords(rng.choice(corpus_ids, size=min(num_queries, len(corpus_ids)), replace=False))
+    truth = [set(indexes["global"].rerank(q, corpus_ids, k)) for q in queries]
+
+    report = {"queries": len(queries)}
+    for name, index in indexes.items():
+        sizes, recalls = [], []
+        start = time.perf_counter()
+        for q, expected in zip(queries, truth):
+            ids = index.get_candidates(index.hash_password(q))
+            sizes.append(len(ids))
+            recalls.append(len(set(index.rerank(q, ids, k)) & expected) / max(len(expected), 1))
+        elapsed = time.perf_counter() - start
+        report[f"{name}_bits"] = index.num_hashes
+        report[f"{name}_max_hamming_dist"] = index.max_hamming_dist
+        report[f"{name}_mean_candidates"] = float(np.mean(sizes))
+        report[f"{name}_recall_at_{k}"] = float(np.mean(recalls))
+        report[f"{name}_query_ms"] = elapsed / len(queries) * 1e3
+    report["candidate_reduction"] = report["per_password_mean_candidates"] / max(report["global_mean_candidates"], 1e-9)
+
+    print("📊 LSH vectorizer benchmark:")
+    for key, v in report.items():
+        print(f"  {key}: {v:.4f}" if isinstance(v, float) else f"  {key}: {v}")
+    return report
+
 # ====== Example Usage ======
 if __name__ == "__main__":
     target = 'password123'
     dataset = 'benchmark_dataset_hash.csv'
     top_similar = recommend_similar_passwords_from_csv(target, dataset, num_recommendations=5)
     print("Top similar passwords:", top_similar)
+
+    if "--benchmark" in sys.argv:
+        benchmark_index(dataset)
+    if "--benchmark-rerank" in sys.argv:
+        benchmark_rerank(dataset)
+    if "--benchmark-vectorizer" in sys.argv:
+        benchmark_vectorizer(dataset)
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+from compiled_router import CompiledTreeModel
+
+lgb = pytest.importorskip("lightgbm")
+
+BATCH_SIZES = [1, 2, 3, 4, 5, 64, 3000]
+
+
+def _data(rows, nan_share, seed):
+    rng = np.random.RandomState(seed)
+    X = rng.normal(size=(rows, 6))
+    X[:, 5] = rng.randint(0, 4, rows)  # repeated values put rows exactly on thresholds
+    X[rng.rand(rows, 6) < nan_share] = np.nan
+    y = (X[:, 0] > 0).astype(int) + (np.nan_to_num(X[:, 1]) > 0.5).astype(int) + (X[:, 5] == 3)
+    return X, y
+
+
+def _train(params, X, y):
+    params = dict(params, num_leaves=15, min_data_in_leaf=5, verbose=-1, seed=0, deterministic=True)
+    booster = lgb.train(params, lgb.Dataset(X, y), num_boost_round=20)
+    return booster, CompiledTreeModel.from_string(booster.model_to_string())
+
+
+def _assert_matches(booster, compiled, X):
+    for n in BATCH_SIZES:
+        for rows in (X[:n], X[-n:]):
+            assert np.abs(compiled.predict(rows) - booster.predict(rows)).max() <= 1e-9
+
+
+@pytest.mark.parametrize("params", [
+    {"objective": "multiclass", "num_class": 4},
+    {"objective": "binary"},
+    {"objective": "regression"},
+], ids=lambda p: p["objective"])
+@pytest.mark.parametrize("nan_share", [0.0, 0.1])  # with NaNs in training the trees route missing values
+def test_compiled_matches_booster(params, nan_share):
+    X, y = _data(3000, nan_share, 0)
+    if params["objective"] == "binary":
+        y = (y > 1).astype(int)
+    booster, compiled = _train(params, X, y)
+    assert compiled._bitvector == (nan_share == 0.0)
+    X_test, _ = _data(3000, 0.05, 1)  # NaNs at prediction time go to 0.0 or the default side
+    _assert_matches(booster, compiled, X_test)
+
+
+def test_compiled_matches_bundled_router_model():
+    model_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "router_model.txt")
+    if not os.path.exists(model_path):
+        pytest.skip("router_model.txt is not available")
+    booster = lgb.Booster(model_file=model_path)
+    compiled = CompiledTreeModel.from_file(model_path)
+    rng = np.random.RandomState(2)
+    X = rng.uniform(0, 1, (3000, booster.num_feature()))
+    X[:, 5] = rng.randint(0, 12, len(X))  # max_digit_run_length is an integer feature
+    X[rng.rand(len(X)) < 0.01, -1] = np.nan
+    _assert_matches(booster, compiled, X)
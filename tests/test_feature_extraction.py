@@ -0,0 +1,29 @@
+import random
+
+import numpy as np
+import pytest
+
+from feature_extraction import PasswordStructuralFeatures, STRUCTURAL_FEATURE_NAMES
+
+
+def _pool(alphabet, min_len, max_len, size, seed):
+    rnd = random.Random(seed)
+    return ["".join(rnd.choice(alphabet) for _ in range(rnd.randint(min_len, max_len))) for _ in range(size)]
+
+
+SAMPLE = (_pool("abcAB123!@ ", 0, 20, 400, 0)
+          + _pool("aé中文😀ßΩ1٣２", 0, 12, 200, 1)  # non-ASCII digits and letters take the extract() path
+          + _pool("12", 1, 40, 50, 2)
+          + ["", "a", "qwerty123", "QWERTY", "19900101", "13812345678", "lily1990-01-01", "aaaa", "abab", "abcabc"])
+
+
+@pytest.mark.parametrize("chunk_size", [4096, 7])  # a small chunk_size mixes lengths across chunks
+def test_extract_batch_matches_extract(chunk_size):
+    extractor = PasswordStructuralFeatures()
+    pw = random.Random(3).sample(SAMPLE, len(SAMPLE))
+    expected = np.vstack([[extractor.extract(p)[name] for name in STRUCTURAL_FEATURE_NAMES] for p in pw])
+    np.testing.assert_array_equal(extractor.extract_batch(pw, chunk_size=chunk_size), expected)
+
+
+def test_extract_batch_empty():
+    assert PasswordStructuralFeatures().extract_batch([]).shape == (0, len(STRUCTURAL_FEATURE_NAMES))
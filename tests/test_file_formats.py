@@ -0,0 +1,49 @@
+import threading
+
+import numpy as np
+import pytest
+
+from file_formats import read_records, write_arrays, open_arrays
+
+MAGIC = b"TESTARR1"
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_write_open_arrays_round_trip(tmp_path, mmap):
+    path = str(tmp_path / "arrays.bin")
+    arrays = {"a": np.arange(10, dtype=np.int64), "b": np.ones((3, 16), dtype=np.uint8), "empty": np.zeros(0)}
+    write_arrays(path, MAGIC, {"count": 10}, arrays)
+    header, loaded = open_arrays(path, MAGIC, mmap)
+    assert header["count"] == 10
+    for name, arr in arrays.items():
+        np.testing.assert_array_equal(loaded[name], arr)
+    with pytest.raises(ValueError):
+        open_arrays(path, b"OTHERMAG")
+
+
+def test_concurrent_writers_do_not_share_a_temp_file(tmp_path):
+    path = str(tmp_path / "arrays.bin")
+    start = threading.Barrier(8)
+
+    def write(i):
+        start.wait()
+        for _ in range(20):
+            write_arrays(path, MAGIC, {"writer": i}, {"values": np.full(50_000, i, dtype=np.int64)})
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    header, arrays = open_arrays(path, MAGIC, mmap=False)
+    assert (arrays["values"] == header["writer"]).all()
+    assert [p.name for p in tmp_path.iterdir()] == ["arrays.bin"]
+
+
+def test_read_records(tmp_path):
+    (tmp_path / "a.jsonl").write_text('{"x": 1}\n\n{"x": 2}\n', encoding="utf-8")
+    (tmp_path / "b.json").write_text('[{"x": 1}]', encoding="utf-8")
+    (tmp_path / "c.json").write_text('{"x": 3}', encoding="utf-8")
+    assert read_records(str(tmp_path / "a.jsonl")) == [{"x": 1}, {"x": 2}]
+    assert read_records(str(tmp_path / "b.json")) == [{"x": 1}]
+    assert read_records(str(tmp_path / "c.json")) == [{"x": 3}]
@@ -0,0 +1,97 @@
+import json
+
+import numpy as np
+import pytest
+
+import global_shuffle
+from global_shuffle import HoneywordTable, unlinkability_report
+
+pytest.importorskip("scipy")
+
+P_THRESHOLD = 0.01
+
+
+def test_incremental_changes_stay_uniform():
+    report = unlinkability_report(trials=4000, seed=0)
+    assert report["new_user_positions_p"] > P_THRESHOLD
+    assert report["real_rank_p"] > P_THRESHOLD
+    assert report["permutation_p"] > P_THRESHOLD
+
+
+class _NoSwapRng:
+    def integers(self, low, high):
+        return high - 1
+
+
+class _AppendOnlyTable(HoneywordTable):
+    """Appends without the Fisher-Yates swap, i.e. the bias the report must catch."""
+
+    def __init__(self, seed=None, capacity: int = 1024):
+        super().__init__(seed, capacity)
+        self.rng = _NoSwapRng()
+
+
+def test_report_detects_append_only_placement(monkeypatch):
+    monkeypatch.setattr(global_shuffle, "HoneywordTable", _AppendOnlyTable)
+    report = unlinkability_report(trials=500, seed=0)
+    assert report["new_user_positions_p"] < 1e-6
+    assert report["real_rank_p"] < 1e-6
+    assert report["permutation_p"] < 1e-6
+
+
+def _check_consistent(table):
+    for user_id, positions in table.positions.items():
+        assert table.checker[user_id] == positions[0]
+        for slot, pos in enumerate(positions):
+            assert table.owner[pos] == user_id and table.slot[pos] == slot
+    assert sum(len(p) for p in table.positions.values()) == len(table)
+
+
+def test_changes_report_every_rewritten_position():
+    table = HoneywordTable(seed=1)
+    for user in range(20):
+        table.enroll(user, f"pw{user}", [f"hw{user}-{i}" for i in range(user % 4)])
+    for change in (lambda: table.remove(7),
+                   lambda: table.update(3, "new3", ["x", "y", "z"]),
+                   lambda: table.enroll(42, "pw42", ["a", "b"])):
+        before = table.digests[:len(table)].copy()
+        touched = change()
+        size = min(len(before), len(table))
+        changed = np.flatnonzero((before[:size] != table.digests[:size]).any(axis=1))
+        assert set(changed.tolist()) <= touched
+        assert all(pos < len(table) for pos in touched)
+        _check_consistent(table)
+
+
+@pytest.mark.parametrize("table_name", ["table.json", "table.jsonl", "table.bin"])
+def test_save_load_round_trip(tmp_path, table_name):
+    table = HoneywordTable(seed=2)
+    for user in range(10):
+        table.enroll(user, f"pw{user}", [f"hw{user}a", f"hw{user}b"])
+    table.remove(4)
+    paths = [str(tmp_path / table_name), str(tmp_path / "checker.json"), str(tmp_path / "users.jsonl"),
+             str(tmp_path / "positions.jsonl")]
+    table.save(*paths)
+    with open(paths[2], "r", encoding="utf-8") as f:
+        assert all(set(json.loads(line)) == {"user_id", "salt"} for line in f)
+
+    loaded = HoneywordTable.load(*paths)
+    assert len(loaded) == len(table)
+    assert (loaded.digests[:len(loaded)] == table.digests[:len(table)]).all()
+    assert loaded.checker == table.checker
+    assert {u: sorted(p) for u, p in loaded.positions.items()} == {u: sorted(p) for u, p in table.positions.items()}
+    _check_consistent(loaded)
+
+
+def test_honeychecker_rejects_unsupported_salts():
+    from honeychecker import HoneyChecker
+
+    table = HoneywordTable(seed=3)
+    table.enroll(0, "pw0", ["hw0"])
+    table.enroll(1, "pw1", ["hw1"])
+    checker = HoneyChecker.from_table(table)
+    assert checker.check(0, "pw0") == "real" and checker.check(1, "hw1") == "honeyword"
+    for bad in ("abc", table.salts[1].upper(), table.salts[1] + "00"):
+        table.salts[1] = bad
+        with pytest.raises(ValueError, match="user 1"):
+            HoneyChecker.from_table(table)
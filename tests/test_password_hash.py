@@ -0,0 +1,83 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from password_hash import (process_password, hash_passwords, fit_ngram_vocabulary, preprocess_hashes_parallel,
+                           format_hash)
+
+NUM_HASHES = 10
+
+
+def _pool(alphabet, min_len, max_len, size, seed):
+    rnd = random.Random(seed)
+    return ["".join(rnd.choice(alphabet) for _ in range(rnd.randint(min_len, max_len))) for _ in range(size)]
+
+
+# process_password strips, so every sample starts and ends with a non-space character
+CORPUS = [pw for pw in (_pool("abc123!A", 1, 24, 300, 0)  # long rows keep the top 15 n-grams, with ties
+                        + _pool("aé中文😀ßΩİ1́", 1, 10, 300, 1)
+                        + _pool("ab1é", 1, 2, 100, 2)
+                        + _pool("ab  \tC", 1, 8, 100, 3))
+          if pw.strip() == pw]
+
+
+def reference_hashes(passwords, vocabulary=None):
+    hashed_results = []
+    for pwd in passwords:
+        process_password(pwd, hashed_results, NUM_HASHES, 42, vocabulary=vocabulary)
+    assert [pwd for pwd, _ in hashed_results] == passwords
+    return np.array([bits for _, bits in hashed_results], dtype=np.uint8)
+
+
+@pytest.mark.parametrize("use_vocabulary", [False, True])
+def test_hash_passwords_matches_process_password(use_vocabulary):
+    vocabulary = fit_ngram_vocabulary(CORPUS) if use_vocabulary else None
+    expected = reference_hashes(CORPUS, vocabulary)
+    bits = hash_passwords(CORPUS, num_hashes=NUM_HASHES, seed=42, vocabulary=vocabulary)
+    np.testing.assert_array_equal(bits, expected)
+
+
+def test_hash_passwords_empty():
+    assert hash_passwords([], num_hashes=NUM_HASHES).shape == (0, NUM_HASHES)
+
+
+def test_parallel_build_matches_process_password(tmp_path):
+    csv_file = str(tmp_path / "passwords.csv")
+    output_file = str(tmp_path / "hashes.csv")
+    pd.DataFrame({"Password": CORPUS}).to_csv(csv_file, index=False)
+
+    preprocess_hashes_parallel(csv_file, output_file, num_hashes=NUM_HASHES, num_workers=2, shard_bytes=1024,
+                               chunksize=50)
+
+    written = pd.read_csv(output_file, dtype=str, keep_default_na=False)
+    assert written["Password"].tolist() == CORPUS
+    assert written["Hash"].tolist() == [format_hash(bits) for bits in reference_hashes(CORPUS)]
+
+
+@pytest.mark.parametrize("keep_shards", [False, True])
+def test_parallel_build_leaves_caller_work_dir_alone(tmp_path, keep_shards):
+    csv_file = str(tmp_path / "passwords.csv")
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    (work_dir / "notes.txt").write_text("not ours")
+    (work_dir / "shard_00099.csv.tmp").write_text("left by a killed run")
+    pd.DataFrame({"Password": CORPUS[:50]}).to_csv(csv_file, index=False)
+
+    preprocess_hashes_parallel(csv_file, str(tmp_path / "hashes.csv"), num_hashes=NUM_HASHES, num_workers=1,
+                               work_dir=str(work_dir), keep_shards=keep_shards)
+
+    left = sorted(p.name for p in work_dir.iterdir())
+    if keep_shards:
+        assert "notes.txt" in left and "manifest.json" in left
+    else:
+        assert left == ["notes.txt"]
+
+
+def test_parallel_build_removes_default_work_dir(tmp_path):
+    csv_file = str(tmp_path / "passwords.csv")
+    output_file = str(tmp_path / "hashes.csv")
+    pd.DataFrame({"Password": CORPUS[:50]}).to_csv(csv_file, index=False)
+    preprocess_hashes_parallel(csv_file, output_file, num_hashes=NUM_HASHES, num_workers=1)
+    assert not (tmp_path / "hashes.csv.shards").exists()
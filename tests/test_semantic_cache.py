@@ -0,0 +1,50 @@
+import json
+import sqlite3
+
+import pytest
+
+import semantic_cache
+from semantic_cache import SemanticCache, cache_record
+
+
+@pytest.fixture(autouse=True)
+def _no_salt_env(monkeypatch):
+    monkeypatch.delenv(semantic_cache.SALT_ENV_VAR, raising=False)
+    monkeypatch.delenv(semantic_cache.KEY_FILE_ENV_VAR, raising=False)
+
+
+def _raw(path):
+    with sqlite3.connect(path) as conn:
+        return (conn.execute("SELECT key, value FROM meta").fetchall(),
+                [json.loads(v) for (v,) in conn.execute("SELECT value FROM entries")])
+
+
+def test_stores_only_probability_and_categories(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SemanticCache(path)
+    cache.set("lily1990", {"Reason": "Contains the name 'lily' and a birthday 1990", "Probability": 0.9})
+    assert cache.get("lily1990") == {"Probability": 0.9, "Categories": ["name", "birthday"]}
+
+    meta, values = _raw(path)
+    assert meta == []
+    assert values == [{"Probability": 0.9, "Categories": ["name", "birthday"]}]
+    assert "lily" not in open(path, "rb").read().decode("latin-1")
+    # The salt lives in the key file, so a second opener derives the same keys
+    assert SemanticCache(path).get("lily1990") is not None
+    assert (tmp_path / "cache.sqlite3.key").exists()
+
+
+def test_migrates_legacy_database(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SemanticCache(path, salt="legacy-salt")
+    record = {"Reason": "Looks like the email bob@example.com", "Probability": 0.8}
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO meta (key, value) VALUES ('salt', 'legacy-salt')")
+        conn.execute("INSERT INTO entries VALUES (?, ?, 0, 0)", (cache.key("bob@example.com"), json.dumps(record)))
+    cache._conn().close()
+
+    migrated = SemanticCache(path)
+    assert migrated.get("bob@example.com") == cache_record(record) == {"Probability": 0.8, "Categories": ["email"]}
+    meta, values = _raw(path)
+    assert meta == [] and values == [cache_record(record)]
+    assert (tmp_path / "cache.sqlite3.key").read_text() == "legacy-salt"
@@ -0,0 +1,129 @@
+import random
+
+import numpy as np
+import pytest
+
+from similar_password_finder import (calculate_final_similarity, levenshtein_similarity, jaccard_similarity,
+                                     batch_final_similarity, top_k_indices, rerank_candidates)
+
+WEIGHTS = [(1, 1, 1), (0.5, 0.3, 0.2), (1, 0, 0), (0, 0, 1)]
+
+
+def _pool(alphabet, min_len, max_len, size, seed):
+    rnd = random.Random(seed)
+    return ["".join(rnd.choice(alphabet) for _ in range(rnd.randint(min_len, max_len))) for _ in range(size)]
+
+
+POOLS = {
+    "ascii": _pool("abc123!A", 0, 12, 400, 0),
+    "non_ascii": _pool("aé中文😀ßΩ1́", 0, 8, 400, 1),
+    "short": _pool("ab1é", 0, 2, 200, 2),
+    "mixed": _pool("ab1é", 0, 2, 100, 3) + _pool("abc123!A中😀", 3, 10, 300, 4),
+}
+
+
+def reference_similarity(target, candidate, weights):
+    """calculate_final_similarity, except the undefined bigram Jaccard of two passwords shorter than 2 scores 0."""
+    if len(target) < 2 and len(candidate) < 2:
+        return (weights[0] * levenshtein_similarity(target, candidate)
+                + weights[1] * jaccard_similarity(target, candidate) + weights[2] * 0)
+    return calculate_final_similarity(target, candidate, weights)
+
+
+def reference_rerank(target, candidates, k, weights):
+    scored = [(c, reference_similarity(target, c, weights)) for c in dict.fromkeys(candidates) if c != target]
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return [c for c, _ in scored[:k]]
+
+
+def _targets(pool, seed):
+    rnd = random.Random(seed)
+    return rnd.sample(pool, 5) + ["a", "é", "ab", "abc123", "中文😀"]
+
+
+@pytest.mark.parametrize("pool_name", sorted(POOLS))
+@pytest.mark.parametrize("weights", WEIGHTS)
+def test_batch_final_similarity_is_bit_identical(pool_name, weights):
+    pool = POOLS[pool_name]
+    for target in _targets(pool, 10):
+        candidates = [c for c in pool if c or target]  # Jaccard of two empty strings is undefined
+        expected = np.array([reference_similarity(target, c, weights) for c in candidates])
+        assert np.array_equal(batch_final_similarity(target, candidates, weights), expected)
+
+
+def test_batch_final_similarity_empty():
+    assert len(batch_final_similarity("abc", [], (1, 1, 1))) == 0
+
+
+@pytest.mark.parametrize("k", [0, 1, 5, 199, 200, 250])
+def test_top_k_indices_matches_stable_sort(k):
+    scores = np.random.default_rng(k).integers(0, 5, 200).astype(np.float64)  # many ties
+    assert top_k_indices(scores, k).tolist() == np.argsort(-scores, kind="stable")[:k].tolist()
+
+
+@pytest.mark.parametrize("pool_name", sorted(POOLS))
+@pytest.mark.parametrize("weights", WEIGHTS)
+@pytest.mark.parametrize("k", [1, 5, 50])
+def test_rerank_candidates_matches_loop(pool_name, weights, k):
+    pool = POOLS[pool_name]
+    for target in _targets(pool, 11):
+        assert rerank_candidates(target, pool, k, weights) == reference_rerank(target, pool, k, weights)
+
+
+def _index(passwords, bigram_bits):
+    from password_hash import fit_ngram_vocabulary, hash_passwords, GLOBAL_NUM_HASHES
+    from similar_password_finder import SimilarPasswordIndex
+
+    vocabulary = fit_ngram_vocabulary(passwords)
+    hashes = hash_passwords(passwords, num_hashes=GLOBAL_NUM_HASHES, vocabulary=vocabulary)
+    return SimilarPasswordIndex.from_passwords(passwords, hashes, num_hashes=GLOBAL_NUM_HASHES,
+                                               bigram_bits=bigram_bits, vocabulary=vocabulary)
+
+
+@pytest.mark.parametrize("pool_name", sorted(POOLS))
+@pytest.mark.parametrize("bigram_bits", [64, 256])  # 64 bits forces bigram hash collisions in the bound
+@pytest.mark.parametrize("k", [1, 5, 50])
+def test_index_rerank_matches_loop(pool_name, bigram_bits, k):
+    pool = POOLS[pool_name]
+    index = _index(pool, bigram_bits)
+    for weights in WEIGHTS + [(1, -1, 1)]:  # a negative weight takes the unbounded path
+        for target in _targets(pool, 12):
+            pools = [np.arange(len(index)), index.get_candidates(index.hash_password(target), max_hamming_dist=6)]
+            for ids in pools:
+                expected = reference_rerank(target, index.passwords(ids), k, weights)
+                assert index.rerank(target, ids, k, weights) == expected
+
+
+def test_index_rerank_on_bundled_dataset():
+    import os
+    import pandas as pd
+
+    csv_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmark_dataset.csv")
+    if not os.path.exists(csv_file):
+        pytest.skip("benchmark_dataset.csv is not available")
+    passwords = pd.read_csv(csv_file, dtype=str, keep_default_na=False)["Password"].tolist()[:5000]
+    index = _index(passwords, 256)
+    for target in random.Random(13).sample(passwords, 30) + ["password123", "lb1990401"]:
+        ids = index.get_candidates(index.hash_password(target))
+        assert index.rerank(target, ids, 10) == reference_rerank(target, index.passwords(ids), 10, (1, 1, 1))
+
+
+def test_from_csv_keeps_stored_hashes_without_vocabulary(tmp_path):
+    import pandas as pd
+    from password_hash import preprocess_hashes, hash_passwords
+    from similar_password_finder import SimilarPasswordIndex, pack_hash
+
+    passwords = POOLS["ascii"][:100]
+    passwords = [pw for pw in dict.fromkeys(passwords) if pw]
+    pd.DataFrame({"Password": passwords}).to_csv(tmp_path / "passwords.csv", index=False)
+    csv_file = str(tmp_path / "hashes.csv")
+    preprocess_hashes(str(tmp_path / "passwords.csv"), csv_file)
+
+    index = SimilarPasswordIndex.from_csv(csv_file)
+    assert index.vectorizer == "per_password" and index.num_hashes == 10
+    assert index.passwords(np.arange(len(index))) == passwords
+    assert index.signatures.tolist() == [pack_hash(bits) for bits in hash_passwords(passwords)]
+
+    assert SimilarPasswordIndex.from_csv(csv_file, vectorizer="global").vectorizer == "global"
+    with pytest.raises(ValueError):
+        SimilarPasswordIndex.from_csv(csv_file, vectorizer="per-password")
@@ -1,59 +1,123 @@
-import pandas as pd
-import json
 import os
-from feature_extraction import extract_all_features
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from feature_extraction import extract_structural_matrix, resolve_pii_probabilities, STRUCTURAL_FEATURE_NAMES
+from semantic_cache import get_semantic_cache
+from pii_detector import get_pii_detector
 
 # ========== Configuration ==========
 INPUT_CSV = "benchmark_dataset_sampled.csv"
-CACHE_PATH = "semantic_cache.json"
-OUT_CSV = "train_features.csv"
+LEGACY_CACHE_PATH = "semantic_cache.json"
+OUT_PATH = "train_features.parquet"  # .parquet / .feather need pyarrow; .csv always works
+CHUNK_ROWS = 5000
+MAX_WORKERS = 16
 
 # ========== 1. Load Dataset ==========
-df = pd.read_csv(INPUT_CSV)
-assert 'Password' in df.columns and 'Label' in df.columns, "Input CSV must contain 'Password' and 'Label' columns"
-df = df[df['Label'].isin([1, 2, 3, 4])]  # Ensure only valid labels are included
-
-# ========== 2. Load Semantic Cache ==========
-if os.path.exists(CACHE_PATH):
-    with open(CACHE_PATH, "r", encoding="utf-8") as f:
-        semantic_cache = json.load(f)
-else:
-    semantic_cache = {}
-
-# ========== 3. Feature Extraction with Caching ==========
-def extract_features_with_cache(password: str) -> dict:
-    if password in semantic_cache:
-        pii_prob = semantic_cache[password].get('Probability', 0.0)
-        feats = extract_all_features(password)
-        feats['pii_included_probability'] = pii_prob
+def load_dataset(input_csv: str) -> pd.DataFrame:
+    df = pd.read_csv(input_csv, dtype={"Password": str}, keep_default_na=False)
+    assert 'Password' in df.columns and 'Label' in df.columns, "Input CSV must contain 'Password' and 'Label' columns"
+    df = df[pd.to_numeric(df['Label'], errors='coerce').isin([1, 2, 3, 4])]  # Ensure only valid labels are included
+    return df.reset_index(drop=True)
+
+# ========== 2. Import Legacy JSON Cache ==========
+def import_legacy_cache(path: str = LEGACY_CACHE_PATH) -> int:
+    # Earlier runs kept PII probabilities in a plaintext JSON file; move them into the shared cache once
+    if not os.path.exists(path):
+        return 0
+    semantic_cache = get_semantic_cache()
+    with open(path, "r", encoding="utf-8") as f:
+        legacy_cache = json.load(f)
+    missing = set(legacy_cache) - set(semantic_cache.get_many(legacy_cache))
+    # set_many keeps only Probability and the PII categories mask_sensitive_segments needs
+    semantic_cache.set_many({pw: legacy_cache[pw] for pw in missing if isinstance(legacy_cache[pw], dict)})
+    print(f"[INFO] Imported {len(missing)} entries from {path}")
+    return len(missing)
+
+# ========== 3. Chunked Feature Extraction ==========
+def label_features(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS, max_workers: int = MAX_WORKERS,
+                   use_local: bool = False):
+    """
+    Feature table for every row of df, CHUNK_ROWS at a time: structural features are
+    computed in one vectorized batch per chunk, PII probabilities come from the shared
+    cache or concurrent GPT calls that are checkpointed to the cache as they finish
+    (with use_local, the local detector answers first). Returns (features_df, stats).
+    """
+    passwords = df['Password'].tolist()
+    structural = np.empty((len(df), len(STRUCTURAL_FEATURE_NAMES)), dtype=np.float64)
+    pii = np.empty(len(df), dtype=np.float64)
+    totals = {"rows": 0, "unique": 0, "local": 0, "cache_hits": 0, "api_calls": 0, "api_failures": 0}
+    start = time.perf_counter()
+    for lo in range(0, len(df), chunk_rows):
+        hi = min(lo + chunk_rows, len(df))
+        chunk = passwords[lo:hi]
+        structural[lo:hi] = extract_structural_matrix(chunk)
+        pii[lo:hi], stats = resolve_pii_probabilities(chunk, max_workers=max_workers, use_local=use_local,
+                                                         return_stats=True)
+        for key, value in stats.items():
+            totals[key] += value
+        elapsed = time.perf_counter() - start
+        print(f"[INFO] Processed {hi}/{len(df)} samples ({hi / elapsed:,.0f} rows/s, {totals['api_calls']} API calls)")
+
+    features_df = pd.DataFrame(structural, columns=STRUCTURAL_FEATURE_NAMES)
+    int_columns = ['max_digit_run_length', 'regex_match_date', 'regex_match_phone', 'regex_match_keyboard_walk']
+    features_df[int_columns] = features_df[int_columns].astype(np.int64)
+    features_df['pii_included_probability'] = pii
+    features_df['Password'] = passwords
+    features_df['label'] = df['Label'].astype(np.int64).to_numpy()  # Label values expected to be 1/2/3/4
+
+    totals["seconds"] = time.perf_counter() - start
+    totals["rows_per_s"] = len(df) / totals["seconds"] if totals["seconds"] > 0 else 0.0
+    totals["api_calls_saved"] = totals["rows"] - totals["api_calls"]
+    return features_df, totals
+
+# ========== 4. Export ==========
+def write_features(features_df: pd.DataFrame, path: str) -> str:
+    """Write by extension (.parquet, .feather or .csv); without pyarrow, columnar formats fall back to CSV."""
+    root, ext = os.path.splitext(path)
+    ext = ext.lower()
+    if ext in (".parquet", ".feather"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print(f"[WARN] pyarrow is not installed, writing {root}.csv instead of {path}")
+            path, ext = root + ".csv", ".csv"
+    if ext == ".parquet":
+        features_df.to_parquet(path, index=False)
+    elif ext == ".feather":
+        features_df.to_feather(path)
     else:
-        feats = extract_all_features(password)
-        semantic_cache[password] = {
-            "Probability": feats.get("pii_included_probability", 0.0)
-        }
-    return feats
-
-# ========== 4. Process All Records ==========
-features_list = []
-
-for idx, row in df.iterrows():
-    pw = row['Password']
-    label = int(row['Label'])  # Label values expected to be 1/2/3/4
-    feats = extract_features_with_cache(pw)
-    feats['Password'] = pw
-    feats['label'] = label
-    features_list.append(feats)
-
-    if (idx + 1) % 10 == 0:
-        print(f"[INFO] Processed {idx + 1} samples...")
-
-print(f"[DONE] Feature extraction completed. Total: {len(features_list)} samples")
-
-# ========== 5. Save Cache ==========
-with open(CACHE_PATH, "w", encoding="utf-8") as f:
-    json.dump(semantic_cache, f, indent=2, ensure_ascii=False)
-
-# ========== 6. Export to CSV ==========
-features_df = pd.DataFrame(features_list)
-features_df.to_csv(OUT_CSV, index=False)
-print(f"[SAVED] Feature CSV written to: {OUT_CSV}")
+        features_df.to_csv(path, index=False)
+    return path
+
+# ========== Main ==========
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Label router training features for a password CSV")
+    parser.add_argument("input_csv", nargs="?", default=INPUT_CSV)
+    parser.add_argument("output", nargs="?", default=OUT_PATH)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--use-local", action="store_true",
+                        help="let the local PII detector answer confident rows (calibrate it against GPT labels first)")
+    args = parser.parse_args()
+
+    df = load_dataset(args.input_csv)
+    import_legacy_cache()
+    features_df, stats = label_features(df, chunk_rows=args.chunk_rows, max_workers=args.max_workers,
+                                     use_local=args.use_local)
+    print(f"[DONE] Feature extraction completed. Total: {len(features_df)} samples")
+
+    # ========== Cache Statistics ==========
+    print(f"[STATS] {stats['rows_per_s']:,.0f} rows/s; {stats['api_calls']} API calls, "
+          f"{stats['api_calls_saved']} saved ({stats['rows'] - stats['unique']} duplicates, "
+          f"{stats['local']} local detector, {stats['cache_hits']} cache hits), {stats['api_failures']} failed")
+    if args.use_local:
+        print(f"[PII] local detector {get_pii_detector().stats()}")
+    print(f"[CACHE] {get_semantic_cache().stats()}")
+
+    saved_path = write_features(features_df, args.output)
+    print(f"[SAVED] Features written to: {saved_path}")
+    if stats['api_failures']:
+        print(f"[WARN] {stats['api_failures']} PII requests failed and were scored 0.0; rerun to retry them (answers are cached)")
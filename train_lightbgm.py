@@ -1,68 +1,239 @@
+import os
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 import lightgbm as lgb
-import os
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score, f1_score
 
 # ========== Configuration ==========
-INPUT_CSV = "train_features.csv"
+INPUT_PATH = "train_features.parquet"  # .parquet / .feather / .csv feature table, or a LightGBM .bin Dataset
 MODEL_OUTPUT = "router_model.txt"
 TEST_RATIO = 0.3
 RANDOM_SEED = 42
+LABEL_OFFSET = 1  # labels 1..4 are stored as classes 0..3 (LightGBM needs labels in [0, num_class))
 
-# ========== 1. Load Dataset ==========
-df = pd.read_csv(INPUT_CSV)
-
-# ========== 2. Split Features and Labels ==========
-X = df.drop(columns=["label", "Password"], errors="ignore")
-y = df["label"]
-
-# ========== 3. Train/Validation Split ==========
-X_train, X_val, y_train, y_val = train_test_split(
-    X, y, test_size=TEST_RATIO, stratify=y, random_state=RANDOM_SEED
-)
-
-# ========== 4. Construct LightGBM Dataset ==========
-train_data = lgb.Dataset(X_train, label=y_train)
-val_data = lgb.Dataset(X_val, label=y_val)
-
-# ========== 5. Model Parameters ==========
-NUM_CLASS = y.nunique()
-params = {
+BASE_PARAMS = {
     'objective': 'multiclass',
-    'num_class': NUM_CLASS,
     'metric': 'multi_logloss',
     'learning_rate': 0.1,
     'num_leaves': 31,
-    'verbose': -1
+    'verbose': -1,
+    'seed': RANDOM_SEED,
 }
 
-# ========== 6. Train the Model ==========
-print(f"🚀 Training LightGBM router model (num_class = {NUM_CLASS})...")
-model = lgb.train(
-    params,
-    train_data,
-    valid_sets=[train_data, val_data],
-    num_boost_round=100,
-    callbacks=[
-        lgb.early_stopping(stopping_rounds=10),
-        lgb.log_evaluation(period=10)
-    ]
-)
-
-# ========== 7. Save the Model ==========
-model.save_model(MODEL_OUTPUT)
-print(f"✅ Model saved to: {MODEL_OUTPUT}")
-
-# ========== 8. Evaluation Report ==========
-y_pred_proba = model.predict(X_val)
-y_pred = y_pred_proba.argmax(axis=1)
-
-print("\n📊 Classification Report on Validation Set:")
-print(classification_report(y_val, y_pred, digits=4))
-
-acc = accuracy_score(y_val, y_pred)
-macro_f1 = f1_score(y_val, y_pred, average='macro')
-
-print(f"\n🎯 Accuracy       : {acc:.4f}")
-print(f"🎯 Macro-F1 Score : {macro_f1:.4f}")
+# Hyperparameter search grid; the number of rounds is chosen per configuration by early stopping
+SEARCH_GRID = {
+    'num_leaves': [7, 15, 31, 63],
+    'learning_rate': [0.05, 0.1, 0.2],
+}
+MAX_ROUNDS = 500
+EARLY_STOPPING_ROUNDS = 20
+NUM_FOLDS = 5
+LOGLOSS_TOLERANCE = 0.002  # prefer the smallest ensemble whose CV logloss is within this of the best
+
+# ========== 1. Load Dataset ==========
+def read_feature_table(path: str) -> pd.DataFrame:
+    """A train_label.py feature table; the format follows the extension (Parquet/Feather need pyarrow)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        return pd.read_parquet(path)
+    if ext == ".feather":
+        return pd.read_feather(path)
+    return pd.read_csv(path)
+
+def resolve_input(path: str) -> str:
+    # train_label.py writes CSV next to the requested Parquet/Feather path when pyarrow is missing
+    if not os.path.exists(path):
+        fallback = os.path.splitext(path)[0] + ".csv"
+        if os.path.exists(fallback):
+            return fallback
+    return path
+
+def split_features(df: pd.DataFrame):
+    X = df.drop(columns=["label", "Password"], errors="ignore")
+    y = df["label"].astype(np.int64) - LABEL_OFFSET
+    return X, y
+
+def prepare_binary_dataset(df: pd.DataFrame, bin_path: str) -> str:
+    """Save the training rows once as a LightGBM binary Dataset; search workers load it without parsing."""
+    X, y = split_features(df)
+    lgb.Dataset(X, label=y, params={'verbose': -1}).save_binary(bin_path)
+    return bin_path
+
+# ========== 2. Cross-Validated Search (worker side) ==========
+def _cv_worker(task: tuple) -> dict:
+    bin_path, params, num_folds = task
+    start = time.perf_counter()
+    train_set = lgb.Dataset(bin_path, params={'verbose': -1})
+    history = lgb.cv(
+        params,
+        train_set,
+        num_boost_round=MAX_ROUNDS,
+        nfold=num_folds,
+        stratified=True,
+        seed=RANDOM_SEED,
+        callbacks=[lgb.early_stopping(stopping_rounds=EARLY_STOPPING_ROUNDS, verbose=False)],
+    )
+    losses = history['valid multi_logloss-mean']
+    return {
+        'num_leaves': params['num_leaves'],
+        'learning_rate': params['learning_rate'],
+        'num_boost_round': len(losses),
+        'cv_logloss': float(losses[-1]),
+        'cv_logloss_std': float(history['valid multi_logloss-stdv'][-1]),
+        'seconds': time.perf_counter() - start,
+    }
+
+def search_hyperparameters(bin_path: str, num_class: int, workers: int = None, threads_per_worker: int = None,
+                           num_folds: int = NUM_FOLDS, grid: dict = SEARCH_GRID) -> list:
+    """
+    k-fold CV of every grid configuration in a process pool. Each worker trains with
+    num_threads = threads_per_worker, so workers * threads_per_worker stays within the
+    machine's cores instead of every LightGBM call grabbing all of them.
+    """
+    cpus = os.cpu_count() or 1
+    configs = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    workers = workers or max(1, min(len(configs), cpus))
+    threads_per_worker = threads_per_worker or max(1, cpus // workers)
+    tasks = [(bin_path, dict(BASE_PARAMS, num_class=num_class, num_threads=threads_per_worker, **config), num_folds)
+             for config in configs]
+    print(f"🔎 Searching {len(configs)} configurations ({num_folds}-fold CV, {workers} workers x {threads_per_worker} threads)...")
+    # spawn, not fork: forking a process whose OpenMP runtime is already initialized can deadlock
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        results = []
+        for result in pool.map(_cv_worker, tasks):
+            print(f"  num_leaves={result['num_leaves']:>3} learning_rate={result['learning_rate']:<5} "
+                  f"rounds={result['num_boost_round']:>3} cv_logloss={result['cv_logloss']:.4f} ({result['seconds']:.1f}s)")
+            results.append(result)
+    return results
+
+def select_config(results: list, tolerance: float = LOGLOSS_TOLERANCE) -> dict:
+    """The configuration with the fewest leaves in total among those within tolerance of the best CV logloss."""
+    best = min(r['cv_logloss'] for r in results)
+    close = [r for r in results if r['cv_logloss'] <= best + tolerance]
+    return min(close, key=lambda r: (r['num_leaves'] * r['num_boost_round'], r['cv_logloss']))
+
+# ========== 3. Latency / Accuracy Report ==========
+def evaluate_model(model_path: str, X_val: pd.DataFrame, y_val, repeats: int = 200) -> dict:
+    from compiled_router import CompiledTreeModel
+
+    booster = lgb.Booster(model_file=model_path)
+    compiled = CompiledTreeModel.from_file(model_path)
+    features = X_val.to_numpy(dtype=np.float64)
+    y_true = np.asarray(y_val)
+    y_pred = booster.predict(features).argmax(axis=1)
+
+    def single_row_us(predict):
+        row = features[:1]
+        start = time.perf_counter()
+        for _ in range(repeats):
+            predict(row)
+        return (time.perf_counter() - start) / repeats * 1e6
+
+    def batch_rows_per_s(predict):
+        start = time.perf_counter()
+        predict(features)
+        return len(features) / (time.perf_counter() - start)
+
+    return {
+        "accuracy": float(accuracy_score(y_true, y_pred)),
+        "macro_f1": float(f1_score(y_true, y_pred, average='macro')),
+        "num_trees": compiled.num_trees(),
+        "num_leaves": int(len(compiled.leaf_value)),
+        "max_depth": compiled.max_depth,
+        "model_bytes": os.path.getsize(model_path),
+        "booster_single_us": single_row_us(booster.predict),
+        "compiled_single_us": single_row_us(compiled.predict),
+        "booster_batch_rows_per_s": batch_rows_per_s(booster.predict),
+        "compiled_batch_rows_per_s": batch_rows_per_s(compiled.predict),
+        "classification_report": classification_report(y_true + LABEL_OFFSET, y_pred + LABEL_OFFSET,
+                                                       digits=4, output_dict=True),
+    }
+
+# ========== Main ==========
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the LightGBM router, optionally with a CV hyperparameter search")
+    parser.add_argument("input", nargs="?", default=INPUT_PATH,
+                        help="feature table (.parquet/.feather/.csv) or a LightGBM .bin Dataset of training rows")
+    parser.add_argument("--valid", help="held-out feature table for the report when the input is a .bin Dataset")
+    parser.add_argument("--output", default=MODEL_OUTPUT)
+    parser.add_argument("--search", action="store_true", help="k-fold search over SEARCH_GRID before the final fit")
+    parser.add_argument("--folds", type=int, default=NUM_FOLDS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--tolerance", type=float, default=LOGLOSS_TOLERANCE)
+    args = parser.parse_args()
+
+    # ========== 1. Load Dataset ==========
+    input_path = resolve_input(args.input)
+    X_val = y_val = None
+    if input_path.endswith(".bin"):
+        bin_path = input_path
+        if args.valid:
+            X_val, y_val = split_features(read_feature_table(resolve_input(args.valid)))
+    else:
+        df = read_feature_table(input_path)
+        # ========== 2. Train/Validation Split ==========
+        train_df, val_df = train_test_split(df, test_size=TEST_RATIO, stratify=df["label"], random_state=RANDOM_SEED)
+        X_val, y_val = split_features(val_df)
+        bin_path = os.path.splitext(input_path)[0] + ".train.bin"
+        prepare_binary_dataset(train_df, bin_path)
+        print(f"💾 Training rows saved as LightGBM binary Dataset: {bin_path}")
+
+    train_data = lgb.Dataset(bin_path, params={'verbose': -1}).construct()
+    NUM_CLASS = int(train_data.get_label().max()) + 1
+
+    # ========== 3. Model Parameters ==========
+    params = dict(BASE_PARAMS, num_class=NUM_CLASS)
+    num_boost_round = 100
+    search_results = None
+    if args.search:
+        search_results = search_hyperparameters(bin_path, NUM_CLASS, workers=args.workers,
+                                                threads_per_worker=args.threads_per_worker, num_folds=args.folds)
+        best = select_config(search_results, args.tolerance)
+        params.update(num_leaves=best['num_leaves'], learning_rate=best['learning_rate'])
+        num_boost_round = best['num_boost_round']
+        print(f"🏆 Selected num_leaves={best['num_leaves']} learning_rate={best['learning_rate']} "
+              f"rounds={num_boost_round} (cv_logloss {best['cv_logloss']:.4f})")
+
+    # ========== 4. Train the Model ==========
+    print(f"🚀 Training LightGBM router model (num_class = {NUM_CLASS})...")
+    valid_sets, callbacks = [train_data], [lgb.log_evaluation(period=10)]
+    if X_val is not None and not args.search:
+        # Without a search the round count is picked by early stopping on the validation split, as before
+        valid_sets.append(lgb.Dataset(X_val, label=y_val, reference=train_data))
+        callbacks.append(lgb.early_stopping(stopping_rounds=10))
+    model = lgb.train(params, train_data, valid_sets=valid_sets, num_boost_round=num_boost_round, callbacks=callbacks)
+
+    # ========== 5. Save the Model ==========
+    model.save_model(args.output)
+    print(f"✅ Model saved to: {args.output}")
+
+    # ========== 6. Evaluation Report ==========
+    if X_val is None:
+        print("⚠️ No validation features (use --valid with a .bin input); skipping the accuracy/latency report")
+    else:
+        report = evaluate_model(args.output, X_val, y_val)
+        report["params"] = {k: params[k] for k in ("num_leaves", "learning_rate")}
+        report["num_boost_round"] = model.current_iteration()
+        report["search"] = search_results
+        report_path = os.path.splitext(args.output)[0] + ".report.json"
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        print("\n📊 Classification Report on Validation Set:")
+        print(classification_report(np.asarray(y_val) + LABEL_OFFSET,
+                                    model.predict(X_val.to_numpy(dtype=np.float64)).argmax(axis=1) + LABEL_OFFSET, digits=4))
+        print(f"\n🎯 Accuracy       : {report['accuracy']:.4f}")
+        print(f"🎯 Macro-F1 Score : {report['macro_f1']:.4f}")
+        print(f"🌲 {report['num_trees']} trees, {report['num_leaves']} leaves, max depth {report['max_depth']}")
+        print(f"⏱️ Single row: {report['compiled_single_us']:.1f}µs compiled, {report['booster_single_us']:.1f}µs Booster; "
+              f"batch: {report['compiled_batch_rows_per_s']:,.0f} rows/s compiled, "
+              f"{report['booster_batch_rows_per_s']:,.0f} rows/s Booster")
+        print(f"📝 Report written to: {report_path}")